@@ -1,10 +1,10 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import os
-import matplotlib.dates as mdates
-from statsmodels.tsa.seasonal import STL
-from statsmodels.tsa.stattools import adfuller, kpss
+from figures import FigureSet, GRAPH_DIR, series_figure, stl_figure #shared figure builders
+from artifact_store import save_frame #typed artifacts shared between the scripts through Data Store
+from stl_batch import decompose_frame #memoized STL decomposition
+from unit_root import print_report, unit_root_table #batched ADF/KPSS/PP tests
 
 # Main directory and file paths
 main_directory = os.path.dirname(os.path.abspath(__file__))
@@ -22,28 +22,15 @@ df.set_index('Date', inplace=True)
 # Perform STL decomposition
 series_name = df.columns[0]
 series = df[series_name].dropna()
-stl = STL(series, period=4)
-result = stl.fit()
+stl_results = decompose_frame(series, period=4) #reuses the decomposition from Seasonality Check.py when the data is unchanged
+result = stl_results.decompose_result(series_name)
 
-# Plot the STL decomposition
-fig = result.plot()
-fig.set_size_inches(10, 8)
-
-# Access all axes from the generated figure
-for ax in fig.axes:
-    # Set major ticks for every 4 years
-    ax.xaxis.set_major_locator(mdates.YearLocator(4))
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-
-    # Set minor ticks for each quarter without labels
-    ax.xaxis.set_minor_locator(mdates.MonthLocator([3, 6, 9, 12]))
-
-    # Rotate x-axis labels for better readability
-    ax.tick_params(axis='x', rotation=45)
-
-plt.suptitle(f'STL Decomposition of {series_name}', fontsize=16)
-plt.tight_layout()
-plt.show()
+# Plot the STL decomposition (shown interactively, or written to Graph Results/Detrending with --headless)
+figure_set = FigureSet(n_jobs=1)
+graph_folder = os.path.join(GRAPH_DIR, 'Detrending')
+figure_name = os.path.splitext(csv_file)[0] #name figures after the csv file, the column is just 'Value'
+figure_set.add(stl_figure, os.path.join(graph_folder, f'STL Decomposition of {figure_name}.png'),
+               decomposition=result, title=f'STL Decomposition of {series_name}', minor_months=(3, 6, 9, 12))
 
 # Detrend the series (remove trend component)
 detrended_series = series - result.trend
@@ -52,38 +39,15 @@ detrended_series = series - result.trend
 seasonally_differenced_series = detrended_series.diff(periods=4).dropna()
 
 # Plot the detrended and seasonally differenced series
-plt.figure(figsize=(10, 5))
-plt.plot(seasonally_differenced_series)
-plt.title(f'Detrended and Seasonally Differenced Series of {series_name}')
-plt.xlabel('Date')
-plt.ylabel('Value')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.show()
+figure_set.add(series_figure, os.path.join(graph_folder, f'Detrended and Seasonally Differenced {figure_name}.png'),
+               series=seasonally_differenced_series, title=f'Detrended and Seasonally Differenced Series of {series_name}')
+figure_set.render()
 
 # Save the new series to a CSV file
 output_file_name = f'{series_name}_detrended_and_seasonally_differenced.csv'
 output_csv_path = os.path.join(csv_subdirectory, output_file_name)
-seasonally_differenced_series.to_csv(output_csv_path, header=True)
-
-# Function to perform ADF and KPSS tests
-def test_stationarity(series):
-    # ADF Test
-    adf_result = adfuller(series)
-    print(f"ADF Statistic: {adf_result[0]}, p-value: {adf_result[1]}")
-    if adf_result[1] < 0.05:
-        print("Series is stationary according to the ADF test (p < 0.05).")
-    else:
-        print("Series is not stationary according to the ADF test (p >= 0.05).")
-    
-    # KPSS Test
-    kpss_result = kpss(series, regression='c')
-    print(f"KPSS Statistic: {kpss_result[0]}, p-value: {kpss_result[1]}")
-    if kpss_result[1] < 0.05:
-        print("Series is not stationary according to the KPSS test (p < 0.05).")
-    else:
-        print("Series is stationary according to the KPSS test (p >= 0.05).")
+save_frame(seasonally_differenced_series.to_frame(), os.path.splitext(output_file_name)[0], csv_path=output_csv_path) #stored in Data Store, csv written as a view
 
-# Test stationarity for the detrended and seasonally differenced series
+# Test stationarity for the detrended and seasonally differenced series (ADF and KPSS)
 print(f"Stationarity test results for detrended and seasonally differenced series of {series_name}:")
-test_stationarity(seasonally_differenced_series)
\ No newline at end of file
+print_report(unit_root_table(seasonally_differenced_series, n_jobs=1))
@@ -0,0 +1,35 @@
+import os
+from artifact_store import load_frame, save_frame #typed artifacts shared between the scripts through Data Store
+from var_cache import fit_var #fitted models are shared with the other scripts through Cache/VAR Models
+from causality import block_exogeneity_table, causality_table, pvalue_matrix #Wald tests of every pair from one unrestricted fit
+
+# Paths for script and data
+script_dir = os.path.dirname(os.path.abspath(__file__))
+csv_folder = os.path.join(script_dir, 'CSV Data')
+csv_file_path = os.path.join(csv_folder, 'Standardized_Data.csv') #standardized seasonally differenced data (Standardizing.py)
+
+data = load_frame('Standardized_Data', csv_path=csv_file_path) #typed artifact from Data Store: quarterly PeriodIndex, memory-mapped float64 columns
+candidate_lags = [5, 6, 7, 8] #same candidate lag lengths as Order Selection - ACF.py
+test_kind = 'f' #'f' for the F form of the Wald test (as VARResults.test_causality), 'wald' for chi-square
+signif = 0.05 #significance level of the 'Granger Causes' and 'Rejected' columns
+
+#one unrestricted VAR per lag (loaded from the model cache when already fitted); every (cause, effect)
+#pair and block exogeneity test comes from its coefficient covariance, no restricted models are fitted
+fitted_models = {lag: fit_var(data, lag, source='Standardized_Data.csv') for lag in candidate_lags}
+
+causality_df = causality_table(fitted_models, test_kind, signif)
+output_path = os.path.join(csv_folder, 'Granger_Causality_Tests.csv')
+save_frame(causality_df, 'Granger_Causality_Tests', csv_path=output_path) #stored in Data Store, csv written as a view
+print(f"Pairwise Granger causality tests saved to: {output_path}")
+
+for lag in candidate_lags: #K x K p-value matrix per lag: rows are causes, columns effects
+    matrix = pvalue_matrix(causality_df, lag)
+    save_frame(matrix, f'Granger_PValues_Lag_{lag}', csv_path=os.path.join(csv_folder, f'Granger_PValues_Lag_{lag}.csv'))
+    print(f"\nGranger causality p-values, lag length {lag} (row causes column):")
+    print(matrix.round(3).to_string())
+
+block_df = block_exogeneity_table(fitted_models, test_kind, signif)
+block_output_path = os.path.join(csv_folder, 'Block_Exogeneity_Tests.csv')
+save_frame(block_df, 'Block_Exogeneity_Tests', csv_path=block_output_path)
+print(f"\n{block_df.to_string(index=False)}")
+print(f"Block exogeneity tests saved to: {block_output_path}")
@@ -1,65 +1,94 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from statsmodels.tsa.api import VAR
-import numpy as np
+from artifact_store import load_frame, save_frame #typed artifacts shared between the scripts through Data Store
+from figures import FigureSet, GRAPH_DIR, irf_figure #shared figure builders; --headless writes them to Graph Results
+from bvar import fit_bvar #Minnesota-prior Bayesian VAR with closed-form posterior and batched draws
+from cholesky_orderings import envelope_tables #orthogonalized IRFs/FEVDs over Cholesky orderings from one fit
+from fevd import fevd_long_table, historical_long_table #FEVD and historical decomposition from the orthogonalized MA tensor
+from irf_bootstrap import bootstrap_bands #parallel, seeded bootstrap IRF bands
+from irf_export import irf_long_table, write_table #vectorized long-format IRF export
+from tracing import span #named spans for --trace / --profile runs (see tracing.py)
+from var_cache import fit_var #fitted models are shared with the other scripts through Cache/VAR Models
 import os
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 csv_folder = os.path.join(script_dir, 'CSV Data')
-csv_file_path = os.path.join(csv_folder, 'Seasonally_Differenced_Data.csv')
-data = pd.read_csv(csv_file_path, index_col='Date', parse_dates=True) #load the seasonally differenced data
+csv_file_path = os.path.join(csv_folder, 'Standardized_Data.csv') #standardized seasonally differenced data (Standardizing.py)
+data = load_frame('Standardized_Data', csv_path=csv_file_path) #typed artifact from Data Store: quarterly PeriodIndex, memory-mapped float64 columns
 lag_lengths = [6,7,8] #lag length of models to consider
 
 irf_periods = 20 #no. of periods for Impulse Response Function to trace the effect of shocks to the system
+export_orth = False #add orthogonalized IRF columns to the exported table
+export_cumulative = False #add cumulative IRF columns to the exported table
+output_format = 'csv' #'csv', or 'parquet'/'feather' for a binary columnar file (needs pyarrow)
+bootstrap_reps = 2000 #bootstrap replications for the 'Boot Lower/Upper Conf' columns (0 to skip)
+bootstrap_method = 'residual' #'residual' or 'wild' bootstrap
+bootstrap_seed = 0 #seed for reproducible bootstrap bands
+bvar_draws = 2000 #posterior draws of the Minnesota-prior BVAR exported next to each model (0 to skip)
+bvar_tightness = None #overall prior tightness, None to maximize the marginal likelihood
+max_orderings = 5040 #Cholesky orderings for the orthogonalized IRF/FEVD envelopes, all K! up to this many (0 to skip)
 
 def generate_irf(data,lag_length,periods): #function to fit VAR model and generate IRFs
-    model = VAR(data)
-    fitted_model = model.fit(lag_length)
+    fitted_model = fit_var(data, lag_length, source='Standardized_Data.csv') #loads the model if it was already fitted on this data
     irf = fitted_model.irf(periods)
     return irf, fitted_model
 
-for lag_length in lag_lengths: #loop over each lag to generate IRFs
-    irf, fitted_model = generate_irf(data, lag_length, irf_periods)
-    irf_df = pd.DataFrame() #store IRF data for all variables and shocks
+def generate_bvar_irf(data,lag_length,periods): #function to fit the Bayesian VAR and its posterior IRF bands
+    bvar = fit_bvar(data, lag_length, tightness=bvar_tightness) #closed-form posterior, prior tightness from the marginal likelihood
+    irf = bvar.results.irf(periods) #IRFs at the posterior mean
+    lower, _, upper = bvar.irf_bands(periods, n_draws=bvar_draws, seed=bootstrap_seed) #all draws as one batch
+    return irf, (lower, upper), bvar
 
-    variables = data.columns.tolist() #get variable names from column headees
-    for i, shock_var in enumerate(variables): #loop thorugh each combination of shock and response variable
-        for j, response_var in enumerate(variables):
-            #Extract IRF values for given pair of shock and response var
-            irf_values = irf.irfs[:, j, i]  # response of `response_var` to `shock_var`
-            stderr_values = irf.stderr(orth=False)[:, j, i]  # standard errors for confidence intervals
+if __name__ == '__main__': #guard needed because the bootstrap and figure rendering start worker processes
+    figure_set = FigureSet()
+    for lag_length in lag_lengths: #loop over each lag to generate IRFs
+        with span('lag', lag=lag_length): #fits, bootstrap, exports and orderings of one lag length
+            irf, fitted_model = generate_irf(data, lag_length, irf_periods)
+            variables = data.columns.tolist() #get variable names from column headers
 
-            # Calculate lower and upper confidence bounds (assuming 95% confidence interval)
-            lower_conf = irf_values - 1.96 * stderr_values
-            upper_conf = irf_values + 1.96 * stderr_values
+            #build the whole (shock, response, period) table at once; the standard errors for the
+            #95% confidence bands (+/- 1.96 stderr) are computed once per lag instead of once per pair
+            boot_bands = fevd_bands = None
+            if bootstrap_reps: #percentile bands from residual/wild bootstrap replications, run across a process pool
+                #the FEVD bands come from the same replications
+                boot_bands, fevd_bands = bootstrap_bands(fitted_model, irf_periods, reps=bootstrap_reps, method=bootstrap_method,
+                                                         seed=bootstrap_seed, fevd=True)
+            irf_df = irf_long_table(irf, variables, orth=export_orth, cumulative=export_cumulative, boot_bands=boot_bands)
 
-            df_pair = pd.DataFrame({
-                'Period': range(irf_periods + 1),  # include all periods
-                'IRF': irf_values,
-                'Lower Conf': lower_conf,
-                'Upper Conf': upper_conf,
-                'Shock Variable': shock_var,
-                'Response Variable': response_var
-            })
-            irf_df = pd.concat([irf_df, df_pair], ignore_index=True) #Apply to the main IRF Data Frame
+            output_folder = os.path.join(script_dir, 'CSV Data')
+            output_file = os.path.join(output_folder, f'IRF_Lag_{lag_length}.{output_format}')
+            save_frame(irf_df, f'IRF_Lag_{lag_length}', csv_path=output_file if output_format == 'csv' else None) #typed table in Data Store, csv written as a view
+            if output_format != 'csv':
+                write_table(irf_df, output_file) #parquet/feather copy for other tools
+            print(f"IRF data for lag length {lag_length} saved to: {output_file}")
 
-    output_folder = os.path.join(script_dir, 'CSV Data')
-    output_file = os.path.join(output_folder, f'IRF_Lag_{lag_length}.csv')
-    irf_df.to_csv(output_file, index=False) #save data frame to the csv
-    print(f"IRF data for lag length {lag_length} saved to: {output_file}")
-    
-    #Plot the IRF for each variable's shock
-    fig = irf.plot(orth=False)
-    fig.set_size_inches(14, 10)
-    plt.subplots_adjust(hspace=0.5, wspace=0.3)
-    fig.suptitle(f'Impulse Response Functions (Lag Length = {lag_length})', fontsize=16)
+            #share of each (orthogonalized) shock in every variable's forecast error variance, and the
+            #contribution of each shock to every variable over the sample, in the same long layout
+            for name, table in ((f'FEVD_Lag_{lag_length}', fevd_long_table(fitted_model, irf_periods, fevd_bands)),
+                                (f'Historical_Decomposition_Lag_{lag_length}', historical_long_table(fitted_model))):
+                save_frame(table, name, csv_path=os.path.join(output_folder, f'{name}.csv'))
+                print(f"{name.replace('_', ' ')} saved to: {os.path.join(output_folder, f'{name}.csv')}")
 
-    plt.show()
+            if bvar_draws: #the same table for the Bayesian VAR, with 95% posterior bands in place of the asymptotic ones
+                with span('bvar', draws=bvar_draws):
+                    bvar_irf, posterior_bands, bvar = generate_bvar_irf(data, lag_length, irf_periods)
+                bvar_df = irf_long_table(bvar_irf, variables, bands=False, boot_bands=posterior_bands,
+                                         band_names=('Lower Conf', 'Upper Conf'))
+                bvar_file = os.path.join(output_folder, f'BVAR_IRF_Lag_{lag_length}.csv')
+                save_frame(bvar_df, f'BVAR_IRF_Lag_{lag_length}', csv_path=bvar_file)
+                print(f"BVAR IRF data for lag length {lag_length} (tightness {bvar.hyperparameters['tightness']:.3f}) saved to: {bvar_file}")
 
-    #Plot cumulative IRF plots
-    fig_cum = irf.plot_cum_effects(orth=False)
-    fig_cum.set_size_inches(14,10)
-    plt.subplots_adjust(hspace=0.5, wspace=0.3)
-    fig_cum.suptitle(f'Cumulative IRFs (Lag Length = {lag_length})', fontsize=16)
+            if max_orderings: #ordering robustness: orthogonalized IRFs and FEVDs under every Cholesky ordering of the variables
+                #(the column order comes from Seasonality Check.py); only the permuted Cholesky factor changes, the VAR is not refitted
+                for label, table in zip(('IRF', 'FEVD'), envelope_tables(fitted_model, irf_periods, max_orderings, seed=bootstrap_seed)):
+                    ordering_file = os.path.join(output_folder, f'Ordering_{label}_Lag_{lag_length}.csv')
+                    save_frame(table, f'Ordering_{label}_Lag_{lag_length}', csv_path=ordering_file)
+                    print(f"Min/median/max orthogonalized {label} over {table['Orderings'].iat[0]} orderings saved to: {ordering_file}")
+    
+        #Plot the IRF for each variable's shock, then the cumulative IRFs
+        #(shown one by one, or rendered in parallel to Graph Results/Impulse Response Functions with --headless)
+        graph_folder = os.path.join(GRAPH_DIR, 'Impulse Response Functions')
+        figure_set.add(irf_figure, os.path.join(graph_folder, f'IRF Lag {lag_length}.png'),
+                       data=data, lag_length=lag_length, periods=irf_periods)
+        figure_set.add(irf_figure, os.path.join(graph_folder, f'Cumulative IRF Lag {lag_length}.png'),
+                       data=data, lag_length=lag_length, periods=irf_periods, cumulative=True)
 
-    plt.show()
\ No newline at end of file
+    figure_set.render()
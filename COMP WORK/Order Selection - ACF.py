@@ -1,83 +1,57 @@
 import pandas as pd
 import os
-import matplotlib.pyplot as plt
-import numpy as np
-from statsmodels.tsa.api import VAR
-from statsmodels.graphics.tsaplots import plot_acf, plot_pacf, acf, pacf #Autocorrelation and Partial Autocorrelation functions
+from artifact_store import load_frame, save_frame #typed artifacts shared between the scripts through Data Store
+from var_cache import fit_var #fitted models are shared with the other scripts through Cache/VAR Models
+from residual_diagnostics import acf_pacf_table, cross_correlation_table, whiteness_table #FFT ACF, batched PACF and portmanteau tests of the whole residual matrix
+from figures import FigureSet, GRAPH_DIR, acf_grid_figure #shared figure builders; --headless writes them to Graph Results
 
 # Paths for script and data
 script_dir = os.path.dirname(os.path.abspath(__file__))
 csv_folder = os.path.join(script_dir, 'CSV Data')
-csv_file_path = os.path.join(csv_folder, 'Seasonally_Differenced_Data.csv')
+csv_file_path = os.path.join(csv_folder, 'Standardized_Data.csv') #standardized seasonally differenced data (Standardizing.py)
 
-data = pd.read_csv(csv_file_path, index_col='Date', parse_dates=True) #load the seasonally differenced data
-data.index = data.index.to_period('Q') #set frequency of date index to quarterly to avoid ValueWarning in terminal
+data = load_frame('Standardized_Data', csv_path=csv_file_path) #typed artifact from Data Store: quarterly PeriodIndex, memory-mapped float64 columns
 candidate_lags = [5, 6, 7, 8] #candidate lag lengths to analyze after selecting from AIC, BIC and LR-test
-acf_pacf_results = [] #empty list to store numeric acf and pacf results
-
-for lag in candidate_lags: #loop over each candidate lag
-    print(f"\nAnalyzing residuals for model with lag length = {lag}...")
-    model = VAR(data)
-    fitted_model = model.fit(lag) #fit the VAR(lag) model
-    residuals = fitted_model.resid #get residuals of fitted model
-
-    for var in residuals.columns: #loop over each value to get ACF and PACF values to later store in csv
-        acf_vals = acf(residuals[var], nlags=20)
-        pacf_vals = pacf(residuals[var], nlags=20)
-
-        #now, calculate the confidence intervals
-        conf_int_acf = 1.96 / np.sqrt(len(residuals[var]))
-        conf_int_pacf = 1.96 / np.sqrt(len(residuals[var]))
-
-        for lag_index in range(len(acf_vals)): #append acf and pacf results to the list
-            acf_pacf_results.append({
-                'Variable': var,
-                'Lag Length': lag,
-                'Lag': lag_index,
-                'ACF Value': acf_vals[lag_index],
-                'ACF Conf Int Low': -conf_int_acf,
-                'ACF Conf Int High': conf_int_acf,
-                'PACF Value': pacf_vals[lag_index],
-                'PACF Conf Int Low': -conf_int_pacf,
-                'PACF Conf Int High': conf_int_pacf
-            })
-
-
-    #Now, plot ACF for each variable in the residuals
-    num_vars = residuals.shape[1]
-    cols = 2
-    rows = 3
-
-    fig_acf, axes_acf = plt.subplots(nrows=rows, ncols=cols, figsize=(12, 12))
-    axes_acf = axes_acf.flatten()
-
-    for i, var in enumerate(residuals.columns):
-        plot_acf(residuals[var], ax=axes_acf[i], title=f'ACF of Residuals - {var} (lag={lag})')
-
-    if num_vars < len(axes_acf): #remove any unused axes (if any)
-        for i in range(num_vars, len(axes_acf)):
-            fig_acf.delaxes(axes_acf[i])
-
-    fig_acf.tight_layout()
-    plt.show()
-
-    #Now, plot Partial ACF for each variable in the residuals
-    fig_pacf, axes_pacf = plt.subplots(nrows=rows, ncols=cols, figsize=(12, 12))
-    axes_pacf = axes_pacf.flatten()
-
-    for i, var in enumerate(residuals.columns):
-        plot_pacf(residuals[var], ax=axes_pacf[i], title=f'PACF of Residuals - {var} (lag={lag})')
-
-    
-    if num_vars < len(axes_pacf): #remove any unused axes (if any)
-        for i in range(num_vars, len(axes_pacf)):
-            fig_acf.delaxes(axes_pacf[i])
-
-    fig_pacf.tight_layout()
-    plt.show()
-
-acf_pacf_df = pd.DataFrame(acf_pacf_results) #create data frame from acf and pacf results
-#save this to a csv file
-acf_pacf_output_path = os.path.join(csv_folder, 'ACF_PACF_Values.csv')
-acf_pacf_df.to_csv(acf_pacf_output_path, index=False)
-print(f"ACF and PACF values saved to: {acf_pacf_output_path}") #notification
\ No newline at end of file
+n_acf_lags = 20 #no. of lags of the ACF, PACF and cross-correlations
+acf_pacf_results = [] #one table of acf and pacf results per candidate lag
+cross_corr_results = [] #one table of residual cross-correlations per candidate lag
+fitted_models = {} #fitted models for the multivariate portmanteau tests
+
+if __name__ == '__main__': #guard needed because headless figure rendering starts worker processes
+    figure_set = FigureSet()
+    graph_folder = os.path.join(GRAPH_DIR, 'Residual Diagnostics')
+
+    for lag in candidate_lags: #loop over each candidate lag
+        print(f"\nAnalyzing residuals for model with lag length = {lag}...")
+        fitted_model = fit_var(data, lag, source='Standardized_Data.csv') #fit the VAR(lag) model, or load it if it is already cached
+        residuals = fitted_model.resid #get residuals of fitted model
+
+        #ACF and PACF of all residual columns at once, with the +/- 1.96/sqrt(T) confidence bands
+        acf_pacf_results.append(acf_pacf_table(residuals, n_acf_lags, lag))
+        cross_corr_results.append(cross_correlation_table(residuals, n_acf_lags, lag)) #corr(u_i,t, u_j,t-h) of every pair
+        fitted_models[lag] = fitted_model
+
+        #Now, plot ACF and then PACF for each variable in the residuals (grid rows grow with the no. of variables)
+        #shown one by one, or rendered in parallel to Graph Results/Residual Diagnostics with --headless
+        figure_set.add(acf_grid_figure, os.path.join(graph_folder, f'ACF Lag {lag}.png'), residuals=residuals, lag=lag, kind='acf')
+        figure_set.add(acf_grid_figure, os.path.join(graph_folder, f'PACF Lag {lag}.png'), residuals=residuals, lag=lag, kind='pacf')
+
+    figure_set.render()
+
+    acf_pacf_df = pd.concat(acf_pacf_results, ignore_index=True) #create data frame from acf and pacf results
+    #save this to a csv file
+    acf_pacf_output_path = os.path.join(csv_folder, 'ACF_PACF_Values.csv')
+    save_frame(acf_pacf_df, 'ACF_PACF_Values', csv_path=acf_pacf_output_path) #stored in Data Store, csv written as a view
+    print(f"ACF and PACF values saved to: {acf_pacf_output_path}") #notification
+
+    cross_corr_df = pd.concat(cross_corr_results, ignore_index=True)
+    cross_corr_output_path = os.path.join(csv_folder, 'Residual_Cross_Correlations.csv')
+    save_frame(cross_corr_df, 'Residual_Cross_Correlations', csv_path=cross_corr_output_path)
+    print(f"Residual cross-correlations saved to: {cross_corr_output_path}")
+
+    #multivariate portmanteau (Hosking) test of residual whiteness for horizons lag+1..20, the null is no autocorrelation up to the horizon
+    whiteness_df = whiteness_table(fitted_models, n_acf_lags)
+    print(whiteness_df.to_string(index=False))
+    whiteness_output_path = os.path.join(csv_folder, 'Portmanteau_Test_Results.csv')
+    save_frame(whiteness_df, 'Portmanteau_Test_Results', csv_path=whiteness_output_path)
+    print(f"Portmanteau test results saved to: {whiteness_output_path}")
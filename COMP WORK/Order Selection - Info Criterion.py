@@ -1,42 +1,32 @@
-import pandas as pd
 import os
-from statsmodels.tsa.api import VAR
-import matplotlib.pyplot as plt
+from lag_sweep import lag_order_sweep, sigma_u #one-pass lag order sweep
+from artifact_store import load_frame #typed artifacts shared between the scripts through Data Store
 
 # Paths for script and data
 script_dir = os.path.dirname(os.path.abspath(__file__))
 csv_folder = os.path.join(script_dir, 'CSV Data')
-csv_file_path = os.path.join(csv_folder, 'Seasonally_Differenced_Data.csv')
+csv_file_path = os.path.join(csv_folder, 'Standardized_Data.csv') #standardized seasonally differenced data (Standardizing.py)
 
-data = pd.read_csv(csv_file_path, index_col='Date', parse_dates=True) #load the seasonally differenced data
-data.index = data.index.to_period('Q') #Set frequency of Date index to quarterly to avoid any ValueWarning in the output
+data = load_frame('Standardized_Data', csv_path=csv_file_path) #typed artifact from Data Store: quarterly PeriodIndex, memory-mapped float64 columns
 
 #set the range of lag lengths to test
 max_lags = 15 #4 years of data
 lag_range = range(1, max_lags + 1) #range is exclusive so we use max_lags + 1
 
-#initialize lists to store AIC, BIC, HQIC, FPE for each lag length
-aic_values = []
-bic_values = []
-hqic_values = []
-fpe_values = []
+#fit every lag length 0..max_lags on the same sample with one QR factorization (see lag_sweep.py)
+#instead of refitting VAR(data).fit(lag) from scratch for each lag
+sweep = lag_order_sweep(data, max_lags)
+sweep = sweep[sweep['Lag Length'].isin(lag_range)].reset_index(drop=True) #keep lags 1 to max_lags as before
 
-#loop over each lag length and fit the VAR(p) model
-for lag in lag_range:
-    model = VAR(data)
-    fitted_model = model.fit(lag)
-    aic_values.append(fitted_model.aic)
-    bic_values.append(fitted_model.bic)
-    hqic_values.append(fitted_model.hqic)
-    fpe_values.append(fitted_model.fpe)
-    print(f"Lag {lag}: AIC = {fitted_model.aic}, BIC = {fitted_model.bic}, HQIC = {fitted_model.hqic}, FPE = {fitted_model.fpe}")
+for _, row in sweep.iterrows():
+    print(f"Lag {int(row['Lag Length'])}: AIC = {row['AIC']}, BIC = {row['BIC']}, HQIC = {row['HQIC']}, FPE = {row['FPE']}")
 
-results_df = pd.DataFrame({'Lag Length': lag_range, 'AIC': aic_values, 'BIC': bic_values, 'HQIC': hqic_values, 'FPE': fpe_values}) #create data frame to display AIC and BIC for each lag length
+results_df = sweep[['Lag Length', 'AIC', 'BIC', 'HQIC', 'FPE']] #data frame to display AIC and BIC for each lag length
 
 #Display the tableprint("\nAIC, BIC, HQIC, FPE values for different lag lengths:")
 print(results_df)
 
-print(fitted_model.sigma_u)
+print(sigma_u(data, max_lags)) #residual covariance of the largest model
 
 
 #Save the table to a CSV File
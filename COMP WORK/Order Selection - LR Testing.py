@@ -1,44 +1,29 @@
 import pandas as pd
 import os
-from statsmodels.tsa.api import VAR
-from scipy.stats import chi2 #for chi-sq test statistic
+from lag_sweep import lag_order_sweep #one-pass lag order sweep with LR statistics
+from artifact_store import load_frame, save_frame #typed artifacts shared between the scripts through Data Store
 
 # Paths for script and data
 script_dir = os.path.dirname(os.path.abspath(__file__))
 csv_folder = os.path.join(script_dir, 'CSV Data')
-csv_file_path = os.path.join(csv_folder, 'Seasonally_Differenced_Data.csv')
+csv_file_path = os.path.join(csv_folder, 'Standardized_Data.csv') #standardized seasonally differenced data (Standardizing.py)
 
-data = pd.read_csv(csv_file_path, index_col='Date', parse_dates=True) #load seasonally differenced data
-data.index = data.index.to_period('Q') #Set the frequency of the Date index to quarterly to avoid value warnings in the terminal
+data = load_frame('Standardized_Data', csv_path=csv_file_path) #typed artifact from Data Store: quarterly PeriodIndex, memory-mapped float64 columns
 
 max_lags = 15 #define max lag length to test
-K = data.shape[1] #set K as the no. of columns in the series data i.e. no. of variables in the series
-lr_results = [] #empty list to store result of likelihood ratio tests
 
-for lag in range(1, max_lags + 1): #loop over lag length 1 to max_lags (=15)
-    #Fit VAR models with p and p-1 lags
-    model_p1 = VAR(data).fit(lag)
-    model_p0 = VAR(data).fit(lag - 1)
+#one factorization gives the log-likelihood of every lag length on a common sample (see lag_sweep.py),
+#so each LR test of p-1 against p lags no longer needs two fresh VAR fits
+sweep = lag_order_sweep(data, max_lags)
+sweep = sweep[sweep['Lag Length'] >= 1] #the first test is lag 0 against lag 1
 
-    #calculate log-likelihoods for chi-sq test statistic
-    ll_p1 = model_p1.llf  # Log-likelihood of model with lag p
-    ll_p0 = model_p0.llf  # Log-likelihood of model with lag p-1
-
-    lr_stat = 2 * (ll_p1 - ll_p0) #calculate chi-sq test statistic (or LR test stat)
-    df = K**2 #set degrees of freedom = K^2
-    p_value = chi2.sf(lr_stat, df) #calculate p-value given d.f and test-stat
-
-    #store test result in a dictionary
-    lr_results.append({
-        'Lag p-1': lag - 1,
-        'Lag p': lag,
-        'LR Statistic': lr_stat,
-        'p-value': p_value,
-        'Degrees of Freedom': df
-    })
-
-
-lr_df = pd.DataFrame(lr_results) #Convert results into a data frame
+lr_df = pd.DataFrame({
+    'Lag p-1': sweep['Lag Length'] - 1,
+    'Lag p': sweep['Lag Length'],
+    'LR Statistic': sweep['LR Statistic'], #2 * (ll_p1 - ll_p0)
+    'p-value': sweep['p-value'], #chi-sq with K^2 degrees of freedom
+    'Degrees of Freedom': sweep['Degrees of Freedom']
+}).reset_index(drop=True)
 
 #display results
 print("\nLikelihood Ratio Test Results:")
@@ -46,5 +31,5 @@ print(lr_df)
 
 #Save results into a CSV
 output_path = os.path.join(csv_folder, 'LR_Test_Results.csv')
-lr_df.to_csv(output_path, index=False)
+save_frame(lr_df, 'LR_Test_Results', csv_path=output_path) #stored in Data Store, csv written as a view
 print(f"LR test results saved to: {output_path}")
\ No newline at end of file
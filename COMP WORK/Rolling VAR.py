@@ -0,0 +1,46 @@
+import pandas as pd
+import numpy as np
+import os
+from artifact_store import load_frame, save_frame #typed artifacts shared between the scripts through Data Store
+from figures import FigureSet, GRAPH_DIR, rolling_ic_figure #shared figure builders; --headless writes them to Graph Results
+from rolling_var import param_names, rolling_var_sweep #rolling/expanding VAR by recursive least squares
+
+# Paths for script and data
+script_dir = os.path.dirname(os.path.abspath(__file__))
+csv_folder = os.path.join(script_dir, 'CSV Data')
+csv_file_path = os.path.join(csv_folder, 'Standardized_Data.csv') #standardized seasonally differenced data (Standardizing.py)
+
+data = load_frame('Standardized_Data', csv_path=csv_file_path) #typed artifact from Data Store: quarterly PeriodIndex, memory-mapped float64 columns
+lag_lengths = [5, 6, 7, 8] #candidate lag lengths to track over time
+window = None #no. of quarters per rolling window (presample included), None for expanding windows
+
+if __name__ == '__main__': #guard needed because headless figure rendering starts worker processes
+    figure_set = FigureSet()
+    graph_folder = os.path.join(GRAPH_DIR, 'Rolling VAR')
+
+    #every window's coefficients are updated from the previous window's with rank-one updates
+    #(see rolling_var.py), instead of refitting VAR(data).fit(lag) on each window
+    results = rolling_var_sweep(data, lag_lengths, window)
+    criteria = []
+    for lag, result in results.items():
+        n_windows, k, K = result.params.shape
+        #long table of the coefficient paths: one row per window end, regressor and equation
+        paths = pd.DataFrame({
+            'Regressor': pd.Categorical(np.tile(np.repeat(param_names(result.names, lag), K), n_windows)),
+            'Equation': pd.Categorical(np.tile(result.names, n_windows * k)),
+            'Coefficient': result.params.reshape(-1),
+        }, index=result.ends.repeat(k * K).rename('Date'))
+        save_frame(paths, f'Rolling_VAR_Lag_{lag}', csv_path=os.path.join(csv_folder, f'Rolling_VAR_Lag_{lag}.csv'))
+        print(f"Coefficient paths for lag length {lag} ({n_windows} windows) saved to Data Store")
+
+        criteria.append(result.info_criteria.assign(**{'Lag Length': lag}))
+        figure_set.add(rolling_ic_figure, os.path.join(graph_folder, f'Information Criteria Lag {lag}.png'),
+                       info_criteria=result.info_criteria, lag=lag, window=window)
+
+    criteria_df = pd.concat(criteria)
+    output_path = os.path.join(csv_folder, 'Rolling_VAR_Info_Criteria.csv')
+    save_frame(criteria_df, 'Rolling_VAR_Info_Criteria', csv_path=output_path) #stored in Data Store, csv written as a view
+    print(f"Information criteria of every window saved to: {output_path}")
+    print(criteria_df.groupby('Lag Length')[['AIC', 'BIC', 'HQIC']].last()) #criteria on the latest window
+
+    figure_set.render()
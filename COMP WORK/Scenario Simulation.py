@@ -0,0 +1,64 @@
+import pandas as pd
+import os
+from artifact_store import load_frame, save_frame #typed artifacts shared between the scripts through Data Store
+from figures import FigureSet, GRAPH_DIR, fan_chart_figure #shared figure builders; --headless writes them to Graph Results
+from scaling import Standardizer #mean and scale of every variable before standardization (Standardizing.py)
+from scenarios import BASELINE, simulate_scenarios #vectorized Monte Carlo paths of a fitted VAR under shock paths
+from var_cache import fit_var #fitted models are shared with the other scripts through Cache/VAR Models
+
+# Paths for script and data
+script_dir = os.path.dirname(os.path.abspath(__file__))
+csv_folder = os.path.join(script_dir, 'CSV Data')
+csv_file_path = os.path.join(csv_folder, 'Standardized_Data.csv') #standardized seasonally differenced data (Standardizing.py)
+
+data = load_frame('Standardized_Data', csv_path=csv_file_path) #typed artifact from Data Store: quarterly PeriodIndex, memory-mapped float64 columns
+lag_lengths = [6, 7, 8] #lag length of models to consider
+steps = 20 #quarters to simulate
+n_paths = 100000 #simulated paths per model, shared by every scenario
+innovations = 'empirical' #'empirical' resamples the VAR residuals, 'gaussian' draws from N(0, sigma_u)
+seed = 0 #seed for reproducible paths
+thresholds = (-2.0, -1.0, 1.0, 2.0) #tail events in s.d.s of the standardized data (<= for negative, >= for positive)
+tail_horizons = (4, 8, 12, 20) #quarters ahead for the tail probabilities
+original_units = False #fan chart table in the units of the seasonally differenced data instead of s.d.s
+
+# De-dollarization scenarios: shocks in s.d.s of the orthogonalized (Cholesky) shocks of each quarter, in the
+# column order of the data. The panel has no series of foreign Treasury purchases, so a fall in foreign
+# inflows is proxied by what it would move: a higher T-bill rate and slower debt growth
+dxy_decline = {'US DXY SA': [-1.0] * 8} #one s.d. weaker dollar every quarter for two years
+inflow_fall = {'3M TBill SA': [1.0] * 4, 'US Debt SA': [-0.5] * 4} #one year of weaker foreign demand for Treasuries
+scenario_shocks = {
+    'Sustained DXY Decline': dxy_decline,
+    'Treasury Inflow Fall': inflow_fall,
+    'DXY Decline and Inflow Fall': {**dxy_decline, **inflow_fall},
+}
+
+if __name__ == '__main__': #guard needed because the simulation and figure rendering start worker processes
+    figure_set = FigureSet()
+    graph_folder = os.path.join(GRAPH_DIR, 'Scenario Simulation')
+    scaler = Standardizer.load() if original_units else None
+
+    tails = []
+    for lag in lag_lengths:
+        fitted_model = fit_var(data, lag, source='Standardized_Data.csv') #loads the model if it was already fitted on this data
+        sim = simulate_scenarios(fitted_model, scenario_shocks, steps=steps, n_paths=n_paths, method=innovations, seed=seed)
+
+        #quantiles of every variable at every horizon; the paths themselves are not kept
+        fan = sim.fan_table(scaler=scaler)
+        fan_file = os.path.join(csv_folder, f'Scenario_Fan_Lag_{lag}.csv')
+        save_frame(fan, f'Scenario_Fan_Lag_{lag}', csv_path=fan_file)
+        print(f"Fan chart quantiles for lag length {lag} ({sim.n_paths} paths) saved to: {fan_file}")
+
+        tails.append(sim.tail_table(thresholds, tail_horizons).assign(**{'Lag Length': lag}))
+        for scenario in sim.effects:
+            figure_set.add(fan_chart_figure, os.path.join(graph_folder, f'{scenario} Lag {lag}.png'),
+                           fan=fan, scenario=scenario, baseline=BASELINE)
+
+    tail_df = pd.concat(tails, ignore_index=True)
+    tail_file = os.path.join(csv_folder, 'Scenario_Tail_Probabilities.csv')
+    save_frame(tail_df, 'Scenario_Tail_Probabilities', csv_path=tail_file) #stored in Data Store, csv written as a view
+    print(f"Tail probabilities saved to: {tail_file}")
+    last = tails[-1] #chance of each event within the last horizon, for the longest lag
+    print(last[last['Horizon'] == last['Horizon'].max()].pivot_table(
+        index=['Variable', 'Threshold'], columns='Scenario', values='P(By Horizon)', observed=True).round(3))
+
+    figure_set.render()
@@ -1,261 +1,221 @@
 import pandas as pd #For data manipulation and analysis
-import numpy as np #For numerical operations
-import matplotlib.pyplot as plt #For plotting graphs
-import math #grid-size for visualizations
-import seaborn as sns #For advanced data visualization
-import matplotlib.dates as mdates
-
-from statsmodels.tsa.stattools import adfuller, kpss #For stationarity tests: ADF and KPSS tests
-from statsmodels.tsa.seasonal import STL #For seasonal decomposition
-from statsmodels.graphics.tsaplots import plot_acf #For plotting autocorrelation and partial autocorrelation functions
-from statsmodels.stats.diagnostic import acorr_ljungbox #Ljung-Box Test (for Residual Seasonality)
-import glob #For file pattern matching
+#matplotlib (and statsmodels' STL) are imported by figures.py and stl_batch.py when a figure is drawn or a series decomposed,
+#so the commented-out plotting code below needs matplotlib.pyplot as plt, matplotlib.dates as mdates, math and STL if it is used again
+
+from figures import FigureSet, GRAPH_DIR, series_figure, stl_figure #Shared figure builders; --headless writes them to Graph Results
+from stl_batch import decompose_frame #Batch STL decomposition of all variables, memoized across scripts
+from artifact_store import save_frame #Typed artifacts shared between the scripts through Data Store
+from resample import to_quarterly, to_quarter_end #Aggregation of daily/monthly inputs to quarters
+from tracing import span #Named spans for --trace / --profile runs (see tracing.py)
 import os
 
 #os.path.abspath(__file__) gets the absolute path of the script file
 #os.path.dirname() extracts the directory path from that absolute path
 script_dir = os.path.dirname(os.path.abspath(__file__))
 csv_folder = os.path.join(script_dir, 'CSV Data') #os.path.join() combines the script directory with 'CSV Data' to form the path
-csv_pattern = os.path.join(csv_folder, '*.csv') #This pattern will match all files ending with '.csv' in the 'CSV Data' folder
-csv_files = glob.glob(csv_pattern) #glob.glob() returns a list of file paths that match the given pattern
-
-# Verify that files are found
-if not csv_files:
-    print("No CSV files found in the specified directory.")
-    print(f"Expected to find CSV files in: {csv_folder}")
-else:
-    print("CSV files found:")
-    for file in csv_files:
-        print(file)
-
-# Initialize an empty list to store individual DataFrames
-data_frames = []
-
-# Proceed only if CSV files are found
-if csv_files:
-    for file in csv_files: #Loop through each CSV file and read it into a DataFrame
-        var_name = os.path.splitext(os.path.basename(file))[0] #Extract variable name from file name
-        df = pd.read_csv(file) #Read the CSV file
-        df.rename(columns={'Value': var_name}, inplace=True) #Rename the 'Value' column to the variable name
+#Read only the raw quarterly series: globbing '*.csv' would also pick up the outputs of this and later
+#scripts (Seasonally_Differenced_Data.csv, IRF_Lag_*.csv, ...) that are saved in the same folder
+raw_series = ['3M TBill SA', 'US CPI SA', 'US DXY SA', 'US Debt SA', 'US IP SA', 'US UE SA']
+csv_files = [os.path.join(csv_folder, f'{name}.csv') for name in raw_series]
+csv_files = [file for file in csv_files if os.path.exists(file)]
+#Daily or monthly inputs are aggregated to quarters before the merge: aggregator per series
+#('last' = end of period, 'mean', 'sum', 'flow' or 'compound'), 'last' if not listed
+aggregators = {}
+min_coverage = 0.8 #share of a quarter's trading days/months that must be observed, else the quarter is missing
+
+if __name__ == '__main__': #guard needed because the batch decomposition starts worker processes
+    # Verify that files are found
+    if not csv_files:
+        print("No CSV files found in the specified directory.")
+        print(f"Expected to find CSV files in: {csv_folder}")
+    else:
+        print("CSV files found:")
+        for file in csv_files:
+            print(file)
+
+    # Initialize an empty list to store individual DataFrames
+    data_frames = []
+
+    # Proceed only if CSV files are found
+    if csv_files:
+        with span('read and merge', files=len(csv_files)):
+            for file in csv_files: #Loop through each CSV file and read it into a DataFrame
+                var_name = os.path.splitext(os.path.basename(file))[0] #Extract variable name from file name
+                df = pd.read_csv(file) #Read the CSV file
+                df.rename(columns={'Value': var_name}, inplace=True) #Rename the 'Value' column to the variable name
         
-        #Convert 'Date' column to datetime and set as index
-        df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y')
-        df.set_index('Date', inplace=True)
+                #Convert 'Date' column to datetime and set as index
+                df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y')
+                df.set_index('Date', inplace=True)
+                if not df.index.is_quarter_end.all(): #daily/monthly data (or quarterly data not dated at quarter end)
+                    df = to_quarter_end(to_quarterly(df, how=aggregators.get(var_name, 'last'), min_coverage=min_coverage))
         
-        data_frames.append(df) #Append the DataFrame to the list
+                data_frames.append(df) #Append the DataFrame to the list
 
-    data = pd.concat(data_frames, axis=1) #Combines all DataFrames along the columns, aligning them on the 'Date' index
-    data.sort_index(inplace=True)   #Sort the DataFrame by Date (index)
-    
-    #Check for missing values
-    print("Missing values per variable:")
-    print(data.isnull().sum())
+            data = pd.concat(data_frames, axis=1) #Combines all DataFrames along the columns, aligning them on the 'Date' index
+        data.sort_index(inplace=True)   #Sort the DataFrame by Date (index)
     
-    data.dropna(inplace=True) #Optionally, drop rows with any missing values
-    variables = data.columns.tolist()  #Get the list of variable names
+        #Check for missing values
+        print("Missing values per variable:")
+        print(data.isnull().sum())
     
-    #If these checks are cleared, then we can proceed with our analysis
-else:
-    print("Cannot proceed with analysis without data.")
-
-#Plot time series of all variables for visual inspection of seasonality
-#This code plots them all on the same figure
-#variables = data.columns.tolist() #get list of the variables
-#num_vars = len(variables) #determine the no. of variables
-#cols = 2 #no. of columns for the subplot grid
-#rows = math.ceil(num_vars / cols) #3 rows in this case
-#fig, axes = plt.subplots(nrows = rows, ncols = cols, figsize = (15, 5 * rows)) #create the figure and grid of subplots
-#axes = axes.flatten() #flatten axes for easy indexing
-#for i, var in enumerate(variables): #loop through each variable and corresponding axis
-    #ax = axes[i] #select the subplot axis
-    #ax.plot(data.index, data[var]) #plot the time series data for the variable on the selected axis
-    #set title and axis labels for the plots
-    #ax.set_title(f'Time Series Plot of {var}')
-    #ax.set_xlabel('Date')
-    #ax.set_ylabel('Value')
-    #ax.tick_params(axis='x', rotation=45) #rotate x-axis labels if needed for better look
-    #set major ticks for every 4 years (already existing)
-    #ax.xaxis.set_major_locator(mdates.YearLocator(4))
-    #ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-    # Set minor ticks for every year
-    #ax.xaxis.set_minor_locator(mdates.YearLocator(1))
-    #ax.tick_params(axis='x', which='minor', length=5)
-#if num_vars < len(axes): #remove any unused subplots
-    #for i in range(num_vars, len(axes)):
-        #fig.delaxes(axes[i])
-#plt.tight_layout #adjust layout to prevent overlap
-#plt.show()
-
-# Plot each time series separately
-for var in variables:  # loop through each variable
-    plt.figure(figsize=(10, 5))
-    plt.plot(data.index, data[var])
-    plt.title(f'Time Series Plot of {var}')
-    plt.xlabel('Date')
-    plt.ylabel('Value')
-    plt.xticks(rotation=45)
-    
-    # Set major ticks for every 4 years
-    plt.gca().xaxis.set_major_locator(mdates.YearLocator(4))
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-
-    # Set minor ticks for each quarter without labels
-    plt.gca().xaxis.set_minor_locator(mdates.MonthLocator([3, 9]))  #adjust this for whatever ticks you want to see
-
-    plt.tight_layout()
-    plt.show()
-
-#Perform Seasonal Decomposition using Loess (STL)
-for var in variables:
-    series = data[var].dropna()  # exclude missing values
-    stl = STL(series, period=4)  # period=4 for quarterly data
-    result = stl.fit()
+        data.dropna(inplace=True) #Optionally, drop rows with any missing values
+        variables = data.columns.tolist()  #Get the list of variable names
     
-    # Use result.plot() to plot the STL decomposition
-    fig = result.plot()
-    fig.set_size_inches(10, 8)
+        #If these checks are cleared, then we can proceed with our analysis
+    else:
+        print("Cannot proceed with analysis without data.")
+
+    #Plot time series of all variables for visual inspection of seasonality
+    #This code plots them all on the same figure
+    #variables = data.columns.tolist() #get list of the variables
+    #num_vars = len(variables) #determine the no. of variables
+    #cols = 2 #no. of columns for the subplot grid
+    #rows = math.ceil(num_vars / cols) #3 rows in this case
+    #fig, axes = plt.subplots(nrows = rows, ncols = cols, figsize = (15, 5 * rows)) #create the figure and grid of subplots
+    #axes = axes.flatten() #flatten axes for easy indexing
+    #for i, var in enumerate(variables): #loop through each variable and corresponding axis
+        #ax = axes[i] #select the subplot axis
+        #ax.plot(data.index, data[var]) #plot the time series data for the variable on the selected axis
+        #set title and axis labels for the plots
+        #ax.set_title(f'Time Series Plot of {var}')
+        #ax.set_xlabel('Date')
+        #ax.set_ylabel('Value')
+        #ax.tick_params(axis='x', rotation=45) #rotate x-axis labels if needed for better look
+        #set major ticks for every 4 years (already existing)
+        #ax.xaxis.set_major_locator(mdates.YearLocator(4))
+        #ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
+        # Set minor ticks for every year
+        #ax.xaxis.set_minor_locator(mdates.YearLocator(1))
+        #ax.tick_params(axis='x', which='minor', length=5)
+    #if num_vars < len(axes): #remove any unused subplots
+        #for i in range(num_vars, len(axes)):
+            #fig.delaxes(axes[i])
+    #plt.tight_layout #adjust layout to prevent overlap
+    #plt.show()
+
+    # Plot each time series separately (major ticks every 4 years, minor ticks in March and September)
+    #interactively each figure is shown in turn; with --headless they are written to Graph Results/Seasonality Check
+    figure_set = FigureSet()
+    graph_folder = os.path.join(GRAPH_DIR, 'Seasonality Check')
+    for var in variables:  # loop through each variable
+        figure_set.add(series_figure, os.path.join(graph_folder, 'Time Series Plots', f'{var}.png'),
+                       series=data[var], title=f'Time Series Plot of {var}')
+
+    #Perform Seasonal Decomposition using Loess (STL)
+    #all variables are decomposed in one batch (in parallel, and memoized in Cache/STL), so the plots, the detrending
+    #of the special variable below and Detrending.py all reuse the same decomposition
+    stl_results = decompose_frame(data, period=4)  # period=4 for quarterly data, missing values excluded per series
+    for var in variables:
+        result = stl_results.decompose_result(var)
     
-    # Access all axes from the generated figure
-    for ax in fig.axes:
-        # Set major ticks for every 4 years
-        ax.xaxis.set_major_locator(mdates.YearLocator(4))
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-
-        # Set minor ticks for each quarter without labels
-        ax.xaxis.set_minor_locator(mdates.MonthLocator([3, 9]))  #adjust this for whatever ticks you want to see
-
-        # Rotate x-axis labels for better readability
-        ax.tick_params(axis='x', rotation=45)
-
-    plt.suptitle(f'STL Decomposition of {var}', fontsize=16)
-    plt.tight_layout()
-    plt.show()
+        # Use result.plot() to plot the STL decomposition
+        figure_set.add(stl_figure, os.path.join(graph_folder, 'STL Decompositions', f'{var}.png'),
+                       decomposition=result, title=f'STL Decomposition of {var}')
     
-    # Calculate seasonal strength
-    seasonal_component = result.seasonal
-    variance_original = np.var(series)
-    variance_seasonal = np.var(seasonal_component)
-    seasonal_strength = variance_seasonal / variance_original
-
-    print(f'Seasonal Strength for {var}: {seasonal_strength:.4f}')  # Print the seasonal strength
-
-#Visual inspection and then seasonal strength matrics show that all series exhibit moderate to strong seasonality
-
-# Create a copy of original data for seasonal differencing
-data_diff_seasonal = data.copy()
-vars_to_seasonally_diff = ['3M TBill SA', 'US CPI SA', 'US DXY SA', 'US IP SA', 'US UE SA']
-special_var = 'US Debt SA'
-
-# Detrend and seasonally difference the special variable
-if special_var in data.columns:
-    series = data[special_var].dropna()
-    stl = STL(series, period=4)
-    result = stl.fit()
-    detrended_series = series - result.trend
-    detrended_seasonally_diff = detrended_series.diff(periods=4).dropna()
-    data_diff_seasonal[special_var] = detrended_seasonally_diff
-    print(f"{special_var} has been detrended and seasonally differenced.")
-
-
-# Apply seasonal differencing with lag = 4 for all other variables
-for var in vars_to_seasonally_diff:
-    if var in data.columns:
-        data_diff_seasonal[var] = data[var].diff(periods=4)
-
-# Drop rows with NaN values resulting from differencing
-data_diff_seasonal.dropna(inplace=True)
-
-# Reorder the columns to include all variables properly (including the special variable)
-data_diff_seasonal = data_diff_seasonal[vars_to_seasonally_diff + [special_var]]
-
-# Print the head of the merged seasonally differenced data to verify
-print("Merged Seasonally Differenced Data:")
-print(data_diff_seasonal.head())
-
-# Visualize the seasonally differenced series
-#This code plots all the seasonally differenced series on the same figure
-#num_vars_diff = len(vars_to_seasonally_diff)  # Number of variables
-#cols = 2  # Number of columns for the subplot grid
-#rows = math.ceil(num_vars_diff / cols)
-#fig, axes = plt.subplots(nrows=rows, ncols=cols, figsize=(15, 5 * rows))
-#axes = axes.flatten()
-#for i, var in enumerate(vars_to_seasonally_diff):
-    #ax = axes[i]
-    #ax.plot(data_diff_seasonal.index, data_diff_seasonal[var])
-    #ax.set_title(f'Seasonally Differenced Series of {var}')
-    #ax.set_xlabel('Date')
-    #ax.set_ylabel('Seasonally Differenced Value')
-    #ax.tick_params(axis='x', rotation=45)
-    #set major ticks for every 4 years (already existing)
-    #ax.xaxis.set_major_locator(mdates.YearLocator(4))
-    #ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-    # Set minor ticks for every year
-    #ax.xaxis.set_minor_locator(mdates.YearLocator(1))
-    #ax.tick_params(axis='x', which='minor', length=5)
-#if num_vars_diff < len(axes):  # Remove any unused subplots
-    #for i in range(num_vars_diff, len(axes)):
-        #fig.delaxes(axes[i])
-#plt.tight_layout()
-#plt.show()
-
-# Plot each seasonally differenced series separately
-for var in data_diff_seasonal.columns:
-    plt.figure(figsize=(10, 5))
-    plt.plot(data_diff_seasonal.index, data_diff_seasonal[var])
-    plt.title(f'Seasonally Differenced Series of {var}')
-    plt.xlabel('Date')
-    plt.ylabel('Seasonally Differenced Value')
-    plt.xticks(rotation=45)
-    
-    # Set major ticks for every 4 years
-    plt.gca().xaxis.set_major_locator(mdates.YearLocator(4))
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-
-    # Set minor ticks for each quarter without labels
-    plt.gca().xaxis.set_minor_locator(mdates.MonthLocator([3, 9])) #adjust this for whatever ticks you want to see
+        # Seasonal strength = variance of the seasonal component / variance of the series
+        seasonal_strength = stl_results.strength.loc[var, 'Seasonal Strength']
+
+        print(f'Seasonal Strength for {var}: {seasonal_strength:.4f}')  # Print the seasonal strength
+
+    #Visual inspection and then seasonal strength matrics show that all series exhibit moderate to strong seasonality
+
+    # Create a copy of original data for seasonal differencing
+    data_diff_seasonal = data.copy()
+    vars_to_seasonally_diff = ['3M TBill SA', 'US CPI SA', 'US DXY SA', 'US IP SA', 'US UE SA']
+    special_var = 'US Debt SA'
+
+    # Detrend and seasonally difference the special variable
+    if special_var in data.columns:
+        detrended_series = stl_results.detrended(special_var) #reuse the trend from the decomposition above
+        detrended_seasonally_diff = detrended_series.diff(periods=4).dropna()
+        data_diff_seasonal[special_var] = detrended_seasonally_diff
+        print(f"{special_var} has been detrended and seasonally differenced.")
+
+
+    # Apply seasonal differencing with lag = 4 for all other variables
+    for var in vars_to_seasonally_diff:
+        if var in data.columns:
+            data_diff_seasonal[var] = data[var].diff(periods=4)
+
+    # Drop rows with NaN values resulting from differencing
+    data_diff_seasonal.dropna(inplace=True)
+
+    # Reorder the columns to include all variables properly (including the special variable)
+    data_diff_seasonal = data_diff_seasonal[vars_to_seasonally_diff + [special_var]]
+
+    # Print the head of the merged seasonally differenced data to verify
+    print("Merged Seasonally Differenced Data:")
+    print(data_diff_seasonal.head())
+
+    # Visualize the seasonally differenced series
+    #This code plots all the seasonally differenced series on the same figure
+    #num_vars_diff = len(vars_to_seasonally_diff)  # Number of variables
+    #cols = 2  # Number of columns for the subplot grid
+    #rows = math.ceil(num_vars_diff / cols)
+    #fig, axes = plt.subplots(nrows=rows, ncols=cols, figsize=(15, 5 * rows))
+    #axes = axes.flatten()
+    #for i, var in enumerate(vars_to_seasonally_diff):
+        #ax = axes[i]
+        #ax.plot(data_diff_seasonal.index, data_diff_seasonal[var])
+        #ax.set_title(f'Seasonally Differenced Series of {var}')
+        #ax.set_xlabel('Date')
+        #ax.set_ylabel('Seasonally Differenced Value')
+        #ax.tick_params(axis='x', rotation=45)
+        #set major ticks for every 4 years (already existing)
+        #ax.xaxis.set_major_locator(mdates.YearLocator(4))
+        #ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
+        # Set minor ticks for every year
+        #ax.xaxis.set_minor_locator(mdates.YearLocator(1))
+        #ax.tick_params(axis='x', which='minor', length=5)
+    #if num_vars_diff < len(axes):  # Remove any unused subplots
+        #for i in range(num_vars_diff, len(axes)):
+            #fig.delaxes(axes[i])
+    #plt.tight_layout()
+    #plt.show()
 
-    plt.tight_layout()
-    plt.show()
+    # Plot each seasonally differenced series separately
+    for var in data_diff_seasonal.columns:
+        figure_set.add(series_figure, os.path.join(graph_folder, 'Seasonally Differenced Time Series Plots', f'{var}.png'),
+                       series=data_diff_seasonal[var], title=f'Seasonally Differenced Series of {var}',
+                       ylabel='Seasonally Differenced Value')
 
-# Define output path to save data in the 'CSV Data' folder
-csv_output_folder = os.path.join(script_dir, 'CSV Data')
-output_path = os.path.join(csv_output_folder, 'Seasonally_Differenced_Data.csv')
-data_diff_seasonal.to_csv(output_path)
+    # Define output path to save data in the 'CSV Data' folder
+    csv_output_folder = os.path.join(script_dir, 'CSV Data')
+    output_path = os.path.join(csv_output_folder, 'Seasonally_Differenced_Data.csv')
+    save_frame(data_diff_seasonal.to_period('Q'), 'Seasonally_Differenced_Data', csv_path=output_path) #stored in Data Store with a quarterly index, csv written as a view
 
-print(f"Seasonally differenced data saved to: {output_path}")  # Confirm that the CSV was saved
+    print(f"Seasonally differenced data saved to: {output_path}")  # Confirm that the CSV was saved
 
-print('The following are the seasonal strengths for the seasonally differenced series')
-for var in data_diff_seasonal.columns:
-    series = data_diff_seasonal[var].dropna()  # Exclude any missing values
-    stl = STL(series, period=4)
-    result = stl.fit()
+    print('The following are the seasonal strengths for the seasonally differenced series')
+    diff_stl_results = decompose_frame(data_diff_seasonal, period=4) #one batch for all the differenced series
+    for var in data_diff_seasonal.columns:
+        seasonal_strength = diff_stl_results.strength.loc[var, 'Seasonal Strength']
     
-    # Calculate seasonal strength
-    seasonal_component = result.seasonal
-    variance_original = np.var(series)
-    variance_seasonal = np.var(seasonal_component)
-    seasonal_strength = variance_seasonal / variance_original
-    
-    # Print the seasonal strength
-    print(f'Seasonal Strength for {var}: {seasonal_strength:.4f}')
-
-# Perform STL decomposition on the seasonally differenced series
-#for var in vars_to_seasonally_diff:
-    #series = data_diff_seasonal[var].dropna()  # exclude missing values from the differenced series
-    #stl = STL(series, period=4)  # period=4 for quarterly data
-    #result = stl.fit()
-    # Use result.plot() to plot the STL decomposition
-    #fig = result.plot()
-    #fig.set_size_inches(10, 8)
-    # Access all axes from the generated figure
-    #for ax in fig.axes:
-        # Set major ticks for every 4 years
-        #ax.xaxis.set_major_locator(mdates.YearLocator(4))
-        #ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
-        # Set minor ticks for each quarter without labels
-        #ax.xaxis.set_minor_locator(mdates.MonthLocator([3, 6, 9, 12]))
-        # Rotate x-axis labels for better readability
-        #ax.tick_params(axis='x', rotation=45)
-    #plt.suptitle(f'STL Decomposition of Seasonally Differenced {var}', fontsize=16)
-    #plt.tight_layout()
-    #plt.show()
\ No newline at end of file
+        # Print the seasonal strength
+        print(f'Seasonal Strength for {var}: {seasonal_strength:.4f}')
+
+    rendered, skipped = figure_set.render() #headless mode: draw all queued figures in parallel worker processes
+    if figure_set.headless:
+        print(f"{rendered} figures written to {graph_folder} ({skipped} unchanged figures skipped)")
+
+    # Perform STL decomposition on the seasonally differenced series
+    #for var in vars_to_seasonally_diff:
+        #series = data_diff_seasonal[var].dropna()  # exclude missing values from the differenced series
+        #stl = STL(series, period=4)  # period=4 for quarterly data
+        #result = stl.fit()
+        # Use result.plot() to plot the STL decomposition
+        #fig = result.plot()
+        #fig.set_size_inches(10, 8)
+        # Access all axes from the generated figure
+        #for ax in fig.axes:
+            # Set major ticks for every 4 years
+            #ax.xaxis.set_major_locator(mdates.YearLocator(4))
+            #ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
+            # Set minor ticks for each quarter without labels
+            #ax.xaxis.set_minor_locator(mdates.MonthLocator([3, 6, 9, 12]))
+            # Rotate x-axis labels for better readability
+            #ax.tick_params(axis='x', rotation=45)
+        #plt.suptitle(f'STL Decomposition of Seasonally Differenced {var}', fontsize=16)
+        #plt.tight_layout()
+        #plt.show()
\ No newline at end of file
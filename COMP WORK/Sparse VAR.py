@@ -0,0 +1,45 @@
+import pandas as pd
+import os
+from artifact_store import load_frame, save_frame #typed artifacts shared between the scripts through Data Store
+from irf_export import irf_long_table #vectorized long-format IRF export
+from sparse_var import fit_sparse_var, sparse_lag_table #lasso / elastic-net / group-lasso VAR with cross-validated penalty
+
+# Paths for script and data
+script_dir = os.path.dirname(os.path.abspath(__file__))
+csv_folder = os.path.join(script_dir, 'CSV Data')
+csv_file_path = os.path.join(csv_folder, 'Standardized_Data.csv') #standardized seasonally differenced data (Standardizing.py)
+
+data = load_frame('Standardized_Data', csv_path=csv_file_path) #typed artifact from Data Store: quarterly PeriodIndex, memory-mapped float64 columns
+lag_lengths = [4, 6, 8] #candidate lag lengths; the penalty keeps the larger models estimable
+penalty = 'lasso' #'lasso', 'elastic-net' or 'group' (a variable's lags enter or leave an equation together)
+l1_ratio = 1.0 #lasso share of the elastic-net penalty
+lambda_rule = 'min' #'min' CV error, or '1se' for the sparsest model within one standard error of it
+cv_folds = 5 #rolling-origin validation blocks over the second half of the sample
+irf_periods = 20 #no. of periods for the impulse responses of the penalized models
+
+if __name__ == '__main__': #guard needed because the cross-validation folds run in worker processes
+    fits = {}
+    cv_tables = []
+    for lag in lag_lengths:
+        #every equation is fitted along a warm-started penalty path (see sparse_var.py) and the
+        #penalty is picked by one-step-ahead errors on the validation blocks
+        fit = fit_sparse_var(data, lag, penalty, l1_ratio, rule=lambda_rule, n_folds=cv_folds)
+        fits[lag] = fit
+        cv_tables.append(fit.cv.assign(**{'Lag Length': lag, 'Selected': fit.cv['Lambda'] == fit.lam}))
+        print(f"Lag {lag}: lambda = {fit.lam:.4g}, {fit.sparsity:.0%} of the slope coefficients are zero")
+
+        #impulse responses of the penalized model in the IRF_Lag_{lag} layout; the asymptotic
+        #bands assume OLS estimates, so only the point responses are exported
+        irf_df = irf_long_table(fit.results.irf(irf_periods), fit.names, bands=False)
+        output_file = os.path.join(csv_folder, f'Sparse_IRF_Lag_{lag}.csv')
+        save_frame(irf_df, f'Sparse_IRF_Lag_{lag}', csv_path=output_file)
+        print(f"IRF data for lag length {lag} saved to: {output_file}")
+
+    cv_df = pd.concat(cv_tables, ignore_index=True)
+    save_frame(cv_df, 'Sparse_VAR_CV', csv_path=os.path.join(csv_folder, 'Sparse_VAR_CV.csv'))
+
+    results_df = sparse_lag_table(fits)
+    output_path = os.path.join(csv_folder, 'Sparse_VAR_Info_Criteria.csv')
+    save_frame(results_df, 'Sparse_VAR_Info_Criteria', csv_path=output_path) #stored in Data Store, csv written as a view
+    print(results_df)
+    print(f"Penalty, sparsity and information criteria saved to: {output_path}")
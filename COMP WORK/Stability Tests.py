@@ -0,0 +1,41 @@
+import numpy as np
+import os
+from artifact_store import load_frame, save_frame #typed artifacts shared between the scripts through Data Store
+from figures import FigureSet, GRAPH_DIR, cusum_figure #shared figure builders; --headless writes them to Graph Results
+from stability import OLS_CUSUM_CRIT, REC_CUSUM_CRIT, ols_cusum, recursive_cusum, recursive_residuals, stability_table, var_regression
+from var_cache import fit_var #fitted models are shared with the other scripts through Cache/VAR Models
+
+# Paths for script and data
+script_dir = os.path.dirname(os.path.abspath(__file__))
+csv_folder = os.path.join(script_dir, 'CSV Data')
+csv_file_path = os.path.join(csv_folder, 'Standardized_Data.csv') #standardized seasonally differenced data (Standardizing.py)
+
+data = load_frame('Standardized_Data', csv_path=csv_file_path) #typed artifact from Data Store: quarterly PeriodIndex, memory-mapped float64 columns
+lag_lengths = [1, 2, 3, 4, 5, 6, 7, 8] #model specs to screen
+trim = 0.15 #share of the sample at each end that is not considered as a break date
+signif = 0.05 #significance level of the CUSUM boundaries
+
+if __name__ == '__main__': #guard needed because headless figure rendering starts worker processes
+    figure_set = FigureSet()
+    graph_folder = os.path.join(GRAPH_DIR, 'Stability Tests')
+    models = {f'VAR({lag})': fit_var(data, lag, source='Standardized_Data.csv') for lag in lag_lengths}
+
+    #OLS-CUSUM, recursive CUSUM and sup-F/Chow statistics of every equation of every model in one table
+    results_df = stability_table(models, trim=trim, signif=signif)
+    print(results_df.to_string(index=False))
+    output_path = os.path.join(csv_folder, 'Stability_Test_Results.csv')
+    save_frame(results_df, 'Stability_Test_Results', csv_path=output_path) #stored in Data Store, csv written as a view
+    print(f"Stability test results saved to: {output_path}")
+
+    for lag, (name, model) in zip(lag_lengths, models.items()): #fluctuation processes of all equations, one figure per model
+        Z, Y, names, labels = var_regression(model)
+        resid = Y - Z @ np.asarray(model.params)
+        figure_set.add(cusum_figure, os.path.join(graph_folder, f'OLS-CUSUM Lag {lag}.png'),
+                       process=ols_cusum(resid, Z.shape[1]), names=names, bound=OLS_CUSUM_CRIT[signif], title='OLS-CUSUM')
+        W, bound = recursive_cusum(recursive_residuals(Z, Y), signif)
+        n = len(W)
+        figure_set.add(cusum_figure, os.path.join(graph_folder, f'Recursive CUSUM Lag {lag}.png'),
+                       process=np.vstack([np.zeros((1, W.shape[1])), W / np.sqrt(n)]), names=names,
+                       bound=np.r_[REC_CUSUM_CRIT[signif], bound / np.sqrt(n)], title='Rec-CUSUM')
+
+    figure_set.render()
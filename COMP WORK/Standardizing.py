@@ -1,22 +1,19 @@
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
+import os
+from scaling import PARAMS_NAME, standardize_artifact #streaming standardization that keeps the mean and scale of every column
 
-# Define the file path
-file_path = 'CSV Data/Seasonally_Differenced_Data.csv'
+# Define the file paths (relative to this script, so it can be run from any folder)
+script_dir = os.path.dirname(os.path.abspath(__file__))
+file_path = os.path.join(script_dir, 'CSV Data', 'Seasonally_Differenced_Data.csv')
+output_path = os.path.join(script_dir, 'CSV Data', 'Standardized_Data.csv') #separate file, so rerunning never standardizes twice
+params_path = os.path.join(script_dir, 'CSV Data', f'{PARAMS_NAME}.csv') #mean and scale of every variable
 
-# Load the CSV data into a DataFrame
-df = pd.read_csv(file_path)
+# Standardize every column (the date is the index) of the seasonally differenced data: one streaming pass over the
+# memory-mapped artifact for the means and standard deviations (as sklearn's StandardScaler, ddof=0), one for the output.
+# The original file is left untouched for the other stages, and the parameters are stored as their own artifact,
+# so IRFs, FEVDs and forecasts can be mapped back to the original units (Standardizer.unscale_table/inverse_transform)
+df, scaler = standardize_artifact('Seasonally_Differenced_Data', 'Standardized_Data', source_csv=file_path,
+                                  target_csv=output_path, params_csv=params_path)
 
-# Identify the columns to be standardized (excluding the date column and header)
-columns_to_standardize = df.columns[1:]  # Assuming the first column is the date
-
-# Initialize the scaler
-scaler = StandardScaler()
-
-# Standardize only the specified columns
-df[columns_to_standardize] = scaler.fit_transform(df[columns_to_standardize])
-
-# Overwrite the original file with the standardized data
-df.to_csv(file_path, index=False)
-
-print("Data has been standardized (excluding header and date column) and saved to the original file.")
+print(scaler.to_frame()[['Mean', 'Scale', 'Count']].to_string())
+print(f"Data has been standardized (excluding header and date column) and saved to: {output_path}")
+print(f"Standardization parameters saved to: {params_path}")
@@ -0,0 +1,207 @@
+"""Typed, columnar store for the data frames passed between the analysis scripts.
+
+Every artifact is a folder under Data Store/ holding plain .npy files plus a small
+meta.json sidecar:
+
+- all float64 columns in one column-major (n_rows, n_cols) array, so each column is
+  contiguous on disk and np.load(mmap_mode='r') gives a zero-copy data frame
+- other numeric columns as one .npy each; text columns as categorical codes
+- the index as int64 ordinals/nanoseconds with its type and frequency in meta.json,
+  so a quarterly PeriodIndex comes back as a PeriodIndex without any date parsing
+
+CSV files are still written next to it as an optional view (set VAR_WRITE_CSV=0 to
+skip them), and load_frame() re-imports a csv that is newer than its artifact.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(script_dir, 'Data Store') #default location of the stored artifacts
+WRITE_CSV = os.environ.get('VAR_WRITE_CSV', '1') != '0' #also write the csv view of each artifact
+FORMAT_VERSION = 1
+
+
+def artifact_dir(name, store_dir=STORE_DIR):
+    return os.path.join(store_dir, name)
+
+
+def meta_path(name, store_dir=STORE_DIR):
+    """Path of an artifact's sidecar; its contents change only when the stored data changes."""
+    return os.path.join(artifact_dir(name, store_dir), 'meta.json')
+
+
+def _csv_stamp_path(name, store_dir):
+    #kept out of meta.json, so rewriting an identical csv view leaves meta.json byte-identical
+    return os.path.join(artifact_dir(name, store_dir), 'csv.json')
+
+
+def _save_array(folder, file_name, arr, digest):
+    np.save(os.path.join(folder, file_name), arr)
+    digest.update(file_name.encode())
+    digest.update(np.ascontiguousarray(arr).view(np.uint8).tobytes() if arr.size else b'')
+
+
+def _index_meta(index, folder, digest):
+    if isinstance(index, pd.RangeIndex):
+        return {'kind': 'range', 'start': index.start, 'stop': index.stop, 'step': index.step, 'name': index.name}
+    if isinstance(index, pd.PeriodIndex):
+        _save_array(folder, 'index.npy', index.asi8, digest)
+        return {'kind': 'period', 'freq': index.freqstr, 'name': index.name}
+    if isinstance(index, pd.DatetimeIndex):
+        _save_array(folder, 'index.npy', index.as_unit('ns').asi8, digest)
+        return {'kind': 'datetime', 'name': index.name}
+    labels = pd.Categorical(index.astype(str))
+    _save_array(folder, 'index.npy', labels.codes.astype(np.int32), digest)
+    return {'kind': 'labels', 'categories': list(labels.categories), 'name': index.name}
+
+
+def _csv_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return {'path': os.path.abspath(csv_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def save_frame(df, name, csv_path=None, store_dir=STORE_DIR, write_csv=None):
+    """Store a data frame as artifact `name`; also write its csv view to csv_path if given.
+
+    write_csv=False only records which existing csv_path the artifact corresponds to.
+    """
+    folder = artifact_dir(name, store_dir)
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_folder = tempfile.mkdtemp(dir=store_dir, prefix=f'{name}.', suffix='.tmp') #unique, so concurrent saves never share it
+    os.chmod(tmp_folder, 0o755) #mkdtemp makes it private
+    digest = hashlib.sha256()
+
+    floats = [c for c in df.columns if df[c].dtype == np.float64]
+    columns = []
+    if floats:
+        _save_array(tmp_folder, 'float64.npy', np.asfortranarray(df[floats].to_numpy()), digest)
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        if col in floats:
+            columns.append({'name': col, 'kind': 'float64', 'position': floats.index(col)})
+        elif pd.api.types.is_numeric_dtype(series.dtype) and not isinstance(series.dtype, pd.CategoricalDtype):
+            _save_array(tmp_folder, f'col{i}.npy', series.to_numpy(), digest)
+            columns.append({'name': col, 'kind': 'numeric', 'file': f'col{i}.npy'})
+        else: #text and categorical columns: small integer codes plus the category labels
+            cat = series.astype('category').cat
+            _save_array(tmp_folder, f'col{i}.npy', cat.codes.to_numpy(), digest)
+            columns.append({'name': col, 'kind': 'category', 'file': f'col{i}.npy', 'categories': [str(c) for c in cat.categories]})
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'n_rows': len(df),
+        'columns': columns,
+        'index': _index_meta(df.index, tmp_folder, digest),
+    }
+    meta['sha256'] = hashlib.sha256(digest.hexdigest().encode() + json.dumps(meta, sort_keys=True, default=str).encode()).hexdigest()
+
+    write_csv = WRITE_CSV if write_csv is None else write_csv
+    if csv_path is not None and write_csv:
+        csv_view(df).to_csv(csv_path, index=not isinstance(df.index, pd.RangeIndex))
+    if csv_path is not None and os.path.exists(csv_path):
+        with open(os.path.join(tmp_folder, 'csv.json'), 'w') as f:
+            json.dump(_csv_stamp(csv_path), f) #the csv version this artifact matches, see load_frame()
+
+    with open(os.path.join(tmp_folder, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1, default=str)
+    shutil.rmtree(folder, ignore_errors=True)
+    try:
+        os.replace(tmp_folder, folder)
+    except OSError: #another process stored the artifact in between: keep its complete copy
+        shutil.rmtree(tmp_folder, ignore_errors=True)
+    return folder
+
+
+def read_meta(name, store_dir=STORE_DIR):
+    with open(meta_path(name, store_dir)) as f:
+        return json.load(f)
+
+
+def _read_csv_stamp(name, store_dir):
+    try:
+        with open(_csv_stamp_path(name, store_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_frame(name, csv_path=None, store_dir=STORE_DIR, mmap=True):
+    """Load artifact `name` as a data frame (float columns memory-mapped, no copy).
+
+    If the artifact does not exist yet, or csv_path was modified after the artifact
+    was written, the csv is parsed once and imported into the store.
+    """
+    try:
+        meta = read_meta(name, store_dir)
+    except (OSError, ValueError):
+        meta = None
+    if csv_path is not None and os.path.exists(csv_path):
+        if meta is None or _read_csv_stamp(name, store_dir) != _csv_stamp(csv_path):
+            save_frame(read_csv_view(csv_path), name, csv_path=csv_path, store_dir=store_dir, write_csv=False)
+            meta = read_meta(name, store_dir)
+    if meta is None:
+        raise FileNotFoundError(f"no artifact '{name}' in {store_dir}")
+
+    folder = artifact_dir(name, store_dir)
+    mode = 'r' if mmap else None
+    index = _load_index(meta['index'], folder, mode)
+    data = {}
+    floats = None
+    for col in meta['columns']:
+        if col['kind'] == 'float64':
+            if floats is None:
+                floats = np.load(os.path.join(folder, 'float64.npy'), mmap_mode=mode)
+            data[col['name']] = col['position']
+        elif col['kind'] == 'numeric':
+            data[col['name']] = np.load(os.path.join(folder, col['file']), mmap_mode=mode)
+        else:
+            codes = np.load(os.path.join(folder, col['file']))
+            data[col['name']] = pd.Categorical.from_codes(codes, categories=col['categories'])
+
+    float_names = [c['name'] for c in meta['columns'] if c['kind'] == 'float64']
+    if len(float_names) == len(meta['columns']): #all-float panel: one block straight over the mapped file
+        return pd.DataFrame(floats, index=index, columns=float_names, copy=False)
+    return pd.DataFrame({name: (floats[:, data[name]] if name in float_names else data[name]) for name in data},
+                        index=index, copy=False)
+
+
+def _load_index(index_meta, folder, mode):
+    kind = index_meta['kind']
+    if kind == 'range':
+        return pd.RangeIndex(index_meta['start'], index_meta['stop'], index_meta['step'], name=index_meta['name'])
+    values = np.load(os.path.join(folder, 'index.npy'), mmap_mode=mode)
+    if kind == 'period':
+        return pd.PeriodIndex.from_ordinals(np.asarray(values), freq=index_meta['freq']).rename(index_meta['name'])
+    if kind == 'datetime':
+        return pd.DatetimeIndex(np.asarray(values).view('M8[ns]'), name=index_meta['name'])
+    return pd.Index(pd.Categorical.from_codes(values, categories=index_meta['categories']).astype(str), name=index_meta['name'])
+
+
+def csv_view(df):
+    """The frame as it is written to csv: quarterly periods become quarter-end dates."""
+    if isinstance(df.index, pd.PeriodIndex):
+        df = df.copy(deep=False)
+        df.index = df.index.to_timestamp(how='end').normalize().rename(df.index.name or 'Date')
+    return df
+
+
+def read_csv_view(csv_path):
+    """Parse a csv written by the scripts; a quarter-end 'Date' column becomes a quarterly PeriodIndex."""
+    df = pd.read_csv(csv_path, float_precision='round_trip') #exact float64 values, not the fast approximate parser
+    if 'Date' in df.columns:
+        df['Date'] = pd.to_datetime(df['Date']).dt.to_period('Q')
+        df = df.set_index('Date')
+    return df
+
+
+def export_csv(name, csv_path, store_dir=STORE_DIR):
+    """Write the csv view of a stored artifact."""
+    df = load_frame(name, store_dir=store_dir)
+    csv_view(df).to_csv(csv_path, index=not isinstance(df.index, pd.RangeIndex))
+    return csv_path
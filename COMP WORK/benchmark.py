@@ -0,0 +1,327 @@
+"""Timing and memory benchmarks of the analysis stages on synthetic data.
+
+A seeded generator draws a stable VAR(p) with K series and T quarters (the coefficients
+are rescaled so the companion matrix has spectral radius `radius`) and adds a quarterly
+seasonal pattern to every series. Each stage is then run on that panel with the
+project's own functions:
+
+    ingest           K monthly workbooks (minimal xlsx files) parsed and merged into the quarterly panel
+    stl              STL of every column plus the seasonal differencing
+    stationarity     ADF, KPSS and PP tests of every differenced column
+    order-selection  information criteria and LR tests of lags 0..2p (lag_sweep)
+    fit              VAR(p) by least squares
+    irf-export       IRFs of the fitted VAR and the long IRF table
+    acf              residual ACF/PACF, cross-correlations and portmanteau tests
+
+Every (stage, K, T, p) case is timed `repeat` times and run once more under tracemalloc
+for its peak allocation (numpy arrays included). Caches are bypassed, everything runs
+in this process and writes only to a temporary folder, so the benchmark needs no network
+and leaves Data Store and Cache untouched. Cases whose regression would have no degrees
+of freedom left are recorded as skipped. Results are written as JSON, by default to
+Cache/Benchmarks/<git commit>.json, so runs on two commits can be compared.
+
+    python benchmark.py                                        # default grid
+    python benchmark.py --K 6 50 100 --T 100 10000 --p 4 8 --stages fit acf --repeat 5
+    python benchmark.py --compare Cache/Benchmarks/1a2b3c4.json Cache/Benchmarks/5d6e7f8.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+import zipfile
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.api import VAR
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = os.path.join(script_dir, 'Cache', 'Benchmarks')
+STAGES = ('ingest', 'stl', 'stationarity', 'order-selection', 'fit', 'irf-export', 'acf')
+MAX_DATED_QUARTERS = 4 * (2024 - 1678) #quarters ending 2023Q4 that still fit in datetime64[ns]
+IRF_PERIODS = 20
+ACF_LAGS = 20
+
+
+class SkipStage(Exception):
+    """A stage that cannot run on this case (e.g. more regressors than observations)."""
+
+
+def stable_coefs(K, p, rng, radius=0.9):
+    """Random VAR(p) coefficient matrices (p, K, K) whose companion matrix has spectral radius `radius`."""
+    coefs = rng.standard_normal((p, K, K)) / np.sqrt(K * p)
+    companion = np.zeros((K * p, K * p))
+    companion[:K] = np.concatenate(coefs, axis=1)
+    companion[K:, :-K] = np.eye(K * (p - 1))
+    scale = radius / np.abs(np.linalg.eigvals(companion)).max()
+    return coefs * scale ** np.arange(1, p + 1)[:, None, None] #A_l -> c^l A_l scales every root by c
+
+
+def synthetic_panel(K, T, p, seed=0, seasonal=1.0, radius=0.9, burn=100):
+    """Quarterly panel (T, K) of a stable VAR(p) plus a fixed seasonal pattern per series.
+
+    The index is a PeriodIndex ending 2023Q4 when it fits the datetime range, a RangeIndex otherwise.
+    """
+    rng = np.random.default_rng(seed)
+    coefs = stable_coefs(K, p, rng, radius)
+    mix = rng.standard_normal((K, K)) / np.sqrt(K)
+    shocks = rng.standard_normal((T + burn, K)) @ np.linalg.cholesky(0.5 * np.eye(K) + mix @ mix.T).T
+    y = np.zeros((T + burn + p, K))
+    for t in range(p, T + burn + p):
+        y[t] = shocks[t - p] + sum(coefs[i] @ y[t - 1 - i] for i in range(p))
+    pattern = rng.standard_normal((4, K))
+    pattern -= pattern.mean(axis=0) #quarterly effects that sum to zero over a year
+    values = y[-T:] + seasonal * pattern[np.arange(T) % 4]
+    if T <= MAX_DATED_QUARTERS:
+        index = pd.period_range(end='2023Q4', periods=T, freq='Q', name='Date')
+    else:
+        index = pd.RangeIndex(T, name='Date')
+    return pd.DataFrame(values, index=index, columns=[f'Series {j + 1}' for j in range(K)])
+
+
+def _xlsx(path, serials, values, label):
+    #smallest workbook ingest.read_xlsx understands: one sheet, a 'Date' header row, date-styled serials
+    main = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    rows = [f'<row r="1"><c r="A1" t="inlineStr"><is><t>Date</t></is></c>'
+            f'<c r="B1" t="inlineStr"><is><t>{label}</t></is></c></row>']
+    rows += [f'<row r="{r}"><c r="A{r}" s="1"><v>{d}</v></c><c r="B{r}"><v>{v!r}</v></c></row>'
+             for r, d, v in zip(range(2, len(values) + 2), serials, values.tolist())]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('xl/workbook.xml', f'<workbook xmlns="{main}" xmlns:r="{rel}"><sheets>'
+                                       f'<sheet name="Worksheet" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        zf.writestr('xl/_rels/workbook.xml.rels',
+                    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                    f'<Relationship Id="rId1" Type="{rel}/worksheet" Target="worksheets/sheet1.xml"/></Relationships>')
+        zf.writestr('xl/styles.xml', f'<styleSheet xmlns="{main}"><cellXfs count="2">'
+                                     '<xf numFmtId="0"/><xf numFmtId="14"/></cellXfs></styleSheet>')
+        zf.writestr('xl/worksheets/sheet1.xml', f'<worksheet xmlns="{main}"><sheetData>{"".join(rows)}</sheetData></worksheet>')
+
+
+def write_workbooks(data, root):
+    """One monthly workbook per column of a quarterly panel (each quarter's value on its three month ends)."""
+    months = pd.period_range(data.index[0].asfreq('M', 'start'), periods=3 * len(data), freq='M')
+    serials = (months.to_timestamp(how='end').normalize() - pd.Timestamp('1899-12-30')).days
+    for j, name in enumerate(data.columns):
+        _xlsx(os.path.join(root, name, 'Data Table.xlsx'), serials, np.repeat(data[name].to_numpy(), 3), 'PX_LAST')
+
+
+def _check_dof(T, K, lags):
+    regressors = 1 + K * lags
+    if T - lags <= regressors + K:
+        raise SkipStage(f'{regressors} regressors per equation with {T - lags} observations')
+
+
+def _fitted(data, p):
+    _check_dof(len(data), data.shape[1], p)
+    return VAR(data).fit(p)
+
+
+#each stage prepares its inputs (not timed) and returns the callable that is timed
+def _stage_ingest(data, p, workdir):
+    from ingest import refresh
+    if not isinstance(data.index, pd.PeriodIndex):
+        raise SkipStage(f'more than {MAX_DATED_QUARTERS} quarters do not fit the datetime64[ns] range of the workbooks')
+    root = os.path.join(workdir, 'workbooks')
+    write_workbooks(data, root)
+
+    def run(): #a fresh parse cache every time, so every workbook is parsed
+        refresh(root, cache_dir=tempfile.mkdtemp(dir=workdir), n_jobs=1, log=lambda *args: None,
+                store_dir=os.path.join(workdir, 'store'))
+    return run
+
+
+def _stage_stl(data, p, workdir):
+    import stl_batch
+
+    def run():
+        stl_batch._memo.clear() #time the decompositions, not the in-process memo
+        stl_batch.decompose_frame(data, n_jobs=1, cache_dir=None)
+        data.diff(4).dropna()
+    return run
+
+
+def _stage_stationarity(data, p, workdir):
+    from unit_root import unit_root_table
+    differenced = data.diff(4).dropna()
+    return lambda: unit_root_table(differenced, tests=('adf', 'kpss', 'pp'), n_jobs=1)
+
+
+def _stage_order_selection(data, p, workdir):
+    from lag_sweep import lag_order_sweep
+    _check_dof(len(data), data.shape[1], 2 * p)
+    return lambda: lag_order_sweep(data, 2 * p)
+
+
+def _stage_fit(data, p, workdir):
+    _check_dof(len(data), data.shape[1], p)
+    return lambda: _fitted(data, p)
+
+
+def _stage_irf_export(data, p, workdir):
+    from irf_export import irf_long_table
+    fitted_model = _fitted(data, p)
+    return lambda: irf_long_table(fitted_model.irf(IRF_PERIODS), fitted_model.names)
+
+
+def _stage_acf(data, p, workdir):
+    from residual_diagnostics import acf_pacf_table, cross_correlation_table, whiteness_table
+    fitted_model = _fitted(data, p)
+    resid = fitted_model.resid
+
+    def run():
+        acf_pacf_table(resid, ACF_LAGS, p)
+        cross_correlation_table(resid, ACF_LAGS, p)
+        whiteness_table({p: fitted_model}, max(ACF_LAGS, 2 * p))
+    return run
+
+
+STAGE_FUNCTIONS = {
+    'ingest': _stage_ingest,
+    'stl': _stage_stl,
+    'stationarity': _stage_stationarity,
+    'order-selection': _stage_order_selection,
+    'fit': _stage_fit,
+    'irf-export': _stage_irf_export,
+    'acf': _stage_acf,
+}
+
+
+def measure(run, repeat=3):
+    """Wall-clock seconds of `repeat` calls, and the peak traced allocation (bytes) of one more call."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def run_case(stage, data, p, repeat=3):
+    """Result record of one stage on one synthetic panel."""
+    K = data.shape[1]
+    record = {'stage': stage, 'K': K, 'T': len(data), 'p': p}
+    workdir = tempfile.mkdtemp(prefix='var-benchmark-')
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore') #statsmodels frequency and convergence warnings on synthetic data
+            run = STAGE_FUNCTIONS[stage](data, p, workdir)
+            seconds, peak = measure(run, repeat)
+    except SkipStage as e:
+        return {**record, 'status': 'skipped', 'reason': str(e)}
+    except Exception as e: #record the failure and keep benchmarking the other cases
+        return {**record, 'status': 'failed', 'reason': f'{type(e).__name__}: {e}'}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {**record, 'status': 'ok', 'seconds': seconds, 'min': min(seconds), 'median': float(np.median(seconds)),
+            'peak_mb': peak / 2 ** 20}
+
+
+def environment():
+    """Commit, library versions and machine of a benchmark run."""
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=script_dir, capture_output=True, text=True, timeout=60).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    import scipy
+    import statsmodels
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD') or None,
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__, 'pandas': pd.__version__, 'scipy': scipy.__version__,
+        'statsmodels': statsmodels.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run_benchmarks(K_values=(6, 20), T_values=(120, 1000), p_values=(4,), stages=STAGES, repeat=3, seed=0, log=print):
+    """Run every stage on every (K, T, p) panel; returns the JSON-ready report."""
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise ValueError(f"unknown stages {sorted(unknown)} (use {', '.join(STAGES)})")
+    results = []
+    for K in K_values:
+        for T in T_values:
+            for p in p_values:
+                data = synthetic_panel(K, T, p, seed)
+                for stage in stages:
+                    record = run_case(stage, data, p, repeat)
+                    results.append(record)
+                    if record['status'] == 'ok':
+                        log(f"{stage:<16} K={K:<4} T={T:<6} p={p:<3} {record['median'] * 1e3:10.1f} ms {record['peak_mb']:9.1f} MB")
+                    else:
+                        log(f"{stage:<16} K={K:<4} T={T:<6} p={p:<3} {record['status']}: {record['reason']}")
+    return {'environment': environment(), 'settings': {'repeat': repeat, 'seed': seed}, 'results': results,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def compare(base, new, threshold=1.2):
+    """Median times and peak memory of two reports side by side, matched on (stage, K, T, p).
+
+    'Regression' flags cases whose median time grew by more than the threshold ratio.
+    """
+    def frame(report):
+        ok = [r for r in report['results'] if r['status'] == 'ok']
+        return pd.DataFrame(ok, columns=['stage', 'K', 'T', 'p', 'median', 'peak_mb']).set_index(['stage', 'K', 'T', 'p'])
+    table = frame(base).join(frame(new), how='inner', lsuffix=' base', rsuffix=' new')
+    table['time ratio'] = table['median new'] / table['median base']
+    table['memory ratio'] = table['peak_mb new'] / table['peak_mb base']
+    table['Regression'] = table['time ratio'] > threshold
+    return table
+
+
+def _read_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time and memory-profile the analysis stages on synthetic VAR data.')
+    parser.add_argument('--K', type=int, nargs='+', default=[6, 20], help='numbers of series')
+    parser.add_argument('--T', type=int, nargs='+', default=[120, 1000], help='numbers of quarters')
+    parser.add_argument('--p', type=int, nargs='+', default=[4], help='VAR lag orders')
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=STAGES)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON report path (default Cache/Benchmarks/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='compare two JSON reports instead of running')
+    parser.add_argument('--threshold', type=float, default=1.2, help='time ratio flagged as a regression by --compare')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        table = compare(_read_report(args.compare[0]), _read_report(args.compare[1]), args.threshold)
+        with pd.option_context('display.width', 250, 'display.max_rows', None, 'display.max_columns', None):
+            print(table.round(3))
+        return 1 if table['Regression'].any() else 0
+
+    report = run_benchmarks(args.K, args.T, args.p, args.stages, args.repeat, args.seed)
+    env = report['environment']
+    output = args.output or os.path.join(BENCHMARK_DIR, f"{env['commit'] or 'benchmark'}{'-dirty' if env['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=1)
+    print(f'Benchmark report saved to: {output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
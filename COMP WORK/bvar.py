@@ -0,0 +1,218 @@
+"""Bayesian VAR(p) with a conjugate Normal-Inverse-Wishart (Minnesota) prior.
+
+    Sigma ~ IW(S0, nu0),   B | Sigma ~ MN(B0, Sigma (x) Omega0)
+
+B0 is zero except for own_mean on each variable's own first lag. Omega0 is diagonal:
+lag l of variable j gets variance tightness^2 / (l^decay psi_j), so with Sigma the
+coefficient on lag l of j in equation i has variance tightness^2 sigma_i^2 / (l^decay
+sigma_j^2), the Minnesota scaling. psi_j are the residual variances of AR(1) fits of
+each series, S0 = diag(psi) and nu0 = K + 2, so that E[Sigma] = S0. Deterministic terms
+get a flat prior (variance exog_var).
+
+Because the prior is conjugate, the posterior is the same family in closed form:
+
+    Omega_bar = (Omega0^-1 + Z'Z)^-1,  B_bar = Omega_bar (Omega0^-1 B0 + Z'Y)
+    S_bar = S0 + Y'Y + B0' Omega0^-1 B0 - B_bar' Omega_bar^-1 B_bar,  nu_bar = nu0 + T
+
+and so is the marginal likelihood p(Y | tightness, decay) (Giannone, Lenza & Primiceri
+2015). Z'Z, Z'Y and Y'Y are computed once, so each evaluation of the marginal likelihood
+is one k x k Cholesky factorization, and the hyperparameters are set by maximizing it.
+
+Posterior draws are made for all draws at once: Sigma from the Bartlett decomposition
+of a stack of Wishart matrices, B = B_bar + chol(Omega_bar) E chol(Sigma)' from one
+triangular solve of a (k, draws * K) normal matrix and one batched product. IRFs of
+every draw come from the batched MA recursion of irf_bootstrap, and predictive paths
+advance all draws together through the forecast horizon.
+"""
+import numpy as np
+from scipy import linalg, optimize, special
+
+from irf_bootstrap import ma_rep_batch, params_to_coefs
+from lag_sweep import TREND_ORDERS, build_lag_design
+from tracing import count
+from var_cache import results_from_params
+
+HYPERPARAMETERS = ('tightness', 'decay')
+BOUNDS = {'tightness': (1e-4, 5.0), 'decay': (0.25, 5.0)}
+
+
+class CrossProducts:
+    """Z'Z, Z'Y and Y'Y of a VAR(lag) regression and the AR(1) scales of its series, computed once."""
+
+    def __init__(self, data, lag, trend='c'):
+        values = np.asarray(data, dtype=float)
+        Z, Y = build_lag_design(values, lag, trend)
+        self.endog = values
+        self.lag = lag
+        self.trend = trend
+        self.k_trend = TREND_ORDERS[trend]
+        self.T, self.K = Y.shape
+        self.ZZ = Z.T @ Z
+        self.ZY = Z.T @ Y
+        self.YY = Y.T @ Y
+        x = Z[:, self.k_trend:self.k_trend + self.K] #first lags
+        xc, yc = x - x.mean(axis=0), Y - Y.mean(axis=0)
+        rho = (xc * yc).sum(axis=0) / (xc ** 2).sum(axis=0)
+        self.psi = ((yc - rho * xc) ** 2).sum(axis=0) / (self.T - 2) #AR(1) residual variances
+
+
+def minnesota_prior(cross, tightness=0.2, decay=2.0, own_mean=0.0, exog_var=1e6):
+    """(B0 (k, K), prior variances omega0 (k,), S0 (K, K), nu0) of the Minnesota NIW prior."""
+    K, lag, k_trend = cross.K, cross.lag, cross.k_trend
+    lags = np.repeat(np.arange(1, lag + 1), K)
+    omega0 = np.r_[np.full(k_trend, exog_var), tightness ** 2 / (lags ** decay * np.tile(cross.psi, lag))]
+    B0 = np.zeros((k_trend + K * lag, K))
+    B0[k_trend + np.arange(K), np.arange(K)] = own_mean
+    return B0, omega0, np.diag(cross.psi), K + 2
+
+
+class Posterior:
+    """NIW posterior of a VAR: B | Sigma ~ MN(B_bar, Sigma (x) Omega_bar), Sigma ~ IW(S_bar, nu_bar)."""
+
+    def __init__(self, cross, B0, omega0, S0, nu0):
+        self.cross = cross
+        precision = cross.ZZ + np.diag(1 / omega0)
+        self.precision_chol = linalg.cholesky(precision, lower=True)
+        rhs = cross.ZY + B0 / omega0[:, None]
+        self.B_bar = linalg.cho_solve((self.precision_chol, True), rhs)
+        S_bar = S0 + cross.YY + B0.T @ (B0 / omega0[:, None]) - self.B_bar.T @ rhs
+        self.S_bar = (S_bar + S_bar.T) / 2
+        self.nu_bar = nu0 + cross.T
+        self.log_ml = self._log_ml(omega0, S0, nu0)
+
+    def _log_ml(self, omega0, S0, nu0):
+        #log p(Y) of the conjugate NIW model
+        T, K = self.cross.T, self.cross.K
+        return (-T * K / 2 * np.log(np.pi)
+                + special.multigammaln(self.nu_bar / 2, K) - special.multigammaln(nu0 / 2, K)
+                - K / 2 * np.log(omega0).sum() - K * np.log(np.diag(self.precision_chol)).sum()
+                + nu0 / 2 * np.linalg.slogdet(S0)[1] - self.nu_bar / 2 * np.linalg.slogdet(self.S_bar)[1])
+
+    @property
+    def sigma_mean(self):
+        """Posterior mean of Sigma, S_bar / (nu_bar - K - 1)."""
+        return self.S_bar / (self.nu_bar - self.cross.K - 1)
+
+    def sample(self, n_draws, rng=None):
+        """n_draws posterior draws at once: coefficients (n_draws, k, K) and covariances (n_draws, K, K)."""
+        rng = np.random.default_rng(rng)
+        k, K = self.B_bar.shape
+        #Sigma^-1 ~ W(S_bar^-1, nu_bar) = L A A' L' with L = chol(S_bar)^-T and A the Bartlett factor
+        A = np.tril(rng.standard_normal((n_draws, K, K)), -1)
+        A[:, np.arange(K), np.arange(K)] = np.sqrt(rng.chisquare(self.nu_bar - np.arange(K), size=(n_draws, K)))
+        U = linalg.cholesky(self.S_bar, lower=True)
+        P = U @ np.linalg.inv(A).swapaxes(-1, -2) #P P' = U (A A')^-1 U' = Sigma
+        sigma = P @ P.swapaxes(-1, -2)
+        #vec(B) ~ N(vec(B_bar), Sigma (x) Omega_bar): B = B_bar + F E P' with F F' = Omega_bar
+        E = rng.standard_normal((k, n_draws * K))
+        FE = linalg.solve_triangular(self.precision_chol, E, lower=True, trans='T').reshape(k, n_draws, K)
+        B = self.B_bar + FE.transpose(1, 0, 2) @ P.swapaxes(-1, -2)
+        return B, sigma
+
+
+def log_marginal_likelihood(cross, tightness=0.2, decay=2.0, own_mean=0.0, exog_var=1e6):
+    """log p(Y | hyperparameters) of the Minnesota BVAR, from the cached cross products."""
+    return Posterior(cross, *minnesota_prior(cross, tightness, decay, own_mean, exog_var)).log_ml
+
+
+def optimize_hyperparameters(cross, tightness=0.2, decay=2.0, free=('tightness',), own_mean=0.0, exog_var=1e6):
+    """Hyperparameters maximizing the marginal likelihood; those not in free stay at the given values.
+
+    Returns a dict of tightness, decay and the maximized log marginal likelihood.
+    """
+    unknown = set(free) - set(HYPERPARAMETERS)
+    if unknown:
+        raise ValueError(f"unknown hyperparameters {sorted(unknown)} (use {', '.join(HYPERPARAMETERS)})")
+    values = {'tightness': tightness, 'decay': decay}
+    free = [name for name in HYPERPARAMETERS if name in free]
+
+    def objective(log_x): #searched on the log scale, where the likelihood is much closer to quadratic
+        values.update(zip(free, np.exp(log_x)))
+        return -log_marginal_likelihood(cross, values['tightness'], values['decay'], own_mean, exog_var)
+
+    if free:
+        solution = optimize.minimize(objective, np.log([values[name] for name in free]), method='L-BFGS-B',
+                                     bounds=[tuple(np.log(BOUNDS[name])) for name in free])
+        values.update(zip(free, np.exp(solution.x)))
+    values['log_ml'] = log_marginal_likelihood(cross, values['tightness'], values['decay'], own_mean, exog_var)
+    return values
+
+
+def posterior_irfs(B, sigma, lag, k_trend, periods, orth=False):
+    """IRFs (n_draws, periods + 1, K, K) of a stack of coefficient and covariance draws."""
+    irfs = ma_rep_batch(params_to_coefs(B, lag, k_trend), periods)
+    if orth:
+        irfs = irfs @ np.linalg.cholesky(sigma)[:, None]
+    return irfs
+
+
+def posterior_forecasts(B, sigma, cross, steps, rng=None):
+    """Predictive paths (n_draws, steps, K) after the end of the sample, one per coefficient draw.
+
+    Each path adds a N(0, Sigma) shock drawn with its own covariance draw, so the spread
+    covers both parameter and shock uncertainty.
+    """
+    rng = np.random.default_rng(rng)
+    n_draws = len(B)
+    lag, k_trend, K = cross.lag, cross.k_trend, cross.K
+    coefs = params_to_coefs(B, lag, k_trend) #(n_draws, lag, K, K)
+    t = np.arange(len(cross.endog) + 1, len(cross.endog) + steps + 1, dtype=float)
+    trend_cols = t[:, None] ** np.arange(k_trend) #same trend terms as build_lag_design
+    shocks = (np.linalg.cholesky(sigma)[:, None] @ rng.standard_normal((n_draws, steps, K, 1)))[..., 0]
+    y = np.empty((n_draws, lag + steps, K))
+    y[:, :lag] = cross.endog[-lag:]
+    for h in range(steps): #the recursion runs over the horizon; all draws advance together
+        y_h = trend_cols[h] @ B[:, :k_trend] + shocks[:, h]
+        for i in range(1, lag + 1):
+            y_h += (coefs[:, i - 1] @ y[:, lag + h - i, :, None])[..., 0]
+        y[:, lag + h] = y_h
+    return y[:, lag:]
+
+
+class BVARFit:
+    """A Minnesota BVAR: statsmodels results at the posterior mean, the posterior and its hyperparameters."""
+
+    def __init__(self, results, posterior, hyperparameters):
+        self.results = results #VARResultsWrapper at (B_bar, E[Sigma]): irf(), fevd(), forecast(), resid
+        self.posterior = posterior
+        self.hyperparameters = hyperparameters #tightness, decay, own_mean and log_ml
+
+    @property
+    def names(self):
+        return list(self.results.names)
+
+    def draws(self, n_draws=2000, seed=0):
+        """(coefficients, covariances) posterior draws, reproducible for a given seed."""
+        return self.posterior.sample(n_draws, seed)
+
+    def irf_bands(self, periods, n_draws=2000, orth=False, signif=0.05, seed=0):
+        """Posterior (lower, median, upper) IRFs, each shaped like irf.irfs, at credibility 1 - signif."""
+        B, sigma = self.draws(n_draws, seed)
+        irfs = posterior_irfs(B, sigma, self.posterior.cross.lag, self.posterior.cross.k_trend, periods, orth)
+        return tuple(np.quantile(irfs, [signif / 2, 0.5, 1 - signif / 2], axis=0))
+
+    def forecast_bands(self, steps, n_draws=2000, signif=0.05, seed=0):
+        """Predictive (lower, median, upper) forecasts, each (steps, K), at credibility 1 - signif."""
+        rng = np.random.default_rng(seed)
+        B, sigma = self.posterior.sample(n_draws, rng)
+        paths = posterior_forecasts(B, sigma, self.posterior.cross, steps, rng)
+        return tuple(np.quantile(paths, [signif / 2, 0.5, 1 - signif / 2], axis=0))
+
+
+def fit_bvar(data, lag, trend='c', tightness=None, decay=2.0, own_mean=0.0, optimize_decay=False, exog_var=1e6):
+    """Minnesota BVAR(lag) of every column of data.
+
+    tightness=None sets the overall tightness by maximizing the marginal likelihood
+    (with optimize_decay=True the lag decay as well). own_mean is the prior mean of each
+    variable's own first lag: 0 for stationary (differenced) data, 1 for a random walk prior.
+    """
+    cross = CrossProducts(data, lag, trend)
+    free = (('tightness',) if tightness is None else ()) + (('decay',) if optimize_decay else ())
+    hyperparameters = optimize_hyperparameters(cross, 0.2 if tightness is None else tightness, decay, free,
+                                               own_mean, exog_var)
+    hyperparameters['own_mean'] = own_mean
+    posterior = Posterior(cross, *minnesota_prior(cross, hyperparameters['tightness'], hyperparameters['decay'],
+                                                  own_mean, exog_var))
+    results = results_from_params(data, lag, posterior.B_bar, posterior.sigma_mean, trend)
+    count('fits')
+    return BVARFit(results, posterior, hyperparameters)
@@ -0,0 +1,175 @@
+"""Granger causality and block exogeneity tests for every pair of variables from one VAR fit.
+
+The unrestricted VAR(p) gives Cov(vec B) = Sigma_u (x) (Z'Z)^-1, and the restrictions of
+a causality test (the p lags of the causing variables are zero in the caused equations)
+pick rows r of B and columns c of it, so the Wald statistic is
+
+    W = tr(Sigma_cc^-1 B_rc' [(Z'Z)^-1]_rr^-1 B_rc)
+
+with no restricted model to fit. This is the statistic of VARResults.test_causality,
+reported the same way: kind='f' gives F = W / q on (q, K * df_resid) degrees of freedom,
+kind='wald' compares W with chi2(q), for q restrictions.
+
+- all pairs: one p x p block of (Z'Z)^-1 per causing variable, all K x K (cause,
+  effect) statistics from one batched inverse and one einsum
+- block exogeneity of each variable (the lags of all the others are excluded from its
+  equation): [(Z'Z)^-1]_rr^-1 is the Schur complement of the small block of trend and
+  own-lag regressors in Z'Z, so each test needs one (k_trend + p) solve
+- each variable as a cause of all the others at once, and any other (causing, caused)
+  grouping through group_causality()
+"""
+import numpy as np
+import pandas as pd
+from scipy import linalg, stats
+
+KINDS = ('f', 'wald')
+
+
+class CausalityInputs:
+    """The arrays of a fitted statsmodels VAR that every causality test needs."""
+
+    def __init__(self, fitted_model):
+        Z = np.asarray(fitted_model.endog_lagged, dtype=float)
+        self.names = list(fitted_model.names)
+        self.lag = fitted_model.k_ar
+        self.k_trend = fitted_model.k_exog
+        self.K = len(self.names)
+        self.params = np.asarray(fitted_model.params, dtype=float)
+        self.sigma_u = np.asarray(fitted_model.sigma_u, dtype=float) #df-adjusted, as in cov_params()
+        self.df_resid = fitted_model.df_resid
+        self.ZZ = Z.T @ Z
+        r = np.linalg.qr(Z, mode='r')
+        r_inv = linalg.solve_triangular(r, np.eye(len(r)))
+        self.ZZ_inv = r_inv @ r_inv.T
+
+    def rows(self, variables):
+        """Rows of the params (and of Z'Z) holding all p lags of the given variable positions."""
+        variables = np.atleast_1d(variables)
+        return (self.k_trend + variables[None, :] + self.K * np.arange(self.lag)[:, None]).T.ravel()
+
+    def positions(self, variables):
+        names = [variables] if isinstance(variables, str) else list(variables)
+        unknown = [name for name in names if name not in self.names]
+        if unknown:
+            raise ValueError(f"unknown variables {unknown}")
+        return np.array([self.names.index(name) for name in names])
+
+
+def _pvalue(stat, q, df_denom, kind):
+    #p-value and reported statistic of a Wald statistic with q restrictions
+    if kind == 'f':
+        return stat / q, stats.f.sf(stat / q, q, df_denom)
+    if kind == 'wald':
+        return stat, stats.chi2.sf(stat, q)
+    raise ValueError(f"unknown test kind '{kind}' (use one of {', '.join(KINDS)})")
+
+
+def pairwise_causality(fitted_model, kind='f'):
+    """Statistics and p-values (K, K) of 'cause j does not Granger-cause effect i', indexed [j, i].
+
+    The diagonal (a variable's own lags) is NaN. Returns (statistic, p-value, df) with df
+    the (numerator, denominator) degrees of freedom shared by all pairs.
+    """
+    inputs = fitted_model if isinstance(fitted_model, CausalityInputs) else CausalityInputs(fitted_model)
+    K, p = inputs.K, inputs.lag
+    rows = inputs.rows(np.arange(K)).reshape(K, p)
+    M_inv = np.linalg.inv(inputs.ZZ_inv[rows[:, :, None], rows[:, None, :]]) #(K, p, p), one block per cause
+    B = inputs.params[rows] #(cause, lag, effect)
+    wald = np.einsum('jpi,jpq,jqi->ji', B, M_inv, B) / np.diag(inputs.sigma_u)
+    df = (p, K * inputs.df_resid)
+    stat, pvalue = _pvalue(wald, p, df[1], kind)
+    np.fill_diagonal(stat, np.nan)
+    np.fill_diagonal(pvalue, np.nan)
+    return stat, pvalue, df
+
+
+def block_exogeneity(fitted_model, kind='f'):
+    """Tests that the lags of all other variables can be dropped from each variable's equation.
+
+    Returns a data frame with one row per variable (the effect).
+    """
+    inputs = fitted_model if isinstance(fitted_model, CausalityInputs) else CausalityInputs(fitted_model)
+    K, p, k_trend = inputs.K, inputs.lag, inputs.k_trend
+    ZZ = inputs.ZZ
+    stat = np.empty(K)
+    for i in range(K):
+        kept = np.r_[np.arange(k_trend), inputs.rows(i)] #trend and own lags stay in the equation
+        dropped = inputs.rows(np.delete(np.arange(K), i))
+        b = inputs.params[dropped, i]
+        #[(Z'Z)^-1]_rr^-1 = ZZ_rr - ZZ_rs ZZ_ss^-1 ZZ_sr with s the few kept regressors
+        cross = ZZ[np.ix_(kept, dropped)] @ b
+        stat[i] = (b @ ZZ[np.ix_(dropped, dropped)] @ b - cross @ np.linalg.solve(ZZ[np.ix_(kept, kept)], cross)) \
+            / inputs.sigma_u[i, i]
+    q = (K - 1) * p
+    df = (q, K * inputs.df_resid)
+    value, pvalue = _pvalue(stat, q, df[1], kind)
+    return pd.DataFrame({'Cause': 'all others', 'Effect': inputs.names, 'Statistic': value, 'p-value': pvalue,
+                         'df num': df[0], 'df denom': df[1]})
+
+
+def group_causality(fitted_model, causing, caused, kind='f'):
+    """Test that the variables causing (names) do not Granger-cause the variables caused, jointly.
+
+    Returns (statistic, p-value, df).
+    """
+    inputs = fitted_model if isinstance(fitted_model, CausalityInputs) else CausalityInputs(fitted_model)
+    causing, caused = inputs.positions(causing), inputs.positions(caused)
+    rows = inputs.rows(causing)
+    B = inputs.params[np.ix_(rows, caused)]
+    M = inputs.ZZ_inv[np.ix_(rows, rows)]
+    wald = np.trace(np.linalg.solve(inputs.sigma_u[np.ix_(caused, caused)], B.T @ np.linalg.solve(M, B)))
+    q = len(rows) * len(caused)
+    df = (q, inputs.K * inputs.df_resid)
+    stat, pvalue = _pvalue(wald, q, df[1], kind)
+    return stat, pvalue, df
+
+
+def cause_of_all(fitted_model, kind='f'):
+    """Tests that each variable Granger-causes none of the others (its lags dropped from every other equation)."""
+    inputs = fitted_model if isinstance(fitted_model, CausalityInputs) else CausalityInputs(fitted_model)
+    others = [inputs.names[:j] + inputs.names[j + 1:] for j in range(inputs.K)]
+    tests = [group_causality(inputs, name, rest, kind) for name, rest in zip(inputs.names, others)]
+    return pd.DataFrame({'Cause': inputs.names, 'Effect': 'all others',
+                         'Statistic': [t[0] for t in tests], 'p-value': [t[1] for t in tests],
+                         'df num': [t[2][0] for t in tests], 'df denom': [t[2][1] for t in tests]})
+
+
+def causality_table(fitted_models, kind='f', signif=0.05):
+    """Pairwise Granger causality tests of several fitted VARs, {lag length: fitted model}, in long format."""
+    tables = []
+    for lag, model in fitted_models.items():
+        inputs = CausalityInputs(model)
+        stat, pvalue, df = pairwise_causality(inputs, kind)
+        K = inputs.K
+        off_diagonal = ~np.eye(K, dtype=bool).ravel()
+        tables.append(pd.DataFrame({
+            'Lag Length': lag,
+            'Cause': np.repeat(inputs.names, K)[off_diagonal],
+            'Effect': np.tile(inputs.names, K)[off_diagonal],
+            'Statistic': stat.ravel()[off_diagonal],
+            'p-value': pvalue.ravel()[off_diagonal],
+            'df num': df[0],
+            'df denom': df[1],
+            'Granger Causes': pvalue.ravel()[off_diagonal] < signif,
+        }))
+    return pd.concat(tables, ignore_index=True)
+
+
+def block_exogeneity_table(fitted_models, kind='f', signif=0.05):
+    """Block exogeneity and cause-of-all tests of several fitted VARs, {lag length: fitted model}."""
+    tables = []
+    for lag, model in fitted_models.items():
+        inputs = CausalityInputs(model)
+        table = pd.concat([block_exogeneity(inputs, kind), cause_of_all(inputs, kind)], ignore_index=True)
+        table.insert(0, 'Lag Length', lag)
+        tables.append(table)
+    table = pd.concat(tables, ignore_index=True)
+    table['Rejected'] = table['p-value'] < signif
+    return table
+
+
+def pvalue_matrix(table, lag):
+    """K x K p-values of one lag length from causality_table(): rows are causes, columns effects."""
+    subset = table[table['Lag Length'] == lag]
+    names = list(dict.fromkeys(subset['Cause']))
+    return subset.pivot(index='Cause', columns='Effect', values='p-value').reindex(index=names, columns=names)
@@ -0,0 +1,98 @@
+"""Orthogonalized IRFs and FEVDs of one fitted VAR across Cholesky orderings of its variables.
+
+Reordering the variables does not change the reduced-form VAR: the MA coefficients Phi_h
+and Sigma_u are the same, only the Cholesky factor of the permuted Sigma_u changes. For
+an ordering pi (pi[0] first) with L = chol(Sigma_u[pi][:, pi]), the impact matrix in the
+original variable order is C[pi[a], pi[b]] = L[a, b], its column j being the shock to
+variable j, and the orthogonalized responses are Phi_h C. So every ordering costs one
+K x K Cholesky factorization and one batched product, all orderings at once:
+
+- all K! orderings when there are at most max_orderings of them, otherwise a seeded
+  random sample (the given order always first)
+- FEVDs from the cumulated squared responses; the forecast error variance itself does
+  not depend on the ordering
+- orderings are split into chunks that run across a process pool when there are many
+"""
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fevd import fevd_shares
+from irf_export import array_table
+from tracing import span
+
+
+def variable_orderings(K, max_orderings=5040, seed=0):
+    """(n, K) array of orderings: all K! when K! <= max_orderings, else the identity plus a random sample."""
+    if math.factorial(K) <= max_orderings:
+        return np.array(list(itertools.permutations(range(K))))
+    rng = np.random.default_rng(seed)
+    perms = [tuple(range(K))]
+    seen = set(perms)
+    while len(perms) < max_orderings:
+        perm = tuple(rng.permutation(K))
+        if perm not in seen:
+            seen.add(perm)
+            perms.append(perm)
+    return np.array(perms)
+
+
+def impact_matrices(sigma_u, perms):
+    """(n, K, K) impact matrices of the Cholesky identification of every ordering, in the original variable order."""
+    n = len(perms)
+    L = np.linalg.cholesky(sigma_u[perms[:, :, None], perms[:, None, :]])
+    C = np.empty_like(L)
+    C[np.arange(n)[:, None, None], perms[:, :, None], perms[:, None, :]] = L
+    return C
+
+
+def orth_irfs(ma, sigma_u, perms):
+    """Orthogonalized IRFs (n, periods + 1, K, K) for every ordering from the MA coefficients (periods + 1, K, K)."""
+    return ma @ impact_matrices(sigma_u, perms)[:, None]
+
+
+def _ordering_chunk(ma, sigma_u, perms):
+    #IRFs and FEVDs of one chunk of orderings
+    irfs = orth_irfs(ma, sigma_u, perms)
+    return irfs, fevd_shares(irfs)
+
+
+def ordering_sweep(fitted_model, periods, max_orderings=5040, seed=0, n_jobs=None, chunk_size=2000):
+    """Orthogonalized IRFs and FEVDs of a fitted VAR for many Cholesky orderings.
+
+    Returns (orderings (n, K), IRFs (n, periods + 1, K, K), FEVDs (n, periods + 1, K, K)).
+    n_jobs=1 runs in this process; otherwise chunks of chunk_size orderings are spread
+    over a process pool (n_jobs=None uses every core).
+    """
+    ma = fitted_model.ma_rep(periods)
+    sigma_u = np.asarray(fitted_model.sigma_u, dtype=float)
+    perms = variable_orderings(len(sigma_u), max_orderings, seed)
+    chunks = [perms[i:i + chunk_size] for i in range(0, len(perms), chunk_size)]
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(chunks))
+    with span('cholesky orderings', orderings=len(perms)):
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                results = list(pool.map(_ordering_chunk, [ma] * len(chunks), [sigma_u] * len(chunks), chunks))
+        else:
+            results = [_ordering_chunk(ma, sigma_u, chunk) for chunk in chunks]
+    return perms, np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+def envelope_tables(fitted_model, periods, max_orderings=5040, seed=0, n_jobs=None):
+    """(IRF table, FEVD table) of the min/median/max over orderings next to the given order's values.
+
+    Both are in the IRF_Lag_{lag}.csv row layout (shock, response, period).
+    """
+    perms, irfs, fevds = ordering_sweep(fitted_model, periods, max_orderings, seed, n_jobs)
+    names = list(fitted_model.names)
+    tables = []
+    for label, values in (('Orth IRF', irfs), ('FEVD', fevds)):
+        low, median, high = np.quantile(values, [0.0, 0.5, 1.0], axis=0)
+        table = array_table({label: values[0], f'{label} Min': low, f'{label} Median': median,
+                             f'{label} Max': high}, names)
+        table['Orderings'] = len(perms)
+        tables.append(table)
+    return tuple(tables)
@@ -0,0 +1,79 @@
+"""Forecast error variance decomposition and historical decomposition of a fitted VAR.
+
+Both come from the orthogonalized MA coefficients Theta_h = Phi_h P (P = chol(Sigma_u)),
+the tensor behind fitted_model.irf(periods).orth_irfs:
+
+- FEVD: the share of shock j in the (h + 1)-step forecast error variance of variable i is
+  sum_{s<=h} Theta_s[i, j]^2 / sum_{s<=h} sum_k Theta_s[i, k]^2, for every h, i and j
+  from one cumulative sum; the same function takes a stack of bootstrap IRF draws
+- historical decomposition: with the structural shocks e_t = P^-1 u_t, the part of y_t
+  due to shock j is sum_{s<t} Theta_s[:, j] e_{t-s, j}, a convolution over time done for
+  all (response, shock) pairs at once with one FFT; what is left of y_t is the baseline
+  (deterministic terms and the presample values), so the contributions add up to the data
+
+The tables have the IRF_Lag_{lag}.csv layout (shock, response, then period or date).
+"""
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from irf_export import array_table
+
+BASELINE = 'Baseline' #shock label of the deterministic/initial-condition part of the historical decomposition
+
+
+def fevd_shares(irfs):
+    """FEVD (..., periods + 1, K, K) from orthogonalized IRFs: [h, i, j] is the share of shock j in the
+    (h + 1)-step forecast error variance of variable i, as VARResults.fevd() decomposes it."""
+    contributions = np.cumsum(irfs ** 2, axis=-3)
+    return contributions / contributions.sum(axis=-1, keepdims=True)
+
+
+def structural_shocks(fitted_model):
+    """Orthogonalized residuals e_t = P^-1 u_t (T, K), with P the Cholesky factor of sigma_u."""
+    P = np.linalg.cholesky(np.asarray(fitted_model.sigma_u, dtype=float))
+    return np.linalg.solve(P, np.asarray(fitted_model.resid, dtype=float).T).T
+
+
+def historical_decomposition(fitted_model):
+    """Contributions (T, K, K + 1) of each structural shock to each variable over the estimation sample.
+
+    [t, i, j] is the part of variable i at observation t due to shock j (j < K); the last
+    slot is the baseline, so the contributions sum over j to the observed data.
+    """
+    shocks = structural_shocks(fitted_model)
+    T, K = shocks.shape
+    theta = fitted_model.orth_ma_rep(T - 1) #(T, K, K)
+    contributions = signal.fftconvolve(theta, shocks[:, None, :], axes=0)[:T] #sum_s Theta_s[i, j] e_{t-s, j}
+    y = np.asarray(fitted_model.endog, dtype=float)[fitted_model.k_ar:]
+    decomposition = np.empty((T, K, K + 1))
+    decomposition[:, :, :K] = contributions
+    decomposition[:, :, K] = y - contributions.sum(axis=2)
+    return decomposition
+
+
+def fevd_long_table(fitted_model, periods, boot_bands=None):
+    """FEVD of every (shock, response) pair for periods 0..periods in the IRF_Lag_{lag}.csv layout.
+
+    boot_bands=(lower, upper) FEVD arrays add 'Boot Lower Conf' / 'Boot Upper Conf' columns.
+    """
+    arrays = {'FEVD': fevd_shares(fitted_model.orth_ma_rep(periods))}
+    if boot_bands is not None:
+        arrays['Boot Lower Conf'], arrays['Boot Upper Conf'] = boot_bands
+    return array_table(arrays, fitted_model.names)
+
+
+def historical_long_table(fitted_model):
+    """Historical decomposition in long format: one row per (shock, response, date), the baseline as an extra shock."""
+    decomposition = historical_decomposition(fitted_model)
+    T, K, n_shocks = decomposition.shape
+    names = list(fitted_model.names)
+    dates = getattr(fitted_model.model.data, 'row_labels', None)
+    dates = dates[fitted_model.k_ar:] if dates is not None else pd.RangeIndex(fitted_model.k_ar, fitted_model.k_ar + T)
+    codes = np.arange(n_shocks)
+    return pd.DataFrame({
+        'Date': dates[np.tile(np.arange(T), K * n_shocks)],
+        'Contribution': decomposition.transpose(2, 1, 0).reshape(-1),
+        'Shock Variable': pd.Categorical.from_codes(np.repeat(codes, K * T), categories=names + [BASELINE]),
+        'Response Variable': pd.Categorical.from_codes(np.tile(np.repeat(codes[:K], T), n_shocks), categories=names),
+    })
@@ -0,0 +1,273 @@
+"""Figure builders shared by the analysis scripts, and a headless batch renderer.
+
+Run any script with --headless (or VAR_HEADLESS=1 in the environment) and its figures
+are not shown in blocking windows: they are drawn with the Agg backend in a worker
+pool and written straight into Graph Results/. A figure is skipped when its inputs
+(and the code of its builder's module) are unchanged since it was last written, which is
+tracked in Graph Results/figure_manifest.json.
+
+Every builder is a module-level function that takes plain data and returns a
+matplotlib Figure, so it can be pickled over to a worker process.
+"""
+import hashlib
+import inspect
+import json
+import math
+import os
+import pickle
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+
+from tracing import span
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+GRAPH_DIR = os.path.join(script_dir, 'Graph Results') #root folder for all saved figures
+MANIFEST_PATH = os.path.join(GRAPH_DIR, 'figure_manifest.json')
+
+
+def headless_requested(argv=None):
+    """True when the script was started with --headless or VAR_HEADLESS=1."""
+    argv = sys.argv if argv is None else argv
+    return '--headless' in argv or os.environ.get('VAR_HEADLESS') == '1'
+
+
+def _date_ticks(ax, minor_months):
+    #major ticks every 4 years, unlabeled minor ticks in the given months, rotated labels
+    import matplotlib.dates as mdates
+    ax.xaxis.set_major_locator(mdates.YearLocator(4))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
+    ax.xaxis.set_minor_locator(mdates.MonthLocator(list(minor_months)))
+    ax.tick_params(axis='x', rotation=45)
+
+
+def series_figure(series, title, ylabel='Value', minor_months=(3, 9)):
+    """Line plot of one time series with the project's date ticks."""
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.plot(series.index, series.values)
+    ax.set_title(title)
+    ax.set_xlabel('Date')
+    ax.set_ylabel(ylabel)
+    _date_ticks(ax, minor_months)
+    fig.tight_layout()
+    return fig
+
+
+def stl_figure(decomposition, title, minor_months=(3, 9)):
+    """STL decomposition panels (observed, trend, seasonal, resid) from a DecomposeResult."""
+    fig = decomposition.plot()
+    fig.set_size_inches(10, 8)
+    for ax in fig.axes:
+        _date_ticks(ax, minor_months)
+    fig.suptitle(title, fontsize=16)
+    fig.tight_layout()
+    return fig
+
+
+def acf_grid_figure(residuals, lag, kind='acf', cols=2):
+    """ACF or PACF of every residual column on a grid that grows with the no. of variables."""
+    import matplotlib.pyplot as plt
+    from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
+    plot = plot_acf if kind == 'acf' else plot_pacf
+    num_vars = residuals.shape[1]
+    rows = math.ceil(num_vars / cols)
+    fig, axes = plt.subplots(nrows=rows, ncols=cols, figsize=(12, 4 * rows), squeeze=False)
+    axes = axes.flatten()
+    for i, var in enumerate(residuals.columns):
+        plot(residuals[var], ax=axes[i], title=f'{kind.upper()} of Residuals - {var} (lag={lag})')
+    for ax in axes[num_vars:]: #remove any unused axes
+        fig.delaxes(ax)
+    fig.tight_layout()
+    return fig
+
+
+def irf_figure(data, lag_length, periods, cumulative=False, orth=False):
+    """statsmodels IRF (or cumulative IRF) grid for a VAR(lag_length) fitted through the model cache."""
+    from var_cache import fit_var
+    irf = fit_var(data, lag_length).irf(periods)
+    if cumulative:
+        fig = irf.plot_cum_effects(orth=orth)
+        title = f'Cumulative IRFs (Lag Length = {lag_length})'
+    else:
+        fig = irf.plot(orth=orth)
+        title = f'Impulse Response Functions (Lag Length = {lag_length})'
+    fig.set_size_inches(14, 10)
+    fig.subplots_adjust(hspace=0.5, wspace=0.3)
+    fig.suptitle(title, fontsize=16)
+    return fig
+
+
+def rolling_ic_figure(info_criteria, lag, window=None):
+    """AIC, BIC and HQIC of a rolling or expanding VAR(lag), one panel each, against the window end."""
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    criteria = ['AIC', 'BIC', 'HQIC']
+    fig, axes = plt.subplots(nrows=len(criteria), ncols=1, figsize=(10, 8), sharex=True)
+    dates = info_criteria.index
+    if isinstance(dates, pd.PeriodIndex):
+        dates = dates.to_timestamp(how='end')
+    for ax, name in zip(axes, criteria):
+        ax.plot(dates, info_criteria[name].to_numpy())
+        ax.set_ylabel(name)
+    _date_ticks(axes[-1], (3, 9))
+    axes[-1].set_xlabel('Window End')
+    kind = f'{window}-Quarter Rolling' if window else 'Expanding'
+    fig.suptitle(f'{kind} Window Information Criteria (Lag Length = {lag})', fontsize=14)
+    fig.tight_layout()
+    return fig
+
+
+def cusum_figure(process, names, bound, title, cols=2):
+    """Fluctuation process of every equation against its +/- bound, one panel each (like R's vars::stability plots).
+
+    process is (n + 1, K) on a 0..1 time scale; bound is a constant or an (n + 1,) array.
+    """
+    import matplotlib.pyplot as plt
+    import numpy as np
+    num_vars = len(names)
+    rows = math.ceil(num_vars / cols)
+    fig, axes = plt.subplots(nrows=rows, ncols=cols, figsize=(12, 3.5 * rows), squeeze=False)
+    axes = axes.flatten()
+    time = np.linspace(0, 1, len(process))
+    bound = np.broadcast_to(bound, time.shape)
+    for i, name in enumerate(names):
+        ax = axes[i]
+        ax.plot(time, process[:, i], color='black', linewidth=1)
+        ax.plot(time, bound, color='red', linewidth=1)
+        ax.plot(time, -bound, color='red', linewidth=1)
+        ax.axhline(0, color='black', linewidth=0.8)
+        ax.set_title(f'{title} of equation {name}')
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Empirical fluctuation process')
+    for ax in axes[num_vars:]: #remove any unused axes
+        fig.delaxes(ax)
+    fig.tight_layout()
+    return fig
+
+
+def fan_chart_figure(fan, scenario, baseline=None, cols=2):
+    """Simulated forecast bands of every variable under one scenario, from a scenarios.fan_table.
+
+    Shades the P5-P95 and P25-P75 bands around the median; with baseline, that scenario's median is dashed for comparison.
+    """
+    import matplotlib.pyplot as plt
+    names = list(fan['Variable'].cat.categories)
+    rows = math.ceil(len(names) / cols)
+    fig, axes = plt.subplots(nrows=rows, ncols=cols, figsize=(12, 3.5 * rows), squeeze=False)
+    axes = axes.flatten()
+    for ax, name in zip(axes, names):
+        part = fan[(fan['Scenario'] == scenario) & (fan['Variable'] == name)]
+        h = part['Horizon'].to_numpy()
+        ax.fill_between(h, part['P5'], part['P95'], color='tab:blue', alpha=0.2, linewidth=0, label='5-95%')
+        ax.fill_between(h, part['P25'], part['P75'], color='tab:blue', alpha=0.4, linewidth=0, label='25-75%')
+        ax.plot(h, part['P50'], color='tab:blue', linewidth=1.5, label='Median')
+        if baseline is not None and baseline != scenario:
+            base = fan[(fan['Scenario'] == baseline) & (fan['Variable'] == name)]
+            ax.plot(h, base['P50'], color='black', linewidth=1, linestyle='--', label=f'{baseline} median')
+        ax.axhline(0, color='black', linewidth=0.5)
+        ax.set_title(name)
+        ax.set_xlabel('Quarters Ahead')
+    axes[0].legend(fontsize=8)
+    for ax in axes[len(names):]: #remove any unused axes
+        fig.delaxes(ax)
+    fig.suptitle(f'{scenario} ({fan["Paths"].iat[0]:,} simulated paths)', fontsize=14)
+    fig.tight_layout()
+    return fig
+
+
+def figure_fingerprint(builder, kwargs):
+    """Hash of the builder's module source and its inputs; a figure is redrawn when this changes.
+
+    The whole module is hashed, not just the builder, so edits to shared helpers such as _date_ticks count too.
+    """
+    h = hashlib.sha256(inspect.getsource(inspect.getmodule(builder)).encode())
+    h.update(pickle.dumps(sorted(kwargs.items()), protocol=4))
+    return h.hexdigest()
+
+
+def _init_worker():
+    matplotlib.use('Agg') #workers never open windows
+
+
+def _render(builder, out_path, kwargs, dpi):
+    #worker: draw one figure and write it to out_path
+    import matplotlib.pyplot as plt
+    fig = builder(**kwargs)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    fig.savefig(out_path, dpi=dpi)
+    plt.close(fig)
+    return out_path
+
+
+class FigureSet:
+    """The figures of one script run.
+
+    Interactively, add() draws the figure and blocks on plt.show() as the scripts always
+    did. In headless mode add() only queues the figure, and render() writes every queued
+    figure whose inputs changed, using a pool of Agg workers.
+    """
+
+    def __init__(self, headless=None, n_jobs=None, dpi=100, manifest_path=MANIFEST_PATH):
+        self.headless = headless_requested() if headless is None else headless
+        self.n_jobs = n_jobs
+        self.dpi = dpi
+        self.manifest_path = manifest_path
+        self.jobs = []
+        if self.headless:
+            import matplotlib.pyplot as plt
+            plt.switch_backend('Agg')
+
+    def add(self, builder, out_path, **kwargs):
+        if self.headless:
+            self.jobs.append((builder, out_path, kwargs))
+        else:
+            import matplotlib.pyplot as plt
+            builder(**kwargs)
+            plt.show()
+
+    def render(self):
+        """Write the queued figures; returns (no. rendered, no. skipped as unchanged)."""
+        if not self.jobs:
+            return 0, 0
+        manifest = self._read_manifest()
+        todo, fingerprints = [], {}
+        for builder, out_path, kwargs in self.jobs:
+            fingerprint = figure_fingerprint(builder, kwargs)
+            key = os.path.relpath(out_path, GRAPH_DIR)
+            if manifest.get(key) == fingerprint and os.path.exists(out_path):
+                continue
+            todo.append((builder, out_path, kwargs, self.dpi))
+            fingerprints[key] = fingerprint
+
+        n_jobs = min(self.n_jobs or os.cpu_count() or 1, len(todo))
+        with span('render figures', figures=len(todo), unchanged=len(self.jobs) - len(todo)):
+            if n_jobs > 1:
+                with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker) as pool:
+                    list(pool.map(_render, *zip(*todo)))
+            else:
+                for job in todo:
+                    _render(*job)
+
+        manifest = self._read_manifest() #re-read so concurrent scripts don't drop each other's entries
+        manifest.update(fingerprints)
+        self._write_manifest(manifest)
+        skipped = len(self.jobs) - len(todo)
+        self.jobs = []
+        return len(todo), skipped
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, manifest):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.manifest_path), suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,357 @@
+"""Ingestion of the raw Bloomberg workbooks under Comp Data/Variables Data.
+
+The workbooks are read with a small streaming xlsx reader (zipfile + iterparse, no
+openpyxl), every sheet holding a dated series is aggregated to quarters (resample.py), and
+all series are assembled into one panel saved in the Data Store as 'Workbook_Panel'
+(plus 'Workbook_Series' describing each column).
+
+Parsed sheets are cached under Cache/Ingest by the sha256 of the workbook, and a
+manifest keeps each workbook's size and mtime: unchanged files are not even hashed
+again, a touched but identical file is hashed and reused, and only edited or new
+workbooks are parsed, in parallel.
+
+    python ingest.py                  # refresh the panel and print what it holds
+    python ingest.py --write-csv      # also rewrite the quarterly CSV files in CSV Data
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import iterparse
+
+import numpy as np
+import pandas as pd
+
+from artifact_store import STORE_DIR, load_frame, save_frame
+from resample import to_quarterly
+from tracing import count, span
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+WORKBOOK_DIR = os.path.join(script_dir, 'Comp Data', 'Variables Data') #raw Bloomberg data tables
+INGEST_CACHE_DIR = os.path.join(script_dir, 'Cache', 'Ingest') #parsed workbooks, keyed by content hash
+PANEL_NAME = 'Workbook_Panel'
+
+#workbook sheets the quarterly CSV files in CSV Data are converted from, in order of preference
+#(later sheets only fill quarters missing from the first). 3M TBill SA has no workbook here.
+_DXY = 'US Dollar Power/US Dollar Index (DXY Curncy)/PoP Level Change - QoQ (91 days - periods)/Data Table.xlsx'
+CSV_SOURCES = {
+    'US CPI SA': [('US CPI Urban Consumers SA (Seasonally adjusted acc to Bloomberg)/PoP Level Change - QoQ/Data Table - Inflation CPI.xlsx', None)],
+    'US DXY SA': [(_DXY, 'Quarterly Only'), (_DXY, 'Worksheet')],
+    'US Debt SA': [('Dollar Assets or Debt Abroad/US Treasury Capital Net Inflows Monthly (FRNTTNET Index) (Billions)/PoP Level Change - QoQ/Data Table US Debt.xlsx', 'Qrtly Aggregated QoQ Lvl Change')],
+    'US IP SA': [('Industrial Production (IP) Index/PoP Level Change - QoQ/Data Table - IP.xlsx', None)],
+    'US UE SA': [('Unemployment Rate Total in Labor Force (USURTOT Index) (Seasonally Adjusted according to Bloomberg)/PoP Level Change - QoQ/Data Table.xlsx', None)],
+}
+
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_DATE_FORMAT_IDS = set(range(14, 23)) | {45, 46, 47} #built-in excel date/time number formats
+_EXCEL_EPOCH = np.datetime64('1899-12-30', 'D')
+
+
+def _column_index(ref):
+    #'AB12' -> 27
+    col = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        col = col * 26 + ord(ch.upper()) - 64
+    return col - 1
+
+
+def _shared_strings(zf):
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return []
+    strings = []
+    with zf.open('xl/sharedStrings.xml') as f:
+        for _, elem in iterparse(f):
+            if elem.tag == _NS + 'si':
+                strings.append(''.join(t.text or '' for t in elem.iter(_NS + 't')))
+                elem.clear()
+    return strings
+
+
+def _date_styles(zf):
+    #indices of the cell styles whose number format is a date
+    from xml.etree.ElementTree import fromstring
+    styles = fromstring(zf.read('xl/styles.xml'))
+    custom = {int(fmt.get('numFmtId')): fmt.get('formatCode', '') for fmt in styles.iter(_NS + 'numFmt')}
+    date_ids = set(_DATE_FORMAT_IDS)
+    for fmt_id, code in custom.items():
+        code = re.sub(r'"[^"]*"|\[[^\]]*\]', '', code) #drop literals and colours/locales
+        if re.search(r'[dy]', code, re.I): #m alone could also be minutes
+            date_ids.add(fmt_id)
+    cell_xfs = styles.find(_NS + 'cellXfs')
+    if cell_xfs is None:
+        return set()
+    return {i for i, xf in enumerate(cell_xfs.findall(_NS + 'xf')) if int(xf.get('numFmtId', 0)) in date_ids}
+
+
+def _sheet_paths(zf):
+    #(sheet name, path of its xml part) in workbook order
+    from xml.etree.ElementTree import fromstring
+    rels = fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels}
+    sheets = []
+    for sheet in fromstring(zf.read('xl/workbook.xml')).iter(_NS + 'sheet'):
+        target = targets[sheet.get(_REL_NS + 'id')].lstrip('/')
+        sheets.append((sheet.get('name'), target if target.startswith('xl/') else 'xl/' + target))
+    return sheets
+
+
+def read_xlsx(path):
+    """All sheets of a workbook as {sheet name: list of rows}; dates come back as datetime64[D]."""
+    with zipfile.ZipFile(path) as zf:
+        strings = _shared_strings(zf)
+        date_styles = _date_styles(zf)
+        sheets = {}
+        for name, part in _sheet_paths(zf):
+            rows = []
+            with zf.open(part) as f:
+                for _, elem in iterparse(f):
+                    if elem.tag != _NS + 'row':
+                        continue
+                    row = {}
+                    for cell in elem.iter(_NS + 'c'):
+                        kind = cell.get('t', 'n')
+                        v = cell.find(_NS + 'v')
+                        if kind == 'inlineStr':
+                            value = ''.join(t.text or '' for t in cell.iter(_NS + 't'))
+                        elif v is None or v.text is None:
+                            continue
+                        elif kind == 's':
+                            value = strings[int(v.text)]
+                        elif kind in ('str', 'e'):
+                            value = v.text
+                        elif kind == 'b':
+                            value = v.text == '1'
+                        elif int(cell.get('s', 0)) in date_styles:
+                            value = _EXCEL_EPOCH + np.timedelta64(int(float(v.text)), 'D')
+                        else:
+                            value = float(v.text)
+                        row[_column_index(cell.get('r'))] = value
+                    rows.append([row.get(i) for i in range(max(row) + 1)] if row else [])
+                    elem.clear()
+            sheets[name] = rows
+    return sheets
+
+
+def sheet_series(rows):
+    """The dated series of one sheet: (dates, {column label: values}, header text), or None.
+
+    Data rows are the rows with a date followed by numbers; the header lines above the
+    first data row (Bloomberg's ticker, field and description lines) label the columns.
+    """
+    data_start = None
+    for i, row in enumerate(rows):
+        if row and isinstance(row[0], np.datetime64) and any(isinstance(v, float) for v in row[1:]):
+            data_start = i
+            break
+    if data_start is None:
+        return None
+    body = [row for row in rows[data_start:] if row and isinstance(row[0], np.datetime64)]
+    width = max(len(row) for row in body)
+    #column labels come from the 'Date' header row closest to the data (ticker or field name)
+    header_rows = [row for row in reversed(rows[:data_start]) if row and isinstance(row[0], str)][:1]
+    columns = {}
+    for j in range(1, width):
+        values = np.array([row[j] if j < len(row) and isinstance(row[j], float) else np.nan for row in body])
+        if np.isnan(values).all():
+            continue #text columns such as the currency
+        label = next((str(row[j]).strip() for row in header_rows if j < len(row) and row[j] is not None), f'Column {j}')
+        columns[label] = values
+    if not columns:
+        return None
+    header_text = ' | '.join(str(v).strip() for row in rows[:data_start] for v in row if v is not None)
+    return np.array([row[0] for row in body], dtype='datetime64[D]'), columns, header_text
+
+
+def parse_workbook(path):
+    """Every dated series in a workbook as a list of dicts (sheet, label, header, dates, values)."""
+    series = []
+    for sheet, rows in read_xlsx(path).items():
+        found = sheet_series(rows)
+        if found is None:
+            continue
+        dates, columns, header_text = found
+        for label, values in columns.items():
+            series.append({'sheet': sheet, 'label': label, 'header': header_text, 'dates': dates, 'values': values})
+    return series
+
+
+def transform_of(rel_path):
+    """Transform of a workbook from the folder naming used under Variables Data."""
+    if 'Level Change' in rel_path:
+        return 'PoP level change'
+    if re.search(r'PoP\s*_', rel_path):
+        return 'PoP %'
+    return 'level'
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def discover_workbooks(root=WORKBOOK_DIR):
+    """Relative paths of every .xlsx under root (excel's ~$ lock files excluded), sorted."""
+    found = []
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if name.lower().endswith('.xlsx') and not name.startswith('~$'):
+                found.append(os.path.relpath(os.path.join(folder, name), root).replace(os.sep, '/'))
+    return sorted(found)
+
+
+def _cache_file(sha, cache_dir):
+    return os.path.join(cache_dir, f'{sha}.npz')
+
+
+def _parse_to_cache(path, sha, cache_dir):
+    #worker: parse one workbook and store its series as <sha>.npz
+    series = parse_workbook(path)
+    arrays = {'info': np.array(json.dumps([{k: s[k] for k in ('sheet', 'label', 'header')} for s in series]))}
+    for i, s in enumerate(series):
+        arrays[f'dates{i}'] = s['dates'].astype('int64')
+        arrays[f'values{i}'] = s['values']
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, _cache_file(sha, cache_dir))
+    return sha
+
+
+def _load_cached(sha, cache_dir):
+    with np.load(_cache_file(sha, cache_dir)) as stored:
+        info = json.loads(str(stored['info']))
+        return [{**meta, 'dates': stored[f'dates{i}'].astype('datetime64[D]'), 'values': stored[f'values{i}']}
+                for i, meta in enumerate(info)]
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'manifest.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(manifest, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(cache_dir, 'manifest.json'))
+
+
+def refresh(root=WORKBOOK_DIR, cache_dir=INGEST_CACHE_DIR, n_jobs=None, how='last', log=print, store_dir=STORE_DIR):
+    """Parse new or edited workbooks and rebuild the quarterly panel; returns (panel, series info).
+
+    A workbook whose size and mtime match the manifest is not read at all. Otherwise it is
+    hashed, and only parsed if no cached parse exists for that content (n_jobs=None parses
+    on every core, n_jobs=1 here). how is the aggregator of resample.to_quarterly, or a
+    {series name: aggregator} dict. The panel is saved to the Data Store at store_dir.
+    """
+    manifest = _read_manifest(cache_dir)
+    workbooks = discover_workbooks(root)
+    shas, todo = {}, {}
+    for rel_path in workbooks:
+        path = os.path.join(root, rel_path)
+        stat = os.stat(path)
+        record = manifest.get(rel_path)
+        if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns \
+                and os.path.exists(_cache_file(record['sha256'], cache_dir)):
+            shas[rel_path] = record['sha256']
+            continue
+        sha = file_sha256(path) #mtime changed: the content may still be the same
+        shas[rel_path] = sha
+        manifest[rel_path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha}
+        if not os.path.exists(_cache_file(sha, cache_dir)):
+            todo[sha] = path
+
+    if todo:
+        log(f'parsing {len(todo)} of {len(workbooks)} workbooks')
+        n_jobs = min(n_jobs or os.cpu_count() or 1, len(todo))
+        with span('parse workbooks', workbooks=len(todo)):
+            if n_jobs > 1:
+                with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                    list(pool.map(_parse_to_cache, todo.values(), todo.keys(), [cache_dir] * len(todo)))
+            else:
+                for sha, path in todo.items():
+                    _parse_to_cache(path, sha, cache_dir)
+            count('workbooks parsed', len(todo))
+    for rel_path in set(manifest) - set(workbooks): #workbooks that were removed
+        del manifest[rel_path]
+    _write_manifest(manifest, cache_dir)
+
+    columns, rows = {}, []
+    with span('merge', workbooks=len(workbooks)):
+        for rel_path in workbooks:
+            series = _load_cached(shas[rel_path], cache_dir)
+            n_sheets = len({s['sheet'] for s in series})
+            for s in series:
+                name = series_name(rel_path, s['sheet'] if n_sheets > 1 else None)
+                if sum(t['sheet'] == s['sheet'] for t in series) > 1:
+                    name += f" ({s['label']})"
+                agg = how.get(name, 'last') if isinstance(how, dict) else how #aggregator for daily/monthly sheets
+                quarterly = to_quarterly(pd.Series(s['values'], index=pd.DatetimeIndex(s['dates'])), agg).dropna()
+                columns[name] = quarterly
+                rows.append({
+                    'Series': name, 'Workbook': rel_path, 'Sheet': s['sheet'], 'Label': s['label'],
+                    'Header': s['header'], 'Transform': transform_of(rel_path),
+                    'Observations': int(np.isfinite(s['values']).sum()),
+                    'Per Quarter': round(np.isfinite(s['values']).sum() / max(len(quarterly), 1), 1),
+                    'First Quarter': str(quarterly.index[0]) if len(quarterly) else '',
+                    'Last Quarter': str(quarterly.index[-1]) if len(quarterly) else '',
+                })
+        panel = pd.DataFrame(columns).sort_index()
+    panel.index.name = 'Date'
+    info = pd.DataFrame(rows)
+    save_frame(panel, PANEL_NAME, store_dir=store_dir)
+    save_frame(info, 'Workbook_Series', store_dir=store_dir)
+    return panel, info
+
+
+def load_panel(refresh_first=True, **kwargs):
+    """The quarterly panel of every workbook series (refreshed from the workbooks by default)."""
+    if refresh_first:
+        return refresh(**kwargs)[0]
+    return load_frame(PANEL_NAME)
+
+
+def series_name(rel_path, sheet=None):
+    """Panel column of a workbook series (the sheet is only part of the name for multi-sheet workbooks)."""
+    return rel_path[:-len('.xlsx')] + (f' [{sheet}]' if sheet else '')
+
+
+def write_csv_files(panel, csv_folder=os.path.join(script_dir, 'CSV Data'), start='1994Q3', end='2023Q4'):
+    """Rewrite the quarterly 'Date,Value' CSV files (m/d/Y quarter-end dates) for the series in CSV_SOURCES."""
+    written = []
+    for csv_name, sources in CSV_SOURCES.items():
+        series = panel[series_name(*sources[0])]
+        for source in sources[1:]:
+            series = series.combine_first(panel[series_name(*source)])
+        series = series.loc[start:end].dropna()
+        dates = series.index.to_timestamp(how='end')
+        out = pd.DataFrame({'Date': [f'{d.month}/{d.day}/{d.year}' for d in dates], 'Value': series.to_numpy()})
+        path = os.path.join(csv_folder, f'{csv_name}.csv')
+        out.to_csv(path, index=False, float_format='%.10g') #excel's csv export keeps 10 significant digits
+        written.append(path)
+    return written
+
+
+if __name__ == '__main__': #guard needed because parsing runs in worker processes
+    panel, info = refresh()
+    print(f'{panel.shape[1]} series, {panel.index[0]} to {panel.index[-1]}')
+    print(info[['Series', 'Transform', 'Per Quarter', 'First Quarter', 'Last Quarter']].to_string(index=False))
+    if '--write-csv' in sys.argv:
+        for path in write_csv_files(panel):
+            print(f'written: {path}')
@@ -0,0 +1,163 @@
+"""Bootstrap confidence bands for VAR impulse responses.
+
+Replications are split into fixed-size chunks that run across a process pool. Each
+chunk gets its own child of one SeedSequence, so the bands only depend on the seed
+and chunk size, not on how many workers ran them. Inside a chunk every draw is
+handled at once: the bootstrap samples are simulated as one (draws, T, K) array,
+refit with batched least squares and turned into IRFs with a batched MA recursion.
+
+- 'residual': resample the centered residuals with replacement
+- 'wild': flip the sign of each period's residual vector (Rademacher weights),
+  which keeps any heteroskedasticity in the residuals
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fevd import fevd_shares
+from tracing import count, span
+
+
+def var_spec(fitted_model):
+    """The plain arrays of a fitted statsmodels VAR needed to resample and refit it."""
+    return {
+        'endog': np.asarray(fitted_model.endog, dtype=float),
+        'params': np.asarray(fitted_model.params, dtype=float),
+        'resid': np.asarray(fitted_model.resid, dtype=float),
+        'trend_cols': np.asarray(fitted_model.endog_lagged, dtype=float)[:, :fitted_model.k_exog],
+        'lag': fitted_model.k_ar,
+    }
+
+
+def ma_rep_batch(coefs, periods):
+    """MA coefficients Phi_0..Phi_periods for a stack of VAR coefficient arrays.
+
+    coefs: (..., p, K, K) -> returns (..., periods + 1, K, K), same recursion as VARProcess.ma_rep.
+    """
+    coefs = np.asarray(coefs)
+    p, K = coefs.shape[-3], coefs.shape[-1]
+    phis = np.zeros(coefs.shape[:-3] + (periods + 1, K, K))
+    phis[..., 0, :, :] = np.eye(K)
+    for h in range(1, periods + 1):
+        for i in range(1, min(h, p) + 1):
+            phis[..., h, :, :] += phis[..., h - i, :, :] @ coefs[..., i - 1, :, :]
+    return phis
+
+
+def lag_design_batch(y, lag, trend_cols):
+    """Stack of VAR regressor matrices [trend, y_{t-1}, ..., y_{t-p}] for samples y of shape (B, n, K)."""
+    B, n, K = y.shape
+    T = n - lag
+    k_trend = trend_cols.shape[1]
+    Z = np.empty((B, T, k_trend + K * lag))
+    Z[:, :, :k_trend] = trend_cols
+    for i in range(1, lag + 1):
+        Z[:, :, k_trend + K * (i - 1):k_trend + K * i] = y[:, lag - i:n - i]
+    return Z
+
+
+def fit_batch(y, lag, trend_cols):
+    """Least-squares VAR(lag) estimates for every sample in y (B, n, K) in one batched QR solve.
+
+    Returns params (B, k_trend + K*lag, K) laid out like statsmodels' params, and sigma_u (B, K, K).
+    """
+    Z = lag_design_batch(y, lag, trend_cols)
+    Y = y[:, lag:]
+    q, r = np.linalg.qr(Z)
+    params = np.linalg.solve(r, q.transpose(0, 2, 1) @ Y)
+    resid = Y - Z @ params
+    df_resid = Z.shape[1] - Z.shape[2]
+    sigma_u = resid.transpose(0, 2, 1) @ resid / df_resid
+    return params, sigma_u
+
+
+def params_to_coefs(params, lag, k_trend):
+    """(..., k_trend + K*lag, K) params -> (..., lag, K, K) coefficient matrices A_1..A_p."""
+    K = params.shape[-1]
+    lagged = params[..., k_trend:, :].reshape(params.shape[:-2] + (lag, K, K))
+    return lagged.swapaxes(-1, -2)
+
+
+def simulate_batch(spec, rng, n_draws, method='residual'):
+    """Bootstrap samples (n_draws, n, K) generated recursively from the fitted VAR and resampled residuals."""
+    endog, params, lag = spec['endog'], spec['params'], spec['lag']
+    resid = spec['resid']
+    trend_cols = spec['trend_cols']
+    T, K = resid.shape
+    k_trend = trend_cols.shape[1]
+
+    if method == 'residual':
+        centered = resid - resid.mean(axis=0)
+        u = centered[rng.integers(0, T, size=(n_draws, T))]
+    elif method == 'wild':
+        u = resid * rng.choice([-1.0, 1.0], size=(n_draws, T, 1))
+    else:
+        raise ValueError(f"unknown bootstrap method '{method}' (use 'residual' or 'wild')")
+
+    deterministic = trend_cols @ params[:k_trend] #(T, K) trend part of each equation
+    coefs = params_to_coefs(params, lag, k_trend) #(lag, K, K)
+    y = np.empty((n_draws, T + lag, K))
+    y[:, :lag] = endog[:lag] #the observed presample starts every bootstrap path
+    for t in range(T): #the recursion runs over time; all draws advance together
+        y_t = deterministic[t] + u[:, t]
+        for i in range(1, lag + 1):
+            y_t += y[:, lag + t - i] @ coefs[i - 1].T
+        y[:, lag + t] = y_t
+    return y
+
+
+def _bootstrap_chunk(spec, seed, n_draws, periods, method, orth, fevd=False):
+    #one chunk of replications: simulate, refit and compute IRFs (and FEVDs) for all its draws at once
+    rng = np.random.default_rng(seed)
+    y = simulate_batch(spec, rng, n_draws, method)
+    params, sigma_u = fit_batch(y, spec['lag'], spec['trend_cols'])
+    coefs = params_to_coefs(params, spec['lag'], spec['trend_cols'].shape[1])
+    irfs = ma_rep_batch(coefs, periods)
+    if orth or fevd:
+        orth_irfs = irfs @ np.linalg.cholesky(sigma_u)[:, None]
+        irfs = orth_irfs if orth else irfs
+    if fevd:
+        return irfs, fevd_shares(orth_irfs)
+    return irfs
+
+
+def bootstrap_irfs(fitted_model, periods, reps=2000, method='residual', orth=False, seed=0,
+                   n_jobs=None, chunk_size=250, fevd=False):
+    """Bootstrap IRF draws of shape (reps, periods + 1, K, K) for a fitted statsmodels VAR.
+
+    n_jobs=1 runs in this process; otherwise chunks of chunk_size draws are spread over
+    a process pool (n_jobs=None uses every core). Results are reproducible for a given seed.
+    fevd=True returns (IRF draws, FEVD draws), the FEVDs of the same replications.
+    """
+    spec = var_spec(fitted_model)
+    sizes = [chunk_size] * (reps // chunk_size) + ([reps % chunk_size] if reps % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes)) #independent, deterministic stream per chunk
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    args = [(spec, s, n, periods, method, orth, fevd) for s, n in zip(seeds, sizes)]
+    with span('bootstrap', reps=reps, method=method):
+        if n_jobs == 1 or len(sizes) == 1:
+            chunks = [_bootstrap_chunk(*a) for a in args]
+        else:
+            with ProcessPoolExecutor(max_workers=min(n_jobs, len(sizes))) as pool:
+                chunks = list(pool.map(_bootstrap_chunk, *zip(*args)))
+        count('fits', reps) #one refit per replication, in the workers
+    if fevd:
+        return np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+    return np.concatenate(chunks)
+
+
+def bootstrap_bands(fitted_model, periods, reps=2000, method='residual', orth=False, signif=0.05,
+                    seed=0, n_jobs=None, chunk_size=250, fevd=False):
+    """Percentile (lower, upper) bands, each shaped like irf.irfs, at confidence level 1 - signif.
+
+    fevd=True returns ((lower, upper) IRF bands, (lower, upper) FEVD bands) from the same draws.
+    """
+    quantiles = [signif / 2, 1 - signif / 2]
+    if fevd:
+        irf_draws, fevd_draws = bootstrap_irfs(fitted_model, periods, reps, method, orth, seed, n_jobs, chunk_size, fevd=True)
+        return tuple(np.quantile(irf_draws, quantiles, axis=0)), tuple(np.quantile(fevd_draws, quantiles, axis=0))
+    draws = bootstrap_irfs(fitted_model, periods, reps, method, orth, seed, n_jobs, chunk_size)
+    lower, upper = np.quantile(draws, quantiles, axis=0)
+    return lower, upper
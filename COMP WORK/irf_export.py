@@ -0,0 +1,86 @@
+"""Long-format export of impulse responses: one row per (shock, response, period).
+
+The whole table is built from the (period, response, shock) arrays of a statsmodels
+IRAnalysis with one transpose/reshape per column, and the asymptotic standard errors
+are computed once per table instead of once per shock/response pair.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def _long(arr):
+    #(period, response, shock) -> flat vector ordered by shock, then response, then period
+    return np.asarray(arr).transpose(2, 1, 0).reshape(-1)
+
+
+def _add_columns(columns, prefix, values, stderr, crit, bands):
+    columns[f'{prefix}IRF'] = _long(values)
+    if bands:
+        columns[f'{prefix}Lower Conf'] = _long(values - crit * stderr)
+        columns[f'{prefix}Upper Conf'] = _long(values + crit * stderr)
+
+
+def irf_long_table(irf, names, orth=False, cumulative=False, bands=True, crit=1.96, boot_bands=None,
+                   band_names=('Boot Lower Conf', 'Boot Upper Conf')):
+    """Data frame of impulse responses in the IRF_Lag_{lag}.csv layout.
+
+    irf: IRAnalysis from fitted_model.irf(periods); names: variable names in model order.
+    The base columns are the non-orthogonalized IRF with +/- crit * stderr bands;
+    orth=True adds 'Orth IRF' columns, cumulative=True adds 'Cum IRF' columns (and
+    'Orth Cum IRF' when both are set). boot_bands=(lower, upper) arrays shaped like
+    irf.irfs add 'Boot Lower Conf' / 'Boot Upper Conf' columns (named by band_names,
+    e.g. for posterior bands).
+    """
+    n_periods, K, _ = irf.irfs.shape
+    names = list(names)
+    codes = np.arange(K)
+
+    columns = {'Period': np.tile(np.arange(n_periods), K * K)}
+    _add_columns(columns, '', irf.irfs, irf.stderr(orth=False) if bands else None, crit, bands)
+    #variable names as categoricals: two small code vectors instead of K*K*periods python strings
+    columns['Shock Variable'] = pd.Categorical.from_codes(np.repeat(codes, K * n_periods), categories=names)
+    columns['Response Variable'] = pd.Categorical.from_codes(np.tile(np.repeat(codes, n_periods), K), categories=names)
+
+    if orth:
+        _add_columns(columns, 'Orth ', irf.orth_irfs, irf.stderr(orth=True) if bands else None, crit, bands)
+    if cumulative:
+        _add_columns(columns, 'Cum ', irf.cum_effects, irf.cum_effect_stderr(orth=False) if bands else None, crit, bands)
+        if orth:
+            _add_columns(columns, 'Orth Cum ', irf.orth_cum_effects, irf.cum_effect_stderr(orth=True) if bands else None, crit, bands)
+    if boot_bands is not None:
+        lower, upper = boot_bands
+        columns[band_names[0]] = _long(lower)
+        columns[band_names[1]] = _long(upper)
+
+    return pd.DataFrame(columns)
+
+
+def array_table(arrays, names):
+    """Long table of named (period, response, shock) arrays, e.g. response envelopes, in the same row layout."""
+    n_periods, K, _ = next(iter(arrays.values())).shape
+    codes = np.arange(K)
+    columns = {'Period': np.tile(np.arange(n_periods), K * K)}
+    columns.update({name: _long(values) for name, values in arrays.items()})
+    columns['Shock Variable'] = pd.Categorical.from_codes(np.repeat(codes, K * n_periods), categories=list(names))
+    columns['Response Variable'] = pd.Categorical.from_codes(np.tile(np.repeat(codes, n_periods), K), categories=list(names))
+    return pd.DataFrame(columns)
+
+
+def write_table(table, path):
+    """Write a long-format table as csv, or as a binary columnar file (.parquet / .feather).
+
+    The binary formats keep the categorical variable columns and float64 values as they
+    are, and need pyarrow installed.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        table.to_csv(path, index=False)
+    elif ext == '.parquet':
+        table.to_parquet(path, index=False)
+    elif ext == '.feather':
+        table.to_feather(path)
+    else:
+        raise ValueError(f"unsupported table format '{ext}' (use .csv, .parquet or .feather)")
+    return path
@@ -0,0 +1,126 @@
+"""One-pass lag order sweep for VAR(p) models.
+
+Every candidate order 0..max_lags is estimated on the same sample (the first
+max_lags observations are held back as presample values), so the regressor sets
+are nested. One QR factorization of [Z | Y] then gives the residual covariance of
+every order, instead of refitting VAR(data).fit(lag) once (or twice) per lag.
+"""
+import numpy as np
+import pandas as pd
+from scipy.stats import chi2
+
+from tracing import count, span
+
+TREND_ORDERS = {'n': 0, 'c': 1, 'ct': 2, 'ctt': 3} #no. of deterministic columns for each trend spec
+
+
+def build_lag_design(values, max_lags, trend='c'):
+    """Return (Z, Y) for the common-sample regression of y_t on trend terms and lags 1..max_lags.
+
+    The columns of Z are ordered [trend terms, lag 1 block, lag 2 block, ...] like statsmodels,
+    so the first k_trend + K*p columns are the regressors of a VAR(p).
+    """
+    values = np.asarray(values, dtype=float)
+    n_obs, K = values.shape
+    k_trend = TREND_ORDERS[trend]
+    T = n_obs - max_lags #no. of usable observations once presample values are held back
+    if T <= 0:
+        raise ValueError(f"max_lags={max_lags} leaves no observations (only {n_obs} rows)")
+
+    Z = np.empty((T, k_trend + K * max_lags))
+    t = np.arange(max_lags + 1, n_obs + 1, dtype=float) #time index of the estimation sample
+    for i in range(k_trend):
+        Z[:, i] = t ** i
+    for lag in range(1, max_lags + 1): #each lag block is a shifted slice of the data, no copies of the full panel
+        start = k_trend + K * (lag - 1)
+        Z[:, start:start + K] = values[max_lags - lag:n_obs - lag]
+    Y = values[max_lags:]
+    return Z, Y
+
+
+def residual_sse(values, max_lags, trend='c'):
+    """Residual cross-product matrices u'u of VAR(0)..VAR(max_lags) on the common sample.
+
+    Returns an array of shape (max_lags + 1, K, K) and the sample size T. Uses a single
+    QR of [Z | Y]: with R = [[R11, R12], [0, R22]], the residuals of Y on the first m
+    columns of Z have u'u = R22'R22 + R12[m:]'R12[m:].
+    """
+    Z, Y = build_lag_design(values, max_lags, trend)
+    T, m = Z.shape
+    K = Y.shape[1]
+    if T < m + K:
+        raise ValueError(f"not enough observations ({T}) for {K} variables with max_lags={max_lags}")
+
+    R = np.linalg.qr(np.hstack([Z, Y]), mode='r')
+    diag = np.abs(np.diag(R[:m, :m]))
+    if m and diag.min() <= 1e-10 * diag.max():
+        raise ValueError("lagged design matrix is rank deficient")
+    R12 = R[:m, m:]
+    R22 = R[m:m + K, m:]
+
+    k_trend = TREND_ORDERS[trend]
+    sse = np.empty((max_lags + 1, K, K))
+    sse[max_lags] = R22.T @ R22
+    for p in range(max_lags, 0, -1): #peel off one lag block at a time, from the largest order down
+        block = R12[k_trend + K * (p - 1):k_trend + K * p]
+        sse[p - 1] = sse[p] + block.T @ block
+    if k_trend == 0: #VAR(0) with no deterministic terms has no regressors at all
+        sse[0] = Y.T @ Y
+    return sse, T
+
+
+def lag_order_sweep(data, max_lags=15, trend='c'):
+    """Information criteria and sequential LR tests for lag orders 0..max_lags in one table.
+
+    The criteria follow statsmodels' VARResults.info_criteria and match VAR.select_order,
+    and the LR statistic for order p tests VAR(p-1) against VAR(p) with K^2 degrees of freedom.
+    """
+    values = np.asarray(data, dtype=float)
+    K = values.shape[1]
+    k_trend = TREND_ORDERS[trend]
+    with span('lag order sweep', max_lags=max_lags):
+        sse, T = residual_sse(values, max_lags, trend)
+        count('fits', max_lags + 1) #every order is estimated, from one factorization
+
+    lags = np.arange(max_lags + 1)
+    _, logdet = np.linalg.slogdet(sse / T) #log|sigma_u_mle| for every order at once
+    df_model = k_trend + K * lags #regressors per equation
+    df_resid = T - df_model
+    free_params = lags * K ** 2 + K * k_trend
+
+    aic = logdet + (2.0 / T) * free_params
+    bic = logdet + (np.log(T) / T) * free_params
+    hqic = logdet + (2.0 * np.log(np.log(T)) / T) * free_params
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fpe = ((T + df_model) / df_resid) ** K * np.exp(logdet)
+    fpe[df_resid <= 0] = np.inf
+    llf = -(T * K / 2) * np.log(2 * np.pi) - (T / 2) * (logdet + K)
+
+    lr_stat = np.full(max_lags + 1, np.nan)
+    lr_stat[1:] = 2 * (llf[1:] - llf[:-1]) #LR test of p-1 (restricted) against p (unrestricted)
+    lr_df = K ** 2
+
+    return pd.DataFrame({
+        'Lag Length': lags,
+        'AIC': aic,
+        'BIC': bic,
+        'HQIC': hqic,
+        'FPE': fpe,
+        'Log-Likelihood': llf,
+        'LR Statistic': lr_stat,
+        'p-value': chi2.sf(lr_stat, lr_df),
+        'Degrees of Freedom': np.where(lags > 0, lr_df, 0),
+        'Nobs': T,
+    })
+
+
+def sigma_u(data, lag, max_lags=None, trend='c'):
+    """Degrees-of-freedom adjusted residual covariance of a VAR(lag) on the sweep's common sample."""
+    max_lags = lag if max_lags is None else max_lags
+    values = np.asarray(data, dtype=float)
+    K = values.shape[1]
+    sse, T = residual_sse(values, max_lags, trend)
+    omega = sse[lag] / (T - (TREND_ORDERS[trend] + K * lag))
+    if isinstance(data, pd.DataFrame):
+        return pd.DataFrame(omega, index=data.columns, columns=data.columns)
+    return omega
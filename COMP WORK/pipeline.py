@@ -0,0 +1,275 @@
+"""Incremental runner for the analysis scripts.
+
+Each script is declared as a stage with the files it reads and writes. A stage is
+re-executed only when its fingerprint (the contents of its script and its input
+files) differs from the last successful run, or when one of its outputs is missing
+or was changed by hand. Stages whose inputs are ready run concurrently, each as a
+headless subprocess, with its console output saved under Cache/Pipeline/logs.
+
+    python pipeline.py                 # bring everything up to date
+    python pipeline.py irf acf         # only these stages (and whatever they depend on)
+    python pipeline.py --dry-run       # show what would run
+    python pipeline.py --force lr-test # rerun a stage even if it is up to date
+    python pipeline.py --trace irf     # trace the stages that run (see tracing.py), --profile to sample stacks too
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import tracing
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_DIR = os.path.join(script_dir, 'Cache', 'Pipeline')
+STATE_PATH = os.path.join(PIPELINE_DIR, 'state.json')
+LOG_DIR = os.path.join(PIPELINE_DIR, 'logs')
+
+RAW_SERIES = ['3M TBill SA', 'US CPI SA', 'US DXY SA', 'US Debt SA', 'US IP SA', 'US UE SA'] #raw quarterly inputs in CSV Data
+
+
+def csv_path(name):
+    return os.path.join('CSV Data', name)
+
+
+def workbooks():
+    """The raw Bloomberg workbooks under Comp Data/Variables Data (see ingest.py)."""
+    root = os.path.join(script_dir, 'Comp Data', 'Variables Data')
+    return sorted(os.path.relpath(os.path.join(folder, name), script_dir)
+                  for folder, _, files in os.walk(root) for name in files
+                  if name.lower().endswith('.xlsx') and not name.startswith('~$'))
+
+
+def artifact(name):
+    """A Data Store artifact; its meta.json carries the hash of the stored data."""
+    return os.path.join('Data Store', name, 'meta.json')
+
+
+class Stage:
+    """One script of the analysis, with the files (relative to COMP WORK) it reads and writes."""
+
+    def __init__(self, name, script, inputs, outputs=(), args=()):
+        self.name = name
+        self.script = script
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.args = list(args) #extra command line arguments for the script
+
+    def __repr__(self):
+        return f'Stage({self.name!r})'
+
+
+#intermediate data is passed through the typed artifacts in Data Store, so stages depend on their
+#meta.json rather than on the csv views (which are not written when VAR_WRITE_CSV=0)
+STAGES = [
+    Stage('ingest', 'ingest.py',
+          workbooks(),
+          [csv_path(f'{name}.csv') for name in RAW_SERIES if name != '3M TBill SA'], #no workbook for the T-bill rate
+          args=['--write-csv']),
+    Stage('seasonality', 'Seasonality Check.py',
+          [csv_path(f'{name}.csv') for name in RAW_SERIES],
+          [artifact('Seasonally_Differenced_Data')]),
+    Stage('detrending', 'Detrending.py',
+          [csv_path('US Debt SA.csv')],
+          [artifact('Value_detrended_and_seasonally_differenced')]),
+    Stage('standardize', 'Standardizing.py',
+          [artifact('Seasonally_Differenced_Data')],
+          [artifact('Standardized_Data'), artifact('Standardization_Parameters')]),
+    Stage('stationarity', 'Stationarity Check.py',
+          [artifact('Standardized_Data')],
+          [artifact('Stationarity_Test_Results')]),
+    Stage('info-criteria', 'Order Selection - Info Criterion.py',
+          [artifact('Standardized_Data')]),
+    Stage('lr-test', 'Order Selection - LR Testing.py',
+          [artifact('Standardized_Data')],
+          [artifact('LR_Test_Results')]),
+    Stage('acf', 'Order Selection - ACF.py',
+          [artifact('Standardized_Data')],
+          [artifact('ACF_PACF_Values'), artifact('Residual_Cross_Correlations'), artifact('Portmanteau_Test_Results')]),
+    Stage('causality', 'Granger Causality.py',
+          [artifact('Standardized_Data')],
+          [artifact('Granger_Causality_Tests'), artifact('Block_Exogeneity_Tests')]
+          + [artifact(f'Granger_PValues_Lag_{lag}') for lag in (5, 6, 7, 8)]),
+    Stage('rolling-var', 'Rolling VAR.py',
+          [artifact('Standardized_Data')],
+          [artifact(f'Rolling_VAR_Lag_{lag}') for lag in (5, 6, 7, 8)] + [artifact('Rolling_VAR_Info_Criteria')]),
+    Stage('sparse-var', 'Sparse VAR.py',
+          [artifact('Standardized_Data')],
+          [artifact(f'Sparse_IRF_Lag_{lag}') for lag in (4, 6, 8)]
+          + [artifact('Sparse_VAR_CV'), artifact('Sparse_VAR_Info_Criteria')]),
+    Stage('stability', 'Stability Tests.py',
+          [artifact('Standardized_Data')],
+          [artifact('Stability_Test_Results')]),
+    Stage('irf', 'Impulse Response Functions.py',
+          [artifact('Standardized_Data')],
+          [artifact(f'IRF_Lag_{lag}') for lag in (6, 7, 8)]
+          + [artifact(f'{name}_Lag_{lag}') for name in ('FEVD', 'Historical_Decomposition') for lag in (6, 7, 8)]
+          + [artifact(f'BVAR_IRF_Lag_{lag}') for lag in (6, 7, 8)]
+          + [artifact(f'Ordering_{kind}_Lag_{lag}') for kind in ('IRF', 'FEVD') for lag in (6, 7, 8)]),
+    Stage('scenarios', 'Scenario Simulation.py',
+          [artifact('Standardized_Data')],
+          [artifact(f'Scenario_Fan_Lag_{lag}') for lag in (6, 7, 8)] + [artifact('Scenario_Tail_Probabilities')]),
+]
+
+
+def file_fingerprint(path):
+    """sha256 of a file's contents, or None if it does not exist."""
+    h = hashlib.sha256()
+    try:
+        with open(os.path.join(script_dir, path), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+def stage_fingerprint(stage):
+    """Fingerprint of everything a stage's result depends on: its script and its inputs."""
+    h = hashlib.sha256()
+    for path in [stage.script] + stage.inputs:
+        h.update(f'{path}={file_fingerprint(path)}\n'.encode())
+    return h.hexdigest()
+
+
+def upstream(stages):
+    """Map each stage name to the names of the stages producing its inputs."""
+    producers = {out: s.name for s in stages for out in s.outputs}
+    return {s.name: sorted({producers[i] for i in s.inputs if i in producers and producers[i] != s.name}) for s in stages}
+
+
+def with_dependencies(names, stages):
+    """The named stages plus everything upstream of them, in declaration order."""
+    deps = upstream(stages)
+    wanted, todo = set(), list(names)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(deps[name])
+    return [s for s in stages if s.name in wanted]
+
+
+def is_stale(stage, state):
+    """True if the stage's inputs or script changed, or an output is missing or was edited since its last run."""
+    record = state.get(stage.name)
+    if record is None or record['fingerprint'] != stage_fingerprint(stage):
+        return True
+    return any(file_fingerprint(out) != record['outputs'].get(out) for out in stage.outputs)
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def run_stage(stage):
+    """Run one stage's script headless in a subprocess; returns (return code, seconds, log path)."""
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f'{stage.name}.log')
+    env = {**os.environ, 'MPLBACKEND': 'Agg'}
+    if tracing.ENABLED: #each stage writes its own trace to Cache/Traces
+        env['VAR_TRACE'] = '1'
+    if tracing.PROFILE:
+        env['VAR_PROFILE'] = '1'
+    start = time.perf_counter()
+    with tracing.span(stage.name, script=stage.script), open(log_path, 'w') as log:
+        code = subprocess.call([sys.executable, stage.script, '--headless'] + stage.args, cwd=script_dir,
+                               stdout=log, stderr=subprocess.STDOUT, env=env)
+    return code, time.perf_counter() - start, log_path
+
+
+def run_pipeline(names=None, stages=STAGES, force=(), jobs=None, dry_run=False, log=print):
+    """Bring the selected stages up to date; returns {stage name: 'ran' | 'up to date' | 'failed' | 'skipped'}.
+
+    A stage is only checked once all its upstream stages have finished, so a change that
+    reruns an upstream stage but leaves its outputs byte-identical does not rerun the
+    stages below it. Independent stages run concurrently (jobs=None uses every core).
+    """
+    selected = with_dependencies(names, stages) if names else list(stages)
+    deps = upstream(selected)
+    state = load_state()
+    status = {}
+    selected_by_name = {s.name: s for s in selected}
+    pending = dict(selected_by_name)
+    running = {} #future -> stage name
+
+    max_workers = jobs or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if len(running) >= max_workers:
+                    break
+                if any(d in pending or d in running.values() for d in deps[name]):
+                    continue #wait for upstream stages
+                del pending[name]
+                if any(status.get(d) in ('failed', 'skipped') for d in deps[name]):
+                    status[name] = 'skipped'
+                    log(f'[{name}] skipped: an upstream stage failed')
+                elif name not in force and not is_stale(stage, state):
+                    status[name] = 'up to date'
+                    log(f'[{name}] up to date')
+                elif dry_run:
+                    status[name] = 'ran' #pretend it ran so stages below are reported as well
+                    log(f'[{name}] would run {stage.script}')
+                else:
+                    log(f'[{name}] running {stage.script}')
+                    running[pool.submit(run_stage, stage)] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = selected_by_name[running.pop(future)]
+                code, seconds, log_path = future.result()
+                if code == 0:
+                    status[stage.name] = 'ran'
+                    state[stage.name] = {
+                        'fingerprint': stage_fingerprint(stage),
+                        'outputs': {out: file_fingerprint(out) for out in stage.outputs},
+                    }
+                    save_state(state)
+                    log(f'[{stage.name}] finished in {seconds:.1f}s')
+                else:
+                    status[stage.name] = 'failed'
+                    log(f'[{stage.name}] FAILED (exit code {code}), see {log_path}')
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the VAR analysis stages that are out of date.')
+    parser.add_argument('stages', nargs='*', help=f"stages to bring up to date (default: all of {', '.join(s.name for s in STAGES)})")
+    parser.add_argument('--force', action='store_true', help='rerun the named stages even if they are up to date')
+    parser.add_argument('--jobs', type=int, default=None, help='max. no. of stages running at once')
+    parser.add_argument('--dry-run', action='store_true', help='only report which stages would run')
+    parser.add_argument('--trace', action='store_true', help='write a trace of the pipeline and of every stage that runs')
+    parser.add_argument('--profile', action='store_true', help='--trace plus sampled call stacks')
+    args = parser.parse_args(argv)
+
+    known = {s.name for s in STAGES}
+    unknown = [name for name in args.stages if name not in known]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    force = set(args.stages) if args.force else set()
+    if args.force and not args.stages:
+        force = known
+    status = run_pipeline(args.stages or None, force=force, jobs=args.jobs, dry_run=args.dry_run)
+    return 1 if 'failed' in status.values() else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""Vectorized aggregation of daily, weekly and monthly series to the quarterly frame.
+
+All columns of a frame are aggregated at once: the observations are sorted, cut into
+one segment per calendar quarter, and every aggregator is a single np.*.reduceat over
+those segments, so decades of daily data for hundreds of tickers take milliseconds.
+Missing values are skipped per column.
+
+Aggregators (chosen per column):
+- 'last' / 'first': the last (first) observation in the quarter, i.e. end-of-period
+  values such as index levels and rates; a quarter ending on a holiday or weekend
+  simply uses the last trading day
+- 'mean': average over the quarter
+- 'sum': plain sum, e.g. monthly level changes into a quarterly change
+- 'flow': sum scaled up by expected / observed observations, so a flow with missing
+  months or trading days is not understated
+- 'compound': chains period-on-period % changes into a quarterly % change
+
+Quarters with less than min_coverage of their expected observations (business days
+for daily data, 3 for monthly, 13 for weekly, with optional holidays) are set to NaN,
+so a partially observed current quarter does not pass for a full one.
+"""
+import numpy as np
+import pandas as pd
+
+AGGREGATORS = ('last', 'first', 'mean', 'sum', 'flow', 'compound')
+STEPS_PER_QUARTER = {'W': 13, 'M': 3, 'Q': 1}
+
+
+def infer_step(dates):
+    """'B' (business-daily), 'D', 'W', 'M' or 'Q' from the median spacing of sorted dates."""
+    days = np.diff(np.asarray(dates, dtype='datetime64[D]').astype(np.int64))
+    if days.size == 0:
+        return 'Q'
+    spacing = np.median(days)
+    if spacing <= 1.5:
+        weekday = (np.asarray(dates, dtype='datetime64[D]').astype(np.int64) + 3) % 7 #0 = Monday
+        return 'B' if (weekday < 5).all() else 'D'
+    if spacing <= 8:
+        return 'W'
+    if spacing <= 35:
+        return 'M'
+    return 'Q'
+
+
+def expected_observations(quarters, step, holidays=None):
+    """No. of observations a full quarter has at the given step (business days use holidays)."""
+    quarters = np.asarray(quarters, dtype=np.int64) #quarterly period ordinals
+    if step in STEPS_PER_QUARTER:
+        return np.full(quarters.shape, STEPS_PER_QUARTER[step], dtype=float)
+    start = (quarters * 3).astype('datetime64[M]').astype('datetime64[D]')
+    end = ((quarters + 1) * 3).astype('datetime64[M]').astype('datetime64[D]')
+    if step == 'D':
+        return (end - start).astype(float)
+    return np.busday_count(start, end, holidays=[] if holidays is None else holidays).astype(float)
+
+
+def _segments(dates):
+    #sort order, quarter ordinal of each segment and the segment starts
+    days = np.asarray(dates, dtype='datetime64[D]')
+    if len(days) == 0:
+        return None, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.intp)
+    order = None if (days[1:] >= days[:-1]).all() else np.argsort(days, kind='stable') #None: already sorted
+    quarters = (days if order is None else days[order]).astype('datetime64[M]').astype(np.int64) // 3 #same ordinals as pandas' Q-DEC periods
+    starts = np.flatnonzero(np.r_[True, quarters[1:] != quarters[:-1]])
+    return order, quarters[starts], starts
+
+
+def aggregate(values, starts, how):
+    """Aggregate the rows of values (n, k) over the segments beginning at starts; NaNs are skipped.
+
+    Returns (aggregated (n_segments, k), no. of valid observations per segment).
+    """
+    valid = ~np.isnan(values)
+    count = np.add.reduceat(valid, starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if how in ('last', 'first'):
+            rows = np.arange(len(values))[:, None]
+            if how == 'last':
+                pos = np.maximum.reduceat(np.where(valid, rows, -1), starts, axis=0)
+            else:
+                pos = np.minimum.reduceat(np.where(valid, rows, len(values)), starts, axis=0)
+            out = np.take_along_axis(values, np.clip(pos, 0, len(values) - 1), axis=0)
+        elif how in ('mean', 'sum', 'flow'):
+            out = np.add.reduceat(np.where(valid, values, 0.0), starts, axis=0)
+            if how == 'mean':
+                out = out / count
+        elif how == 'compound':
+            out = np.expm1(np.add.reduceat(np.where(valid, np.log1p(values / 100), 0.0), starts, axis=0)) * 100
+        else:
+            raise ValueError(f"unknown aggregator '{how}' (use one of {', '.join(AGGREGATORS)})")
+    out[count == 0] = np.nan
+    return out, count
+
+
+def to_quarterly(data, how='last', min_coverage=0.0, holidays=None, step=None):
+    """Quarterly (PeriodIndex) frame from a DatetimeIndex-ed frame or series of any higher frequency.
+
+    how is one aggregator for every column or a {column: aggregator} dict (missing
+    columns use 'last'). The result covers every quarter from the first to the last
+    observation; quarters without enough observations are NaN.
+    """
+    is_series = isinstance(data, pd.Series)
+    frame = data.to_frame() if is_series else data
+    if len(frame) == 0: #no observations: no quarters
+        index = pd.PeriodIndex([], freq='Q', name=frame.index.name or 'Date')
+        result = pd.DataFrame(np.empty((0, frame.shape[1])), index=index, columns=frame.columns)
+        return result.iloc[:, 0] if is_series else result
+    dates = pd.DatetimeIndex(frame.index).to_numpy()
+    order, quarters, starts = _segments(dates)
+    values = frame.to_numpy(dtype=float)
+    if order is not None: #workbooks and downloads are often newest first
+        values, dates = values[order], dates[order]
+    step = step or infer_step(dates)
+    expected = expected_observations(quarters, step, holidays)
+
+    hows = how if isinstance(how, dict) else dict.fromkeys(frame.columns, how)
+    out = np.empty((len(starts), frame.shape[1]))
+    for agg in set(hows.get(col, 'last') for col in frame.columns): #one reduceat pass per aggregator
+        cols = [i for i, col in enumerate(frame.columns) if hows.get(col, 'last') == agg]
+        cols = slice(None) if len(cols) == frame.shape[1] else cols #no column copy for a single aggregator
+        result, count = aggregate(values[:, cols], starts, agg)
+        if agg == 'flow':
+            result = result * (expected[:, None] / count)
+        result[count < min_coverage * expected[:, None]] = np.nan
+        out[:, cols] = result
+
+    full = np.arange(quarters[0], quarters[-1] + 1) if len(quarters) else quarters
+    table = np.full((len(full), frame.shape[1]), np.nan)
+    table[quarters - quarters[0]] = out #quarters without any observation stay NaN
+    index = pd.PeriodIndex.from_ordinals(full, freq='Q').rename(frame.index.name or 'Date')
+    result = pd.DataFrame(table, index=index, columns=frame.columns)
+    return result.iloc[:, 0] if is_series else result
+
+
+def to_quarter_end(quarterly):
+    """Quarterly frame with quarter-end dates as index, as the raw CSV files in CSV Data have."""
+    quarterly = quarterly.copy(deep=False)
+    quarterly.index = quarterly.index.to_timestamp(how='end').normalize()
+    return quarterly
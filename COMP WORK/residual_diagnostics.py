@@ -0,0 +1,157 @@
+"""Whiteness diagnostics for the whole residual matrix of a VAR at once.
+
+- ACF of every column from one FFT of the (T, K) residuals (what statsmodels' acf
+  computes per column with fft=True)
+- PACF of every column by Durbin-Levinson on those autocovariances, all columns
+  advancing together; with the adjusted (n - k) autocovariances it solves the same
+  Yule-Walker systems as statsmodels' default pacf(method='ywadjusted')
+- lagged cross-correlation matrices of all pairs of residuals, from the same FFT
+- the multivariate portmanteau test (Hosking 1980) and its small-sample adjusted form
+  (Ljung-Box type) for every horizon h, as VARResults.test_whiteness computes them,
+  from one whitening of the cross-covariance matrices
+
+Tables are assembled column-wise from the (lag, variable) arrays.
+"""
+import numpy as np
+import pandas as pd
+from scipy import fft, stats
+
+
+def autocovariances(resid, nlags):
+    """Cross-covariance matrices C_h = sum_t u_t u_{t-h}' / T for h = 0..nlags, shape (nlags + 1, K, K).
+
+    The residuals are demeaned first. The diagonals are the autocovariances of each column.
+    """
+    u = np.asarray(resid, dtype=float)
+    u = u - u.mean(axis=0)
+    T = len(u)
+    n = fft.next_fast_len(2 * T - 1, real=True) #zero padding: circular products become linear ones
+    F = fft.rfft(u, n=n, axis=0)
+    cross = fft.irfft(F[:, :, None] * F[:, None, :].conj(), n=n, axis=0)
+    return cross[:nlags + 1] / T
+
+
+def acf_matrix(resid, nlags):
+    """Autocorrelations (nlags + 1, K) of every residual column, lag 0 included."""
+    u = np.asarray(resid, dtype=float)
+    u = u - u.mean(axis=0)
+    T = len(u)
+    n = fft.next_fast_len(2 * T - 1, real=True)
+    F = fft.rfft(u, n=n, axis=0)
+    acov = fft.irfft(F * F.conj(), n=n, axis=0)[:nlags + 1]
+    return acov / acov[0]
+
+
+def durbin_levinson(acov, nlags):
+    """Partial autocorrelations (nlags + 1, K) from autocovariances (>= nlags + 1, K) of K series."""
+    acov = np.asarray(acov, dtype=float)
+    K = acov.shape[1]
+    pacf = np.empty((nlags + 1, K))
+    pacf[0] = 1.0
+    phi = np.zeros((nlags, K)) #AR coefficients of the current order, per column
+    sigma = acov[0].copy()
+    for k in range(1, nlags + 1):
+        a = (acov[k] - (phi[:k - 1] * acov[k - 1:0:-1]).sum(axis=0)) / sigma
+        if k > 1:
+            phi[:k - 1] -= a * phi[k - 2::-1]
+        phi[k - 1] = a
+        sigma = sigma * (1 - a ** 2)
+        pacf[k] = a
+    return pacf
+
+
+def pacf_matrix(resid, nlags, method='yw'):
+    """Partial autocorrelations (nlags + 1, K) of every residual column.
+
+    method 'yw' uses the adjusted autocovariances (statsmodels' default 'ywadjusted'),
+    'ywm' the biased ones ('ywmle').
+    """
+    u = np.asarray(resid, dtype=float)
+    T = len(u)
+    acov = np.diagonal(autocovariances(u, nlags), axis1=1, axis2=2) * T
+    if method == 'yw':
+        acov = acov / (T - np.arange(nlags + 1))[:, None]
+    elif method != 'ywm':
+        raise ValueError(f"unknown method '{method}' (use 'yw' or 'ywm')")
+    return durbin_levinson(acov, nlags)
+
+
+def cross_correlations(resid, nlags):
+    """Cross-correlation matrices R_h = D^-1/2 C_h D^-1/2 for h = 0..nlags; R_h[i, j] = corr(u_i,t, u_j,t-h)."""
+    C = autocovariances(resid, nlags)
+    scale = 1 / np.sqrt(np.diagonal(C[0]))
+    return C * scale[:, None] * scale[None, :]
+
+
+def portmanteau(resid, max_horizon, k_ar=0, nobs=None):
+    """Hosking's portmanteau statistic Q_h and its adjusted form for h = 1..max_horizon.
+
+    Q_h = T sum_{i<=h} tr(C_i' C_0^-1 C_i C_0^-1); the adjusted statistic weights each
+    term by T^2 / (T - i). Degrees of freedom are K^2 (h - k_ar), so p-values are NaN for
+    h <= k_ar. Returns a data frame indexed by h.
+    """
+    u = np.asarray(resid, dtype=float)
+    T, K = u.shape
+    nobs = T if nobs is None else nobs
+    C = autocovariances(u, max_horizon)
+    L = np.linalg.cholesky(C[0])
+    W = np.linalg.solve(L, np.linalg.solve(L, C[1:]).swapaxes(-1, -2)) #L^-1 C_i' L^-T
+    terms = (W ** 2).sum(axis=(1, 2)) #tr(C_i' C_0^-1 C_i C_0^-1) = ||L^-1 C_i L^-T||_F^2
+    h = np.arange(1, max_horizon + 1)
+    q = nobs * np.cumsum(terms)
+    q_adj = nobs ** 2 * np.cumsum(terms / (nobs - h))
+    df = K ** 2 * (h - k_ar)
+    valid = df > 0
+    with np.errstate(invalid='ignore'):
+        p = np.where(valid, stats.chi2.sf(q, np.maximum(df, 1)), np.nan)
+        p_adj = np.where(valid, stats.chi2.sf(q_adj, np.maximum(df, 1)), np.nan)
+    return pd.DataFrame({'Statistic': q, 'p-value': p, 'Adjusted Statistic': q_adj, 'Adjusted p-value': p_adj,
+                         'df': df}, index=pd.Index(h, name='Horizon'))
+
+
+def acf_pacf_table(resid, nlags, lag_length, z=1.96):
+    """ACF and PACF of every residual column in long format (Variable, Lag Length, Lag, values and bands)."""
+    names = list(resid.columns)
+    T, K = resid.shape
+    acf = acf_matrix(resid, nlags)
+    pacf = pacf_matrix(resid, nlags)
+    band = z / np.sqrt(T)
+    n_rows = (nlags + 1) * K
+    return pd.DataFrame({
+        'Variable': np.repeat(names, nlags + 1),
+        'Lag Length': np.full(n_rows, lag_length),
+        'Lag': np.tile(np.arange(nlags + 1), K),
+        'ACF Value': acf.T.ravel(),
+        'ACF Conf Int Low': np.full(n_rows, -band),
+        'ACF Conf Int High': np.full(n_rows, band),
+        'PACF Value': pacf.T.ravel(),
+        'PACF Conf Int Low': np.full(n_rows, -band),
+        'PACF Conf Int High': np.full(n_rows, band),
+    })
+
+
+def cross_correlation_table(resid, nlags, lag_length):
+    """Lag 1..nlags cross-correlations of all residual pairs in long format."""
+    names = list(resid.columns)
+    K = len(names)
+    R = cross_correlations(resid, nlags)[1:]
+    n_rows = nlags * K * K
+    return pd.DataFrame({
+        'Lag Length': np.full(n_rows, lag_length),
+        'Lag': np.repeat(np.arange(1, nlags + 1), K * K),
+        'Variable': np.tile(np.repeat(names, K), nlags),
+        'Lagged Variable': np.tile(names, nlags * K),
+        'Correlation': R.ravel(),
+        'Significant': np.abs(R.ravel()) > 1.96 / np.sqrt(len(resid)),
+    })
+
+
+def whiteness_table(fitted_models, max_horizon, signif=0.05):
+    """Portmanteau tests of several fitted VARs, {lag length: fitted model}, for horizons k_ar+1..max_horizon."""
+    tables = []
+    for lag, model in fitted_models.items():
+        test = portmanteau(model.resid, max_horizon, k_ar=model.k_ar, nobs=model.nobs).loc[model.k_ar + 1:].reset_index()
+        test.insert(0, 'Lag Length', lag)
+        test['White'] = test['Adjusted p-value'] >= signif
+        tables.append(test)
+    return pd.concat(tables, ignore_index=True)
@@ -0,0 +1,151 @@
+"""Rolling and expanding-window VAR(p) estimation by recursive least squares.
+
+Instead of refitting VAR(data.iloc[start:end]).fit(lag) for every window, the estimates
+are carried from one window to the next with rank-one updates: when an observation
+enters the window, the inverse cross-product matrix P = (Z'Z)^-1, the coefficients and
+the residual cross-products u'u are updated with the Sherman-Morrison formula, and when
+one leaves (rolling windows) they are downdated the same way. Each step costs O(k^2) for
+k regressors per equation, so a full sweep is O(T) small updates. Every refactor_every
+windows P and the estimates are recomputed from a QR of the window, which bounds the
+rounding error that downdating accumulates.
+
+A window covers `window` rows of the data, the first `lag` of them being presample
+values, exactly like fitting statsmodels' VAR on data.iloc[start:end]. (With trend='ct'
+the time trend counts from the start of the whole sample, so the constant differs from
+a refit on the window while every other coefficient is the same.)
+"""
+import numpy as np
+import pandas as pd
+
+from lag_sweep import TREND_ORDERS, build_lag_design
+from tracing import count
+
+
+def _exact_fit(Z, Y):
+    #P, params and u'u of one window from a QR of its design
+    q, r = np.linalg.qr(Z)
+    params = np.linalg.solve(r, q.T @ Y)
+    resid = Y - Z @ params
+    r_inv = np.linalg.solve(r, np.eye(r.shape[0]))
+    return r_inv @ r_inv.T, params, resid.T @ resid
+
+
+def param_names(names, lag, trend='c'):
+    """Row labels of statsmodels' VARResults.params for these variables, lag and trend."""
+    labels = ['const', 'trend', 'trend**2'][:TREND_ORDERS[trend]]
+    return labels + [f'L{i}.{name}' for i in range(1, lag + 1) for name in names]
+
+
+class RollingVARResult:
+    """Coefficient, sigma_u and information criterion paths of a rolling or expanding VAR.
+
+    params has shape (n_windows, k_trend + K*lag, K) with the layout of statsmodels'
+    params for every window, sigma_u (n_windows, K, K) is the degrees-of-freedom adjusted
+    residual covariance, and info_criteria holds AIC/BIC/HQIC/FPE as statsmodels computes
+    them. Windows are labelled by the last row of data they contain.
+    """
+
+    def __init__(self, names, lag, trend, starts, ends, nobs, params, ssr):
+        K = len(names)
+        self.names = list(names)
+        self.lag = lag
+        self.trend = trend
+        self.starts = starts
+        self.ends = ends
+        self.nobs = nobs
+        self.params = params
+        self.sigma_u = ssr / (nobs - params.shape[1])[:, None, None]
+        self.info_criteria = self._info_criteria(ssr / nobs[:, None, None], K)
+
+    def _info_criteria(self, sigma_mle, K):
+        nobs = self.nobs.astype(float)
+        df_model = self.params.shape[1]
+        free_params = self.lag * K ** 2 + K * TREND_ORDERS[self.trend]
+        _, logdet = np.linalg.slogdet(sigma_mle)
+        return pd.DataFrame({
+            'AIC': logdet + (2.0 / nobs) * free_params,
+            'BIC': logdet + (np.log(nobs) / nobs) * free_params,
+            'HQIC': logdet + (2.0 * np.log(np.log(nobs)) / nobs) * free_params,
+            'FPE': ((nobs + df_model) / (nobs - df_model)) ** K * np.exp(logdet),
+            'Nobs': self.nobs,
+        }, index=self.ends)
+
+    @property
+    def coefs(self):
+        """Lag coefficient matrices A_1..A_p of every window, shape (n_windows, lag, K, K)."""
+        K = len(self.names)
+        lagged = self.params[:, TREND_ORDERS[self.trend]:].reshape(len(self.params), self.lag, K, K)
+        return lagged.swapaxes(-1, -2)
+
+    def params_frame(self, i=-1):
+        """params of window i as a data frame laid out like VARResults.params."""
+        return pd.DataFrame(self.params[i], index=param_names(self.names, self.lag, self.trend), columns=self.names)
+
+    def coef_path(self, regressor, equation):
+        """One coefficient over all windows, e.g. coef_path('L1.US CPI SA', 'US DXY SA')."""
+        row = param_names(self.names, self.lag, self.trend).index(regressor)
+        return pd.Series(self.params[:, row, self.names.index(equation)], index=self.ends, name=f'{regressor} -> {equation}')
+
+
+def rolling_var(data, lag, window=None, trend='c', min_nobs=None, refactor_every=50):
+    """VAR(lag) estimates for every rolling window of `window` rows, or expanding windows if window is None.
+
+    Expanding windows start at the first one with min_nobs regression observations
+    (default: k regressors + K, the least that leaves a few residual degrees of freedom).
+    """
+    values = np.asarray(data, dtype=float)
+    n_rows, K = values.shape
+    names = list(data.columns) if isinstance(data, pd.DataFrame) else [f'y{i + 1}' for i in range(K)]
+    labels = data.index if isinstance(data, pd.DataFrame) else pd.RangeIndex(n_rows)
+    Z, Y = build_lag_design(values, lag, trend) #regression row t uses data rows t..t+lag
+    T, k = Z.shape
+    if window is None:
+        first = k + K if min_nobs is None else min_nobs
+    else:
+        first = window - lag
+    if first <= k or first > T:
+        raise ValueError(f"a window needs more than {k} and at most {T} regression observations, got {first}")
+
+    n_windows = T - first + 1
+    params = np.empty((n_windows, k, K))
+    ssr = np.empty((n_windows, K, K))
+    nobs = np.empty(n_windows, dtype=np.int64)
+    row_starts = np.zeros(n_windows, dtype=np.int64)
+
+    start = 0
+    P, B, S = _exact_fit(Z[:first], Y[:first])
+    for w in range(n_windows):
+        end = first + w #window covers regression rows start..end-1
+        if w:
+            z, y = Z[end - 1], Y[end - 1] #observation entering the window
+            Pz = P @ z
+            denom = 1.0 + z @ Pz
+            e = y - z @ B
+            B = B + np.outer(Pz, e / denom)
+            P = P - np.outer(Pz, Pz / denom)
+            S = S + np.outer(e, e / denom)
+            if window is not None: #rolling: the oldest observation leaves
+                z, y = Z[start], Y[start]
+                Pz = P @ z
+                denom = 1.0 - z @ Pz
+                e = y - z @ B
+                B = B - np.outer(Pz, e / denom)
+                P = P + np.outer(Pz, Pz / denom)
+                S = S - np.outer(e, e / denom)
+                start += 1
+            if refactor_every and w % refactor_every == 0:
+                P, B, S = _exact_fit(Z[start:end], Y[start:end])
+        params[w] = B
+        ssr[w] = S
+        nobs[w] = end - start
+        row_starts[w] = start
+
+    count('fits', n_windows) #one (updated) least-squares fit per window
+    starts = labels[row_starts] #first data row of each window (presample included)
+    ends = labels[np.arange(first, T + 1) + lag - 1] #last data row of each window
+    return RollingVARResult(names, lag, trend, starts, ends, nobs, params, ssr)
+
+
+def rolling_var_sweep(data, lags=(5, 6, 7, 8), window=None, trend='c', **kwargs):
+    """rolling_var() for several lag lengths, as {lag: RollingVARResult}."""
+    return {lag: rolling_var(data, lag, window, trend, **kwargs) for lag in lags}
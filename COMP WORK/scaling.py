@@ -0,0 +1,171 @@
+"""Standardization of a panel that keeps its parameters, and the inverse transforms of VAR outputs.
+
+The mean and s.d. of every column come from one pass over chunks of rows: each chunk's
+(count, mean, sum of squared deviations) is merged into the running totals with the
+Welford/Chan update, so the memory-mapped input is never copied whole and missing values
+are skipped per column. The scale is the population s.d. (ddof=0) as in sklearn's
+StandardScaler, and a constant column gets scale 1. The parameters are stored as their
+own artifact (one row per variable, with the hash of the data they were computed from)
+next to the standardized data, so results can be mapped back to the input's units
+without rerunning anything upstream:
+
+- data, forecasts and forecast bands: x = mean + scale * z
+- IRFs to a unit shock, their bands and cumulative effects: the response of i to j
+  scales by scale_i / scale_j
+- orthogonalized IRFs: by scale_i, since chol(D Sigma D) = D chol(Sigma) for the
+  diagonal D of the scales, so the one-s.d. structural shocks are the same in both units
+- FEVD: unchanged, the shares of every shock scale by the same scale_i ** 2
+- historical decomposition: contributions by scale_i, the mean added to the baseline
+"""
+import numpy as np
+import pandas as pd
+
+from artifact_store import STORE_DIR, load_frame, read_meta, save_frame
+
+PARAMS_NAME = 'Standardization_Parameters' #artifact with the mean and scale of every standardized variable
+CHUNK_ROWS = 65536 #rows per chunk of the streaming pass
+
+
+def iter_chunks(values, chunk_rows=CHUNK_ROWS):
+    """Consecutive row blocks (views, no copies) of a 2-d array."""
+    for start in range(0, len(values), chunk_rows):
+        yield values[start:start + chunk_rows]
+
+
+class Standardizer:
+    """Running per-column count, mean and sum of squared deviations, and the transforms they define."""
+
+    def __init__(self, columns, count=None, mean=None, m2=None, source=None):
+        self.columns = pd.Index(columns)
+        K = len(self.columns)
+        self.count = np.zeros(K) if count is None else np.asarray(count, dtype=float)
+        self.mean = np.zeros(K) if mean is None else np.asarray(mean, dtype=float)
+        self.m2 = np.zeros(K) if m2 is None else np.asarray(m2, dtype=float)
+        self.source = source #sha256 of the artifact the parameters were computed from
+
+    def partial_fit(self, chunk):
+        """Merge one (rows, K) block into the running statistics; NaNs are left out per column."""
+        x = np.asarray(chunk, dtype=float).reshape(-1, len(self.columns))
+        n = np.isfinite(x).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.nansum(x, axis=0) / n
+            m2 = np.nansum((x - mean) ** 2, axis=0)
+        total = self.count + n
+        seen = n > 0
+        weight = np.divide(n, total, out=np.zeros_like(total), where=seen)
+        delta = np.where(seen, mean - self.mean, 0.0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + np.where(seen, m2, 0.0) + delta ** 2 * self.count * weight
+        self.count = total
+        return self
+
+    def fit_chunks(self, chunks):
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    @property
+    def var(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.m2 / self.count, np.nan)
+
+    @property
+    def scale(self):
+        sd = np.sqrt(self.var)
+        return np.where((sd > 0) & np.isfinite(sd), sd, 1.0)
+
+    def _align(self, columns):
+        #positions of `columns` in the fitted columns
+        positions = self.columns.get_indexer(columns)
+        if (positions < 0).any():
+            raise KeyError(f"no standardization parameters for {list(pd.Index(columns)[positions < 0])}")
+        return positions
+
+    def transform(self, data):
+        """(data - mean) / scale; a data frame is matched on its column names."""
+        if isinstance(data, pd.DataFrame):
+            pos = self._align(data.columns)
+            return pd.DataFrame((data.to_numpy(dtype=float) - self.mean[pos]) / self.scale[pos],
+                                index=data.index, columns=data.columns)
+        return (np.asarray(data, dtype=float) - self.mean) / self.scale
+
+    def inverse_transform(self, data, center=True):
+        """mean + scale * z for data, forecasts or bands (..., K); center=False only rescales (s.d.s, effects)."""
+        if isinstance(data, pd.DataFrame):
+            pos = self._align(data.columns)
+            values = data.to_numpy(dtype=float) * self.scale[pos] + (self.mean[pos] if center else 0.0)
+            return pd.DataFrame(values, index=data.index, columns=data.columns)
+        return np.asarray(data, dtype=float) * self.scale + (self.mean if center else 0.0)
+
+    def unscale_irfs(self, irfs, orth=False):
+        """IRFs (..., K, K) [response, shock] in the original units; orthogonalized ones only scale by the response."""
+        scale = self.scale
+        factor = scale[:, None] if orth else scale[:, None] / scale[None, :]
+        return np.asarray(irfs, dtype=float) * factor
+
+    def unscale_table(self, table):
+        """A long IRF, FEVD or historical decomposition table (irf_export/fevd layouts) in the original units.
+
+        'Orth ...' columns scale by the response, 'Contribution' by the response with the
+        mean added to the Baseline rows, a FEVD table (one with a 'FEVD' column) is unchanged,
+        bands included, and every other float column (IRFs and their bands) scales by response / shock.
+        """
+        responses, shocks = table['Response Variable'].cat, table['Shock Variable'].cat
+        response = self._align(responses.categories)[responses.codes]
+        shock = self.columns.get_indexer(shocks.categories)[shocks.codes] #-1 for the historical decomposition's baseline
+        scale = self.scale
+        out = table.copy()
+        if 'FEVD' in table.columns: #shares and their bands are unit-free
+            return out
+        for col in table.columns:
+            if table[col].dtype != np.float64 or col == 'Period':
+                continue
+            values = table[col].to_numpy()
+            if col == 'Contribution':
+                out[col] = values * scale[response] + np.where(shock < 0, self.mean[response], 0.0)
+            elif col.startswith('Orth'):
+                out[col] = values * scale[response]
+            else:
+                out[col] = values * scale[response] / scale[shock]
+        return out
+
+    def to_frame(self):
+        return pd.DataFrame({'Mean': self.mean, 'Scale': self.scale, 'Variance': self.var, 'Count': self.count.astype(np.int64),
+                             'Source': self.source or ''}, index=pd.Index(self.columns, name='Variable'))
+
+    @classmethod
+    def from_frame(cls, frame):
+        count = frame['Count'].to_numpy(dtype=float)
+        return cls(frame.index, count, frame['Mean'].to_numpy(dtype=float),
+                   np.nan_to_num(frame['Variance'].to_numpy(dtype=float)) * count, str(frame['Source'].iloc[0]) or None)
+
+    def save(self, name=PARAMS_NAME, csv_path=None, store_dir=STORE_DIR):
+        return save_frame(self.to_frame(), name, csv_path=csv_path, store_dir=store_dir)
+
+    @classmethod
+    def load(cls, name=PARAMS_NAME, store_dir=STORE_DIR):
+        return cls.from_frame(load_frame(name, store_dir=store_dir, mmap=False))
+
+    def is_current(self, source_name, store_dir=STORE_DIR):
+        """True if the parameters were computed from the stored version of artifact source_name."""
+        return self.source is not None and self.source == read_meta(source_name, store_dir)['sha256']
+
+
+def standardize_artifact(source, target, params_name=PARAMS_NAME, source_csv=None, target_csv=None, params_csv=None,
+                         store_dir=STORE_DIR, chunk_rows=CHUNK_ROWS):
+    """Standardize artifact `source` into artifact `target` and store the parameters as params_name.
+
+    One streaming pass over the memory-mapped source gives the statistics, a second one
+    writes the standardized rows into the output array; returns (standardized frame, Standardizer).
+    """
+    data = load_frame(source, csv_path=source_csv, store_dir=store_dir)
+    values = data.to_numpy(dtype=float) #the mapped block itself for an all-float artifact
+    scaler = Standardizer(data.columns, source=read_meta(source, store_dir)['sha256'])
+    scaler.fit_chunks(iter_chunks(values, chunk_rows))
+    out = np.empty(values.shape, order='F')
+    for start in range(0, len(values), chunk_rows):
+        out[start:start + chunk_rows] = scaler.transform(values[start:start + chunk_rows])
+    standardized = pd.DataFrame(out, index=data.index, columns=data.columns, copy=False)
+    save_frame(standardized, target, csv_path=target_csv, store_dir=store_dir)
+    scaler.save(params_name, csv_path=params_csv, store_dir=store_dir)
+    return standardized, scaler
@@ -0,0 +1,192 @@
+"""Monte Carlo forecasts of a fitted VAR under user-defined shock paths.
+
+A scenario adds a path of shocks to the innovations of the first forecast quarters, e.g.
+{'US DXY SA': [-1.0] * 8} for a sustained dollar decline. Shocks are in units of one s.d.
+of the orthogonalized (Cholesky) shock when orth=True and reduced-form innovations
+otherwise, as in var_server's /scenario. On top of the shocks every path gets random
+innovations, drawn from N(0, sigma_u) ('gaussian') or resampled from the centered
+residuals ('empirical', which keeps their fat tails and co-movement).
+
+The VAR is linear, so a path is the point forecast (deterministic terms included, from
+fitted_model.forecast), plus the response to the scenario's shocks, plus the deviation
+d_h = u_h + sum_l A_l d_{h-l} driven by the random innovations from a zero start:
+
+- the deviations of all paths of a chunk advance together, one (paths, K) x (K, K)
+  product per lag and quarter; chunks of chunk_size paths bound the float64 workspace,
+  run across a process pool, and each gets its own child of one SeedSequence, so the
+  results only depend on the seed and chunk size
+- only the float32 deviations are kept, once for all scenarios: every scenario sees the
+  same innovations (common random numbers), so the differences between scenarios are
+  free of simulation noise, and the quantiles of a scenario are the quantiles of the
+  deviations shifted by its mean path
+- tail probabilities are counted per scenario, both at a horizon and at any quarter up
+  to it; the latter depends on the whole path, which the IRFs alone cannot give
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from tracing import count, span
+
+BASELINE = 'Baseline' #scenario without shocks
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95) #fan chart bands
+
+
+def deviation_paths(coefs, u):
+    """Paths (..., H, K) of d_h = u_h + sum_l A_l d_{h-l} from d = 0, for innovations u (..., H, K) and coefs (p, K, K)."""
+    p = coefs.shape[0]
+    H = u.shape[-2]
+    d = np.zeros(u.shape[:-2] + (H + p,) + u.shape[-1:])
+    for h in range(H): #the recursion runs over the horizon; all paths advance together
+        d_h = d[..., p + h, :]
+        d_h += u[..., h, :]
+        for i in range(1, p + 1):
+            d_h += d[..., p + h - i, :] @ coefs[i - 1].T
+    return d[..., p:, :]
+
+
+def scenario_innovations(names, shocks, steps, impact=None):
+    """(steps, K) innovations of a scenario {variable: shock path}; impact maps the shocks to innovations (e.g. chol(sigma_u))."""
+    names = list(names)
+    E = np.zeros((steps, len(names)))
+    for name, path in shocks.items():
+        if name not in names:
+            raise ValueError(f"unknown variable '{name}' (variables: {', '.join(names)})")
+        path = np.atleast_1d(np.asarray(path, dtype=float))
+        if len(path) > steps:
+            raise ValueError(f"shock path of '{name}' is longer than steps={steps}")
+        E[:len(path), names.index(name)] = path
+    return E if impact is None else E @ np.asarray(impact).T
+
+
+def _simulate_chunk(coefs, draw, method, seed, n_paths, steps):
+    #random deviations of one chunk of paths, kept as float32
+    rng = np.random.default_rng(seed)
+    K = coefs.shape[-1]
+    if method == 'gaussian':
+        u = rng.standard_normal((n_paths, steps, K)) @ draw.T #draw = chol(sigma_u)
+    else:
+        u = draw[rng.integers(0, len(draw), size=(n_paths, steps))] #draw = centered residuals
+    return deviation_paths(coefs, u).astype(np.float32)
+
+
+class ScenarioSimulation:
+    """Simulated paths of one fitted VAR: the common random deviations plus one mean path per scenario."""
+
+    def __init__(self, names, labels, point, effects, deviations, method):
+        self.names = list(names)
+        self.labels = list(labels) #the forecast quarters
+        self.point = point #(steps, K) point forecast without shocks
+        self.effects = effects #{scenario: (steps, K) response to its shocks}
+        self.deviations = deviations #(n_paths, steps, K) float32
+        self.method = method
+
+    @property
+    def n_paths(self):
+        return len(self.deviations)
+
+    def mean_path(self, scenario):
+        return self.point + self.effects[scenario]
+
+    def paths(self, scenario):
+        """All simulated paths (n_paths, steps, K) of one scenario."""
+        return self.deviations + self.mean_path(scenario).astype(np.float32)
+
+    def fan_table(self, quantiles=QUANTILES, scaler=None):
+        """Quantiles of every variable at every horizon, one row per (scenario, variable, horizon).
+
+        scaler (a scaling.Standardizer) maps the values to the units of the data before standardization.
+        """
+        qs = np.quantile(self.deviations, quantiles, axis=0) #(n_q, steps, K), shifted per scenario below
+        mean = self.deviations.mean(axis=0, dtype=np.float64)
+        steps, K = self.point.shape
+        scenarios = list(self.effects)
+        blocks = {f'P{100 * q:g}': np.stack([qs[i] + self.mean_path(s) for s in scenarios]) for i, q in enumerate(quantiles)}
+        blocks['Mean'] = np.stack([mean + self.mean_path(s) for s in scenarios])
+        blocks['Point Forecast'] = np.stack([self.mean_path(s) for s in scenarios])
+        if scaler is not None: #x = mean + scale * z is increasing, so quantiles map to quantiles
+            pos = scaler._align(self.names)
+            blocks = {col: values * scaler.scale[pos] + scaler.mean[pos] for col, values in blocks.items()}
+        n = len(scenarios) * K * steps
+        table = {
+            'Scenario': pd.Categorical.from_codes(np.repeat(np.arange(len(scenarios)), K * steps), categories=scenarios),
+            'Variable': pd.Categorical.from_codes(np.tile(np.repeat(np.arange(K), steps), len(scenarios)), categories=self.names),
+            'Horizon': np.tile(np.arange(1, steps + 1), len(scenarios) * K),
+            'Period': pd.Categorical.from_codes(np.tile(np.arange(steps), len(scenarios) * K), categories=self.labels),
+        }
+        table.update({col: values.transpose(0, 2, 1).reshape(n) for col, values in blocks.items()}) #(scenario, variable, horizon) order
+        table['Paths'] = self.n_paths
+        return pd.DataFrame(table)
+
+    def tail_table(self, thresholds=(-2.0, -1.0, 1.0, 2.0), horizons=(4, 8, 12, 20)):
+        """Probabilities that each variable is at or beyond each threshold (<= for negative, >= otherwise).
+
+        'P(At Horizon)' looks at the quarter itself, 'P(By Horizon)' at any quarter up to it.
+        Thresholds are in the model's units (s.d.s of the standardized data).
+        """
+        steps, K = self.point.shape
+        horizons = [h for h in horizons if h <= steps]
+        rows = []
+        for scenario in self.effects:
+            paths = self.paths(scenario)
+            for t in thresholds:
+                hit = paths <= t if t < 0 else paths >= t #(n_paths, steps, K)
+                at = hit.mean(axis=0)
+                by = np.logical_or.accumulate(hit, axis=1).mean(axis=0)
+                for j, name in enumerate(self.names):
+                    for h in horizons:
+                        rows.append((scenario, name, h, self.labels[h - 1], t, at[h - 1, j], by[h - 1, j]))
+        table = pd.DataFrame(rows, columns=['Scenario', 'Variable', 'Horizon', 'Period', 'Threshold', 'P(At Horizon)', 'P(By Horizon)'])
+        for col in ('Scenario', 'Variable'):
+            table[col] = pd.Categorical(table[col], categories=list(dict.fromkeys(table[col])))
+        table['Paths'] = self.n_paths
+        return table
+
+
+def forecast_labels(index, steps):
+    """Labels of the `steps` quarters after the sample (1, 2, ... when the index has no dates)."""
+    if isinstance(index, pd.PeriodIndex):
+        return [str(index[-1] + h) for h in range(1, steps + 1)]
+    return [str(h) for h in range(1, steps + 1)]
+
+
+def simulate_scenarios(fitted_model, scenarios, steps=20, n_paths=100_000, method='empirical', orth=True, seed=0,
+                       n_jobs=None, chunk_size=25_000):
+    """ScenarioSimulation of a fitted statsmodels VAR under {name: {variable: shock path}} scenarios.
+
+    A 'Baseline' scenario without shocks is added unless one is given. n_jobs=1 runs in this
+    process; otherwise chunks of chunk_size paths run over a process pool (n_jobs=None uses every core).
+    """
+    if method not in ('gaussian', 'empirical'):
+        raise ValueError(f"unknown innovation method '{method}' (use 'gaussian' or 'empirical')")
+    names = list(fitted_model.names)
+    lag = fitted_model.k_ar
+    coefs = np.asarray(fitted_model.coefs, dtype=float)
+    sigma_u = np.asarray(fitted_model.sigma_u, dtype=float)
+    resid = np.asarray(fitted_model.resid, dtype=float)
+    y = np.asarray(fitted_model.endog, dtype=float)
+    point = fitted_model.forecast(y[-lag:], steps)
+
+    impact = np.linalg.cholesky(sigma_u) if orth else None
+    scenarios = {BASELINE: {}, **scenarios}
+    shifts = np.stack([scenario_innovations(names, shocks, steps, impact) for shocks in scenarios.values()])
+    effects = dict(zip(scenarios, deviation_paths(coefs, shifts))) #responses to the shocks, exact
+
+    draw = np.linalg.cholesky(sigma_u) if method == 'gaussian' else resid - resid.mean(axis=0)
+    sizes = [chunk_size] * (n_paths // chunk_size) + ([n_paths % chunk_size] if n_paths % chunk_size else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes)) #independent, deterministic stream per chunk
+    args = [(coefs, draw, method, s, n, steps) for s, n in zip(seeds, sizes)]
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(sizes))
+    with span('scenario simulation', paths=n_paths, steps=steps, scenarios=len(scenarios)):
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                chunks = list(pool.map(_simulate_chunk, *zip(*args)))
+        else:
+            chunks = [_simulate_chunk(*a) for a in args]
+        count('simulated paths', n_paths)
+    deviations = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+    index = getattr(fitted_model.model.data, 'row_labels', None)
+    labels = forecast_labels(pd.RangeIndex(len(y)) if index is None else index, steps)
+    return ScenarioSimulation(names, labels, point, effects, deviations, method)
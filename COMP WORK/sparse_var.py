@@ -0,0 +1,346 @@
+"""Lasso, elastic-net and group-lasso VAR(p) estimation for panels with many series.
+
+With K series and p lags an unrestricted VAR has K^2 p slope coefficients, more than
+the ~110 quarters of data once K grows past a handful. Here every equation is fitted by
+penalized least squares on the shared lag design:
+
+    (1 / 2T) ||y_i - Z b_i||^2 + lam * (a ||b_i||_1 + (1 - a) / 2 ||b_i||^2)      lasso / elastic net
+    (1 / 2T) ||y_i - Z b_i||^2 + lam * sqrt(p) * sum_j ||b_ij||_2                  group lasso
+
+where b_ij are the p lags of variable j in equation i, so whole variables drop out of an
+equation (no Granger causality). Deterministic terms are partialled out and never
+penalized, and the lag columns are scaled to unit variance.
+
+The fit is cyclic coordinate descent on the (T, K) residual matrix: all K equations
+share one design, so each step updates one regressor (or one group of p regressors) in
+every equation at once, with a BLAS rank-one update of the residuals. Solutions are
+computed along a decreasing penalty path, each warm-started from the previous one;
+sweeps visit only the active regressors until they converge, and one vectorized check
+of the optimality conditions then decides whether any other regressor enters. Memory
+is O(Tk + kK) for k regressors per equation (no k x k Gram matrix), and the path of
+coefficients is only kept when asked for.
+
+The penalty is chosen by rolling-origin cross-validation (train on the observations
+before each validation block, score one-step-ahead errors), with the folds spread
+over a process pool. fit_sparse_var() returns a statsmodels VARResults built with
+var_cache.results_from_params, so irf(), fevd() and forecast() work as for VAR().fit();
+the OLS-based standard errors of those results do not apply to penalized estimates.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.linalg.blas import dger, dgemv
+
+from lag_sweep import TREND_ORDERS, build_lag_design
+from tracing import count, span
+from var_cache import results_from_params
+
+PENALTIES = ('lasso', 'elastic-net', 'group')
+
+
+class StandardizedDesign:
+    """Lag design with the trend terms partialled out and the lag columns scaled to unit variance."""
+
+    def __init__(self, Z, Y, k_trend):
+        self.k_trend = k_trend
+        self.D = Z[:, :k_trend]
+        X, Y = Z[:, k_trend:], np.asarray(Y, dtype=float)
+        if k_trend:
+            q, _ = np.linalg.qr(self.D)
+            X = X - q @ (q.T @ X)
+            Y = Y - q @ (q.T @ Y)
+        self.scale = np.sqrt((X ** 2).mean(axis=0))
+        self.scale[self.scale == 0] = 1.0
+        self.X = X / self.scale
+        self.Y = Y
+        self.xy = self.X.T @ Y / len(Y)
+        self.null_dev = np.maximum((Y ** 2).mean(axis=0), 1e-300) #per-equation scale of the convergence check
+
+    def unscale(self, B, Z, Y):
+        """Coefficients (k_trend + k, K) on the original design from standardized slopes B (k, K)."""
+        slopes = B / self.scale[:, None]
+        if not self.k_trend:
+            return slopes
+        trend = np.linalg.lstsq(self.D, Y - Z[:, self.k_trend:] @ slopes, rcond=None)[0]
+        return np.vstack([trend, slopes])
+
+
+def lag_groups(K, lag):
+    """Column indices (in the slope block of the design) of each variable's p lags."""
+    return [np.arange(j, K * lag, K) for j in range(K)]
+
+
+def lambda_max(design, penalty='lasso', l1_ratio=1.0, groups=None):
+    """Smallest penalty at which every slope coefficient is zero."""
+    xy = np.abs(design.xy)
+    if penalty == 'group':
+        return max(np.sqrt((design.xy[g] ** 2).sum(axis=0)).max() / np.sqrt(len(g)) for g in groups) / max(l1_ratio, 1e-3)
+    return xy.max() / max(l1_ratio, 1e-3)
+
+
+def lambda_grid(lam_max, n_lambdas=50, eps=1e-3):
+    """Geometric grid of n_lambdas penalties from lam_max down to eps * lam_max."""
+    return lam_max * np.logspace(0, np.log10(eps), n_lambdas)
+
+
+def default_eps(T, k):
+    #glmnet's lambda.min.ratio, stopping earlier while there are fewer than two observations per regressor:
+    #near that point the unpenalized fit is (nearly) singular and the small penalties only chase noise
+    return 1e-2 if T < 2 * k else 1e-4
+
+
+def _unit_sweeps(X_A, E, B_A, units, steps, weights, ridge, thresh, max_sweeps):
+    #cyclic proximal updates over the active units (single regressors or groups), every equation at once,
+    #on the residuals E = Y - X B (Fortran order, updated in place by BLAS rank-one updates). Returns the no. of sweeps.
+    T = len(E)
+    single = all(len(u) == 1 for u in units)
+    cols = [int(u[0]) for u in units] if single else units
+    scales = (1.0 / (T * steps)).tolist()
+    cuts = (weights / steps).tolist()
+    shrink = (1.0 / (1 + ridge / steps)).tolist()
+    steps = steps.tolist()
+    for sweep in range(1, max_sweeps + 1):
+        worst = 0.0
+        for u, j in enumerate(cols):
+            old = B_A[j]
+            if single: #soft thresholding, the lasso / elastic-net coordinate update
+                v = old + dgemv(scales[u], E, X_A[:, j], trans=1)
+                new = v - np.maximum(np.minimum(v, cuts[u]), -cuts[u])
+            else: #group soft thresholding of each equation's block
+                v = old + X_A[:, j].T @ E * scales[u]
+                norms = np.sqrt((v ** 2).sum(axis=0))
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    new = v * np.where(norms > 0, np.maximum(1 - cuts[u] / norms, 0.0), 0.0)
+            if ridge:
+                new *= shrink[u]
+            delta = new - old
+            moved = float(np.vdot(delta, delta))
+            if moved:
+                B_A[j] = new
+                if single:
+                    E = dger(-1.0, X_A[:, j], delta, a=E, overwrite_a=1)
+                else:
+                    E -= X_A[:, j] @ delta
+                worst = max(worst, steps[u] * moved)
+        if worst < thresh:
+            return sweep
+    return max_sweeps
+
+
+def coordinate_descent(design, lam, B=None, penalty='lasso', l1_ratio=1.0, groups=None, tol=1e-7, max_sweeps=100000):
+    """Standardized slopes (k, K) at penalty lam, warm-started from B. Returns (B, no. of sweeps).
+
+    Converged when no update moves a coefficient row by more than sqrt(tol) of the smallest
+    equation s.d. (glmnet's criterion) and no inactive regressor violates the optimality conditions.
+    """
+    X, Y = design.X, design.Y
+    T, k = X.shape
+    K = Y.shape[1]
+    units = [np.asarray(g) for g in groups] if penalty == 'group' else [np.array([j]) for j in range(k)]
+    unit_of = np.empty(k, dtype=np.int64)
+    for u, idx in enumerate(units):
+        unit_of[idx] = u
+    weights = lam * l1_ratio * np.sqrt(np.bincount(unit_of, minlength=len(units))) #penalty threshold of each unit
+    if penalty == 'group': #Lipschitz constant of each block of the least squares loss
+        steps = np.array([np.linalg.eigvalsh(X[:, g].T @ X[:, g] / T)[-1] for g in units])
+    else:
+        steps = (X ** 2).mean(axis=0)
+    steps[steps == 0] = 1.0 #constant columns never enter
+    ridge = lam * (1 - l1_ratio)
+    thresh = tol * design.null_dev.min() #one bound for all equations, the strictest
+    B = np.zeros((k, K)) if B is None else B.copy()
+
+    sweeps, solved = 0, False
+    while sweeps < max_sweeps:
+        E = np.asfortranarray(Y - X @ B)
+        R = X.T @ E / T #gradient of the loss at B
+        norms = np.zeros((len(units), K))
+        np.add.at(norms, unit_of, R ** 2)
+        nonzero = np.zeros(len(units), dtype=bool)
+        np.logical_or.at(nonzero, unit_of, B.any(axis=1))
+        entering = ~nonzero & (np.sqrt(norms) > weights[:, None] * (1 + 1e-12)).any(axis=1) #optimality violated at zero
+        if solved and not entering.any():
+            break
+        active = np.flatnonzero(nonzero | entering)
+        if not len(active):
+            break
+        rows = np.concatenate([units[u] for u in active])
+        offsets = np.cumsum([0] + [len(units[u]) for u in active])
+        local = [np.arange(offsets[i], offsets[i + 1]) for i in range(len(active))]
+        B_A = B[rows]
+        sweeps += _unit_sweeps(np.asfortranarray(X[:, rows]), E, B_A, local, steps[active], weights[active], ridge,
+                               thresh, max_sweeps - sweeps)
+        B[rows] = B_A
+        solved = True
+    return B, sweeps
+
+
+def penalty_path(design, lambdas, penalty='lasso', l1_ratio=1.0, groups=None, tol=1e-7, keep=False):
+    """Warm-started solutions along a decreasing penalty grid.
+
+    Yields (lam, standardized slopes) for every penalty; with keep=False the slopes array
+    is reused, so copy it to keep it.
+    """
+    B = None
+    for lam in lambdas:
+        B, _ = coordinate_descent(design, lam, B, penalty, l1_ratio, groups, tol)
+        yield lam, (B.copy() if keep else B)
+
+
+def _check_penalty(penalty, l1_ratio):
+    if penalty not in PENALTIES:
+        raise ValueError(f"unknown penalty '{penalty}' (use one of {', '.join(PENALTIES)})")
+    if penalty == 'lasso':
+        return 1.0
+    if not 0 < l1_ratio <= 1:
+        raise ValueError(f"l1_ratio must be in (0, 1], got {l1_ratio}")
+    return l1_ratio
+
+
+def _fold_errors(Z, Y, k_trend, K, lag, train_end, test_end, lambdas, penalty, l1_ratio, tol):
+    #validation MSE of one rolling-origin fold for every penalty on the grid
+    design = StandardizedDesign(Z[:train_end], Y[:train_end], k_trend)
+    groups = lag_groups(K, lag) if penalty == 'group' else None
+    Z_test, Y_test = Z[train_end:test_end], Y[train_end:test_end]
+    errors = np.empty(len(lambdas))
+    for i, (lam, B) in enumerate(penalty_path(design, lambdas, penalty, l1_ratio, groups, tol)):
+        params = design.unscale(B, Z[:train_end], Y[:train_end])
+        errors[i] = ((Y_test - Z_test @ params) ** 2).mean()
+    return errors
+
+
+def cross_validate(data, lag, penalty='lasso', l1_ratio=1.0, trend='c', lambdas=None, n_lambdas=50, eps=None,
+                   n_folds=5, min_train=0.5, tol=1e-7, n_jobs=None):
+    """Rolling-origin cross-validation of the penalty: data frame of the mean and s.e. of the one-step MSE per lambda.
+
+    The last (1 - min_train) share of the sample is cut into n_folds blocks; each block
+    is predicted one step ahead by the model fitted on all observations before it.
+    n_jobs=None runs the folds over every core, n_jobs=1 runs them here.
+    """
+    l1_ratio = _check_penalty(penalty, l1_ratio)
+    values = np.asarray(data, dtype=float)
+    K = values.shape[1]
+    k_trend = TREND_ORDERS[trend]
+    Z, Y = build_lag_design(values, lag, trend)
+    T = len(Y)
+    if lambdas is None:
+        full = StandardizedDesign(Z, Y, k_trend)
+        eps = default_eps(int(T * min_train), Z.shape[1]) if eps is None else eps #the shortest fold sets the grid
+        lambdas = lambda_grid(lambda_max(full, penalty, l1_ratio, lag_groups(K, lag)), n_lambdas, eps)
+    bounds = np.linspace(int(T * min_train), T, n_folds + 1).astype(int)
+    if bounds[0] <= k_trend + 1 or (np.diff(bounds) < 1).any():
+        raise ValueError(f"{T} observations are too few for {n_folds} folds with min_train={min_train}")
+
+    args = [(Z, Y, k_trend, K, lag, bounds[f], bounds[f + 1], lambdas, penalty, l1_ratio, tol) for f in range(n_folds)]
+    n_jobs = min(n_jobs or os.cpu_count() or 1, n_folds)
+    with span('sparse var cv', lag=lag, folds=n_folds, penalties=len(lambdas)):
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                errors = np.array(list(pool.map(_fold_errors, *zip(*args))))
+        else:
+            errors = np.array([_fold_errors(*a) for a in args])
+        count('fits', n_folds * len(lambdas)) #one warm-started fit per fold and penalty
+
+    return pd.DataFrame({
+        'Lambda': lambdas,
+        'CV MSE': errors.mean(axis=0),
+        'CV SE': errors.std(axis=0, ddof=1) / np.sqrt(n_folds) if n_folds > 1 else np.nan,
+    })
+
+
+def select_lambda(cv, rule='min'):
+    """Penalty picked from a cross_validate() table: the minimum MSE, or the largest within one s.e. of it ('1se')."""
+    best = cv['CV MSE'].idxmin()
+    if rule == 'min':
+        return cv.at[best, 'Lambda']
+    if rule == '1se':
+        limit = cv.at[best, 'CV MSE'] + cv.at[best, 'CV SE']
+        return cv.loc[cv['CV MSE'] <= limit, 'Lambda'].max()
+    raise ValueError(f"unknown rule '{rule}' (use 'min' or '1se')")
+
+
+class SparseVARFit:
+    """A penalized VAR: statsmodels results plus the penalty, cross-validation table and sparsity."""
+
+    def __init__(self, results, lag, trend, penalty, l1_ratio, lam, cv, n_nonzero):
+        self.results = results #VARResultsWrapper: irf(), fevd(), forecast(), resid, params
+        self.lag = lag
+        self.trend = trend
+        self.penalty = penalty
+        self.l1_ratio = l1_ratio
+        self.lam = lam
+        self.cv = cv
+        self.n_nonzero = n_nonzero #nonzero slope coefficients per equation
+
+    @property
+    def names(self):
+        return list(self.results.names)
+
+    @property
+    def sparsity(self):
+        """Share of slope coefficients set to zero."""
+        K = len(self.names)
+        return 1 - self.n_nonzero.sum() / (K * K * self.lag)
+
+    def info_criteria(self):
+        """AIC/BIC/HQIC with the nonzero coefficients as the no. of free parameters (df of the lasso, Zou et al. 2007)."""
+        resid = np.asarray(self.results.resid)
+        T, K = resid.shape
+        _, logdet = np.linalg.slogdet(resid.T @ resid / T)
+        free_params = self.n_nonzero.sum() + K * TREND_ORDERS[self.trend]
+        return {'AIC': logdet + 2.0 * free_params / T,
+                'BIC': logdet + np.log(T) * free_params / T,
+                'HQIC': logdet + 2.0 * np.log(np.log(T)) * free_params / T,
+                'Free Parameters': int(free_params), 'Nobs': T}
+
+
+def fit_sparse_var(data, lag, penalty='lasso', l1_ratio=1.0, trend='c', lam=None, rule='min', n_lambdas=50,
+                   eps=None, n_folds=5, min_train=0.5, tol=1e-7, n_jobs=None):
+    """Penalized VAR(lag) of every column of data; lam=None picks the penalty by cross-validation.
+
+    penalty is 'lasso', 'elastic-net' (mixing l1_ratio) or 'group' (each variable's lags
+    enter or leave an equation together). Returns a SparseVARFit whose .results behaves
+    like VAR(data).fit(lag).
+    """
+    l1_ratio = _check_penalty(penalty, l1_ratio)
+    values = np.asarray(data, dtype=float)
+    K = values.shape[1]
+    k_trend = TREND_ORDERS[trend]
+    Z, Y = build_lag_design(values, lag, trend)
+    T = len(Y)
+    design = StandardizedDesign(Z, Y, k_trend)
+    groups = lag_groups(K, lag) if penalty == 'group' else None
+    if eps is None:
+        eps = default_eps(T if lam is not None else int(T * min_train), Z.shape[1])
+    lambdas = lambda_grid(lambda_max(design, penalty, l1_ratio, lag_groups(K, lag)), n_lambdas, eps)
+
+    cv = None
+    if lam is None:
+        cv = cross_validate(data, lag, penalty, l1_ratio, trend, lambdas, n_folds=n_folds, min_train=min_train,
+                            tol=tol, n_jobs=n_jobs)
+        lam = select_lambda(cv, rule)
+    path = lambdas[lambdas > lam] #warm start down the grid to the chosen penalty
+    B = None
+    with span('sparse var path', lag=lag, penalties=len(path) + 1):
+        for _, B in penalty_path(design, np.r_[path, lam], penalty, l1_ratio, groups, tol):
+            pass
+        count('fits', len(path) + 1)
+    params = design.unscale(B, Z, Y)
+    resid = Y - Z @ params
+    n_nonzero = (params[k_trend:] != 0).sum(axis=0)
+    df = np.maximum(T - (n_nonzero.mean() + k_trend), 1.0) #residual df with the nonzero count as model df
+    sigma_u = resid.T @ resid / df
+    results = results_from_params(data, lag, params, sigma_u, trend)
+    return SparseVARFit(results, lag, trend, penalty, l1_ratio, lam, cv, n_nonzero)
+
+
+def sparse_lag_table(fits):
+    """Penalty, sparsity and information criteria of several penalized VARs, {lag length: SparseVARFit}."""
+    rows = []
+    for lag, fit in fits.items():
+        cv_mse = fit.cv['CV MSE'].min() if fit.cv is not None else np.nan
+        rows.append({'Lag Length': lag, 'Penalty': fit.penalty, 'Lambda': fit.lam, 'CV MSE': cv_mse,
+                     'Sparsity': fit.sparsity, **fit.info_criteria()})
+    return pd.DataFrame(rows)
@@ -0,0 +1,150 @@
+"""Parameter stability tests for every equation of a fitted VAR at once.
+
+All equations of a VAR share the same regressors Z, so the tests are computed on the
+(T, K) residual matrix as a whole:
+
+- OLS-CUSUM (Ploberger & Kramer 1992): cumulated OLS residuals scaled by sigma*sqrt(T),
+  the process R's vars::stability(type='OLS-CUSUM') plots; sup |process| is compared
+  with the Brownian bridge bound (1.358 at 5%)
+- recursive CUSUM (Brown, Durbin & Evans 1975): cumulated recursive residuals with the
+  linear 5% boundaries
+- Chow F statistics for a break at every candidate date, and their supremum (sup-F,
+  Andrews 1993) over the trimmed middle of the sample
+
+One forward recursive least squares pass gives the recursive residuals of all K
+equations; the sum of squares of the first t recursive residuals is the SSR of the
+regression on the first t observations, so together with one backward pass it gives
+the Chow statistic for every break date and equation without refitting anything.
+"""
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+OLS_CUSUM_CRIT = {0.01: 1.628, 0.05: 1.358, 0.1: 1.224} #sup of a Brownian bridge
+REC_CUSUM_CRIT = {0.01: 1.143, 0.05: 0.948, 0.1: 0.850} #Brown, Durbin & Evans boundary constants
+
+
+def var_regression(fitted_model):
+    """(Z, Y, equation names, observation labels) of a fitted statsmodels VAR."""
+    Z = np.asarray(fitted_model.endog_lagged, dtype=float)
+    Y = np.asarray(fitted_model.endog, dtype=float)[fitted_model.k_ar:]
+    dates = getattr(fitted_model.model, 'data', None)
+    index = getattr(dates, 'row_labels', None)
+    labels = index[fitted_model.k_ar:] if index is not None else pd.RangeIndex(fitted_model.k_ar, fitted_model.k_ar + len(Y))
+    return Z, Y, list(fitted_model.names), labels
+
+
+def ols_cusum(resid, k):
+    """OLS-CUSUM processes (T + 1, K) of a residual matrix from a regression with k regressors."""
+    resid = np.asarray(resid, dtype=float)
+    T = len(resid)
+    sigma = np.sqrt((resid ** 2).sum(axis=0) / (T - k))
+    process = np.zeros((T + 1,) + resid.shape[1:])
+    np.cumsum(resid, axis=0, out=process[1:])
+    return process / (sigma * np.sqrt(T))
+
+
+def recursive_residuals(Z, Y):
+    """Standardized recursive residuals (T - k, K) of every equation, from one RLS pass.
+
+    w_t = (y_t - b_{t-1}'z_t) / sqrt(1 + z_t'(Z'Z)_{t-1}^-1 z_t), for t = k+1..T. The
+    first k observations give the starting estimate.
+    """
+    Z = np.asarray(Z, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    T, k = Z.shape
+    q, r = np.linalg.qr(Z[:k])
+    P = np.linalg.solve(r, np.linalg.solve(r, np.eye(k)).T) #(Z'Z)^-1 of the first k rows
+    B = np.linalg.solve(r, q.T @ Y[:k])
+    w = np.empty((T - k, Y.shape[1]))
+    for t in range(k, T): #all equations advance together
+        z = Z[t]
+        Pz = P @ z
+        f = 1.0 + z @ Pz
+        e = Y[t] - z @ B
+        w[t - k] = e / np.sqrt(f)
+        B = B + np.outer(Pz, e / f)
+        P = P - np.outer(Pz, Pz / f)
+    return w
+
+
+def recursive_cusum(w, signif=0.05):
+    """Recursive CUSUM paths W_r (T - k, K) and the (T - k,) upper boundary; the lower one is its negative."""
+    n = len(w)
+    W = np.cumsum(w, axis=0) / w.std(axis=0, ddof=1)
+    r = np.arange(1, n + 1)
+    bound = REC_CUSUM_CRIT[signif] * (np.sqrt(n) + 2 * r / np.sqrt(n))
+    return W, bound
+
+
+def chow_path(Z, Y, trim=0.15):
+    """Chow F statistic of a break before each candidate observation, for every equation.
+
+    Returns (candidate positions, F (n_candidates, K)); candidates keep at least
+    max(k, trim*T) observations on each side of the break.
+    """
+    Z = np.asarray(Z, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    T, k = Z.shape
+    forward = np.cumsum(recursive_residuals(Z, Y) ** 2, axis=0) #SSR of the first k+1..T observations
+    backward = np.cumsum(recursive_residuals(Z[::-1], Y[::-1]) ** 2, axis=0) #SSR of the last k+1..T
+    ssr_full = forward[-1]
+
+    lo = max(k + 1, int(np.ceil(trim * T)))
+    hi = min(T - k - 1, int(np.floor((1 - trim) * T)))
+    if hi < lo:
+        raise ValueError(f"{T} observations are too few to test breaks with {k} regressors per equation")
+    tau = np.arange(lo, hi + 1) #break before observation tau: segments [0, tau) and [tau, T)
+    ssr_1 = forward[tau - k - 1]
+    ssr_2 = backward[T - tau - k - 1]
+    ssr_split = ssr_1 + ssr_2
+    F = ((ssr_full - ssr_split) / k) / (ssr_split / (T - 2 * k))
+    return tau, F
+
+
+def stability_tests(fitted_model, trim=0.15, signif=0.05):
+    """Stability tests of every equation of a fitted VAR as one data frame (one row per equation)."""
+    Z, Y, names, labels = var_regression(fitted_model)
+    T, k = Z.shape
+    resid = Y - Z @ np.asarray(fitted_model.params)
+
+    ols_sup = np.abs(ols_cusum(resid, k)).max(axis=0)
+    w = recursive_residuals(Z, Y)
+    W, bound = recursive_cusum(w, signif)
+    rec_stat = (np.abs(W) / (bound / REC_CUSUM_CRIT[signif])[:, None]).max(axis=0)
+    tau, F = chow_path(Z, Y, trim)
+    best = F.argmax(axis=0)
+    sup_f = F[best, np.arange(len(names))]
+
+    return pd.DataFrame({
+        'Equation': names,
+        'OLS-CUSUM': ols_sup,
+        'OLS-CUSUM p-value': stats.kstwobign.sf(ols_sup),
+        'OLS-CUSUM Stable': ols_sup < OLS_CUSUM_CRIT[signif],
+        'Rec-CUSUM': rec_stat,
+        'Rec-CUSUM Stable': rec_stat < REC_CUSUM_CRIT[signif],
+        'Sup-F': sup_f,
+        'Break Date': np.asarray(labels)[tau[best]],
+        'Chow p-value': stats.f.sf(sup_f, k, T - 2 * k), #pointwise p-value at the sup-F date (not adjusted for the search)
+        'Nobs': T,
+        'Regressors': k,
+    })
+
+
+def stability_table(models, trim=0.15, signif=0.05):
+    """stability_tests() for several fitted VARs, {model name: fitted model}, stacked into one table."""
+    tables = [stability_tests(model, trim, signif).assign(Model=name) for name, model in models.items()]
+    table = pd.concat(tables, ignore_index=True)
+    return table[['Model'] + [c for c in table.columns if c != 'Model']]
+
+
+def chow_test(fitted_model, break_date):
+    """Chow F test of a break at a known date for every equation: data frame of F and p-value."""
+    Z, Y, names, labels = var_regression(fitted_model)
+    T, k = Z.shape
+    tau, F = chow_path(Z, Y, trim=0.0)
+    position = list(labels).index(break_date) if not isinstance(break_date, (int, np.integer)) else int(break_date)
+    if position not in tau:
+        raise ValueError(f"a break at {break_date} leaves fewer than {k + 1} observations on one side")
+    f = F[list(tau).index(position)]
+    return pd.DataFrame({'Equation': names, 'F': f, 'p-value': stats.f.sf(f, k, T - 2 * k)})
@@ -0,0 +1,145 @@
+"""Batch STL decomposition of every column of a data frame, with memoized results.
+
+Each series is decomposed once per (series hash, period, robust, STL settings). Results
+are kept in memory and on disk (Cache/STL), so the plots, the detrending of US Debt SA
+and the seasonal strength reports in Seasonality Check.py and Detrending.py all read
+the same decomposition instead of calling STL(...).fit() again. Columns that still
+need decomposing are spread over a process pool.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.seasonal import STL, DecomposeResult
+
+from tracing import count, span
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+STL_CACHE_DIR = os.path.join(script_dir, 'Cache', 'STL') #default location of memoized decompositions
+COMPONENTS = ('trend', 'seasonal', 'resid', 'weights')
+
+_memo = {} #decompositions already computed or loaded in this process
+
+
+def stl_key(values, period=4, robust=False, **stl_kwargs):
+    """Memo key: hash of the series values plus the STL settings."""
+    h = hashlib.sha256(np.ascontiguousarray(values, dtype=float).tobytes())
+    h.update(json.dumps({'period': period, 'robust': robust, **stl_kwargs}, sort_keys=True).encode())
+    return h.hexdigest()[:32]
+
+
+def _fit_stl(values, period, robust, stl_kwargs):
+    #worker: run one STL fit on a plain array and return its components
+    result = STL(values, period=period, robust=robust, **stl_kwargs).fit()
+    return {name: np.asarray(getattr(result, name)) for name in COMPONENTS}
+
+
+def _load(key, cache_dir):
+    if key in _memo:
+        return _memo[key]
+    if cache_dir is None:
+        return None
+    try:
+        with np.load(os.path.join(cache_dir, f'{key}.npz')) as stored:
+            components = {name: stored[name] for name in COMPONENTS}
+    except (OSError, KeyError, ValueError):
+        return None
+    _memo[key] = components
+    return components
+
+
+def _store(key, components, cache_dir):
+    _memo[key] = components
+    if cache_dir is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.savez(f, **components)
+    os.replace(tmp_path, os.path.join(cache_dir, f'{key}.npz'))
+
+
+class STLBatchResult:
+    """Trend, seasonal and residual components of every decomposed column, plus strength metrics.
+
+    trend / seasonal / resid / weights are data frames aligned with the input frame
+    (NaN where a column had missing values). strength has one row per variable with
+    'Seasonal Strength' (variance of the seasonal component over the variance of the
+    series, as reported in Seasonality Check.py) and the F_S / F_T strengths of
+    Wang, Smith & Hyndman (2006).
+    """
+
+    def __init__(self, observed, components):
+        self.observed = observed
+        frames = {name: pd.DataFrame(index=observed.index, columns=observed.columns, dtype=float) for name in COMPONENTS}
+        for var, (index, parts) in components.items():
+            for name in COMPONENTS:
+                frames[name].loc[index, var] = parts[name]
+        self.trend = frames['trend']
+        self.seasonal = frames['seasonal']
+        self.resid = frames['resid']
+        self.weights = frames['weights']
+        self.strength = self._strength()
+
+    def _strength(self):
+        rows = {}
+        for var in self.observed.columns:
+            mask = self.trend[var].notna()
+            series = self.observed[var][mask].to_numpy()
+            trend, seasonal, resid = (frame[var][mask].to_numpy() for frame in (self.trend, self.seasonal, self.resid))
+            var_resid = np.var(resid)
+            rows[var] = {
+                'Seasonal Strength': np.var(seasonal) / np.var(series),
+                'Seasonal Strength (F_S)': max(0.0, 1 - var_resid / np.var(seasonal + resid)),
+                'Trend Strength (F_T)': max(0.0, 1 - var_resid / np.var(trend + resid)),
+            }
+        return pd.DataFrame.from_dict(rows, orient='index')
+
+    def detrended(self, var):
+        """Series minus its STL trend, over the rows where it was decomposed."""
+        return (self.observed[var] - self.trend[var]).dropna()
+
+    def decompose_result(self, var):
+        """statsmodels DecomposeResult for one variable, so result.plot() works as before."""
+        mask = self.trend[var].notna()
+        parts = {name: frame[var][mask] for name, frame in
+                 (('trend', self.trend), ('seasonal', self.seasonal), ('resid', self.resid), ('weights', self.weights))}
+        return DecomposeResult(self.observed[var][mask], parts['seasonal'], parts['trend'], parts['resid'], parts['weights'])
+
+
+def decompose_frame(data, period=4, robust=False, n_jobs=None, cache_dir=STL_CACHE_DIR, **stl_kwargs):
+    """STL-decompose every column of `data` (missing values dropped per column).
+
+    Decompositions already memoized for the same values and settings are reused;
+    the rest run in a process pool (n_jobs=None uses every core, n_jobs=1 runs here).
+    """
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    components, todo = {}, {}
+    for var in data.columns:
+        series = data[var].dropna()
+        key = stl_key(series.to_numpy(), period, robust, **stl_kwargs)
+        cached = _load(key, cache_dir)
+        if cached is not None:
+            components[var] = (series.index, cached)
+        else:
+            todo[var] = (series, key)
+
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(todo))
+    args = [(series.to_numpy(dtype=float), period, robust, stl_kwargs) for series, _ in todo.values()]
+    with span('stl', series=data.shape[1], memoized=data.shape[1] - len(todo)):
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                fitted = list(pool.map(_fit_stl, *zip(*args)))
+        else:
+            fitted = [_fit_stl(*a) for a in args]
+        count('decompositions', len(todo))
+    for (var, (series, key)), parts in zip(todo.items(), fitted):
+        _store(key, parts, cache_dir)
+        components[var] = (series.index, parts)
+
+    return STLBatchResult(data, components)
@@ -0,0 +1,203 @@
+"""Named spans around the stages and hot loops of the scripts, written as a trace-event file.
+
+Tracing is off unless a script runs with --trace (or VAR_TRACE=1 in the environment).
+Each span then records its wall time, CPU time (this process, and its reaped worker
+processes), the peak RSS of the process when it ends, and the model fits and
+decompositions counted inside it. At exit all spans go to Cache/Traces/<script>-<time>.json
+in the Chrome trace-event format (open it in chrome://tracing or https://ui.perfetto.dev),
+with per-span-name totals and the run's counters under 'otherData'.
+
+--profile (or VAR_PROFILE=1) also starts a sampling profiler that records the main
+thread's stack every SAMPLE_INTERVAL seconds. The samples are added to the trace, and a
+.folded file of collapsed stacks is written next to it for flame graph tools (speedscope,
+flamegraph.pl).
+
+    with span('bootstrap', lag=lag):
+        count('fits', reps)
+
+When tracing is off span() returns one shared no-op context manager and count() returns
+at once. Worker processes of a pool write no trace; the fits and decompositions they run
+are counted by the process that dispatches them.
+
+    python "Impulse Response Functions.py" --headless --trace
+    python pipeline.py --profile irf   # every stage that runs writes its own trace
+"""
+import atexit
+import contextlib
+import datetime
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+TRACE_DIR = os.path.join(script_dir, 'Cache', 'Traces')
+SAMPLE_INTERVAL = 0.005 #seconds between stack samples of the profiler
+
+
+def _flag(option, variable):
+    return option in sys.argv or os.environ.get(variable) == '1'
+
+
+PROFILE = _flag('--profile', 'VAR_PROFILE')
+ENABLED = PROFILE or _flag('--trace', 'VAR_TRACE')
+
+_NULL_SPAN = contextlib.nullcontext()
+_T0 = time.perf_counter()
+_PID = os.getpid()
+_local = threading.local()
+_lock = threading.Lock()
+_events = []
+_totals = Counter()
+_summary = {} #span name -> totals of calls, wall/CPU milliseconds and counters
+_sampler = None
+
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+def _cpu_seconds():
+    #(this process, reaped child processes)
+    t = os.times()
+    return time.process_time(), t.children_user + t.children_system
+
+
+def max_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 #kB on Linux
+
+
+class _Span:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.counts = Counter()
+
+    def __enter__(self):
+        _stack().append(self)
+        self.cpu = _cpu_seconds()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        cpu, children_cpu = _cpu_seconds()
+        _stack().pop()
+        measured = Counter({'wall_ms': (end - self.start) * 1e3, 'cpu_ms': (cpu - self.cpu[0]) * 1e3,
+                            'children_cpu_ms': (children_cpu - self.cpu[1]) * 1e3})
+        args = {**self.args, **{key: round(value, 3) for key, value in measured.items() if key != 'wall_ms'},
+                'max_rss_mb': round(max_rss_mb(), 1), **self.counts}
+        event = {'name': self.name, 'cat': 'span', 'ph': 'X', 'ts': (self.start - _T0) * 1e6,
+                 'dur': (end - self.start) * 1e6, 'pid': _PID, 'tid': threading.get_native_id(), 'args': args}
+        with _lock:
+            _events.append(event)
+            _summary.setdefault(self.name, Counter()).update(calls=1, **measured, **self.counts)
+        return False
+
+
+def span(name, **args):
+    """Context manager timing the enclosed block as one span; keyword arguments are stored with it."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def count(kind, n=1):
+    """Add n to the `kind` counter ('fits', 'decompositions', ...) of every open span on this thread."""
+    if not ENABLED:
+        return
+    for s in _stack():
+        s.counts[kind] += n
+    with _lock:
+        _totals[kind] += n
+
+
+class _Sampler(threading.Thread):
+    #samples the stack of one thread at a fixed interval
+    def __init__(self, thread_id, interval):
+        super().__init__(name='trace-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.halt = threading.Event()
+        self.nodes = {} #(parent node, frame label) -> node id
+        self.samples = []
+        self.folded = Counter()
+
+    def run(self):
+        while not self.halt.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                code = frame.f_code
+                labels.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if not labels:
+                continue
+            labels.reverse() #root first
+            node = None
+            for label in labels:
+                node = self.nodes.setdefault((node, label), len(self.nodes))
+            self.samples.append({'name': 'sample', 'ts': (time.perf_counter() - _T0) * 1e6, 'cpu': 0, 'sf': node, 'weight': 1})
+            self.folded[';'.join(labels)] += 1
+
+    def stack_frames(self):
+        return {str(node): {'category': 'python', 'name': label, **({'parent': str(parent)} if parent is not None else {})}
+                for (parent, label), node in self.nodes.items()}
+
+
+def write_trace(path=None):
+    """Write the spans (and profiler samples) recorded so far; returns the trace path."""
+    if _sampler is not None:
+        _sampler.halt.set()
+        _sampler.join()
+    script = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+    started = datetime.datetime.now() - datetime.timedelta(seconds=time.perf_counter() - _T0)
+    path = path or os.path.join(TRACE_DIR, f"{script}-{started.strftime('%Y%m%d-%H%M%S')}-{_PID}.json")
+    cpu, children_cpu = _cpu_seconds()
+    with _lock:
+        events = list(_events)
+        summary = {name: {key: round(value, 3) for key, value in totals.items()} for name, totals in _summary.items()}
+    run = {'name': script, 'cat': 'run', 'ph': 'X', 'ts': 0.0, 'dur': (time.perf_counter() - _T0) * 1e6, 'pid': _PID,
+           'tid': threading.main_thread().native_id,
+           'args': {'cpu_ms': round(cpu * 1e3, 3), 'children_cpu_ms': round(children_cpu * 1e3, 3),
+                    'max_rss_mb': round(max_rss_mb(), 1), **_totals}}
+    report = {
+        'traceEvents': [{'name': 'process_name', 'ph': 'M', 'pid': _PID, 'args': {'name': script}}, run] + events,
+        'displayTimeUnit': 'ms',
+        'otherData': {
+            'script': script, 'argv': sys.argv[1:], 'started': started.isoformat(timespec='seconds'),
+            'wall_s': round(run['dur'] / 1e6, 3), 'cpu_s': round(cpu, 3), 'children_cpu_s': round(children_cpu, 3),
+            'max_rss_mb': round(max_rss_mb(), 1), 'counts': dict(_totals), 'spans': summary,
+        },
+    }
+    if _sampler is not None:
+        report['stackFrames'] = _sampler.stack_frames()
+        report['samples'] = [{**s, 'tid': threading.main_thread().native_id} for s in _sampler.samples]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f)
+    if _sampler is not None:
+        with open(os.path.splitext(path)[0] + '.folded', 'w') as f:
+            f.writelines(f'{stack} {n}\n' for stack, n in _sampler.folded.most_common())
+    return path
+
+
+def _write_at_exit():
+    if os.getpid() != _PID: #a forked worker inherited the handler
+        return
+    print(f'Trace written to: {write_trace()}')
+
+
+if ENABLED:
+    if PROFILE:
+        _sampler = _Sampler(threading.main_thread().ident, SAMPLE_INTERVAL)
+        _sampler.start()
+    atexit.register(_write_at_exit)
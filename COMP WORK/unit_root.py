@@ -0,0 +1,290 @@
+"""Batched ADF, KPSS and Phillips-Perron unit root tests over whole panels.
+
+Series are grouped by length after dropping missing values, and every group is tested
+at once with stacked (batch, n, m) least squares:
+
+- ADF with automatic lag selection: one QR of [trend, level, lagged diffs 1..maxlag | dy]
+  per series gives the SSR (and the t value of the last lag) of every candidate lag on
+  the common sample, because the regressor sets are nested, instead of one OLS fit per
+  lag. The chosen lag is refitted on its full sample, as statsmodels' adfuller does, so
+  statistics, p-values (MacKinnon 1994/2010) and lags match adfuller(autolag='AIC')
+- KPSS with the Hobijn et al. (1998) data-dependent bandwidth (statsmodels' nlags='auto')
+- Phillips-Perron Z-tau with a Bartlett long-run variance, the test arch's PhillipsPerron
+  computes, with MacKinnon p-values
+
+Groups are spread over a process pool in chunks of series. The result is one tidy row
+per (variable, variant, test).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.adfvalues import mackinnoncrit, mackinnonp
+
+from tracing import count, span
+
+TESTS = ('adf', 'kpss', 'pp')
+VARIANTS = {'raw': None, 'diff': 1, 'seasonal diff': 4} #differencing period of each transformation
+KPSS_CRIT = {'c': [0.347, 0.463, 0.574, 0.739], 'ct': [0.119, 0.146, 0.176, 0.216]} #Kwiatkowski et al. (1992), 10/5/2.5/1%
+KPSS_PVALS = [0.10, 0.05, 0.025, 0.01]
+T_STAT_STOP = 1.6448536269514722 #one-sided 5% normal quantile, adfuller's autolag='t-stat' rule
+COLUMNS = ['Variable', 'Variant', 'Test', 'Statistic', 'p-value', 'Lags', 'Nobs', 'Crit 1%', 'Crit 5%', 'Crit 10%', 'Stationary']
+
+
+def _trend_columns(n, regression):
+    #deterministic regressors in statsmodels' add_trend order: const, t, t**2
+    t = np.arange(1, n + 1, dtype=float)
+    return np.column_stack([t ** i for i in range(len(regression))]) if regression != 'n' else np.empty((n, 0))
+
+
+def _stacked_r(design):
+    #R factors of a stack of (n, m) matrices
+    return np.linalg.qr(design, mode='r')
+
+
+def adf_maxlag(n, regression='c'):
+    """adfuller's default maximum lag (Schwert 1989) for a series of n observations."""
+    ntrend = len(regression) if regression != 'n' else 0
+    maxlag = min(n // 2 - ntrend - 1, int(np.ceil(12.0 * np.power(n / 100.0, 1 / 4.0))))
+    if maxlag < 0:
+        raise ValueError(f"{n} observations are too few for an ADF regression with trend '{regression}'")
+    return maxlag
+
+
+def _adf_design(x, lags, regression, level_last):
+    #(batch, nobs, m + 1) stacks of [trend | level, diffs lag 1..lags | dy], or with the level after the diffs
+    B, n = x.shape
+    dx = np.diff(x, axis=1)
+    nobs = n - 1 - lags
+    level = x[:, lags:n - 1]
+    diffs = [dx[:, lags - i:n - 1 - i] for i in range(1, lags + 1)]
+    trend = np.broadcast_to(_trend_columns(nobs, regression), (B, nobs, len(regression) if regression != 'n' else 0))
+    columns = diffs + [level] if level_last else [level] + diffs #level last: its t value comes straight from R
+    stacked = np.stack(columns + [dx[:, lags:]], axis=2)
+    return np.concatenate([trend, stacked], axis=2), nobs
+
+
+def adf_batch(x, regression='c', maxlag=None, autolag='AIC'):
+    """ADF statistics, chosen lags and regression nobs of the rows of x (batch, n).
+
+    autolag is 'AIC', 'BIC', 't-stat' or None (use maxlag).
+    """
+    x = np.asarray(x, dtype=float)
+    B, n = x.shape
+    maxlag = adf_maxlag(n, regression) if maxlag is None else maxlag
+    ntrend = len(regression) if regression != 'n' else 0
+    if autolag:
+        design, nobs = _adf_design(x, maxlag, regression, level_last=False)
+        R = _stacked_r(design)
+        m = design.shape[2] - 1
+        tail = R[:, :, m] ** 2
+        ssr_after = np.cumsum(tail[:, ::-1], axis=1)[:, ::-1] #ssr of the first c regressors = sum of R[c:, -1]^2
+        cols = np.arange(ntrend + 1, m + 1) #candidate models: trend + level + 0..maxlag diffs
+        ssr = ssr_after[:, cols]
+        method = autolag.lower()
+        if method in ('aic', 'bic'):
+            llf = -nobs / 2.0 * (np.log(2 * np.pi) + np.log(ssr / nobs) + 1)
+            penalty = 2.0 if method == 'aic' else np.log(nobs)
+            lags = np.argmin(-2 * llf + penalty * cols, axis=1) #first minimum, i.e. the shortest lag on ties
+        elif method == 't-stat':
+            last = np.abs(R[:, cols - 1, m]) / np.sqrt(ssr / (nobs - cols)) #|t| of each model's longest lag
+            significant = last[:, ::-1] >= T_STAT_STOP
+            lags = np.where(significant.any(axis=1), maxlag - significant.argmax(axis=1), 0)
+        else:
+            raise ValueError(f"unknown autolag '{autolag}' (use 'AIC', 'BIC', 't-stat' or None)")
+    else:
+        lags = np.full(B, maxlag)
+
+    stat = np.empty(B)
+    nobs_used = np.empty(B, dtype=np.int64)
+    for lag in np.unique(lags): #refit each chosen lag on its own, longer sample
+        rows = np.flatnonzero(lags == lag)
+        design, nobs = _adf_design(x[rows], int(lag), regression, level_last=True)
+        R = _stacked_r(design)
+        m = design.shape[2] - 1
+        s = np.abs(R[:, m, m]) / np.sqrt(nobs - m)
+        stat[rows] = np.sign(R[:, m - 1, m - 1]) * R[:, m - 1, m] / s
+        nobs_used[rows] = nobs
+    return stat, lags, nobs_used
+
+
+def _autocovariances(resid, max_lag):
+    #sum_t u_t u_{t-i} for i = 0..max_lag, (max_lag + 1, batch)
+    n = resid.shape[1]
+    return np.array([np.einsum('bt,bt->b', resid[:, i:], resid[:, :n - i]) for i in range(max_lag + 1)])
+
+
+def _bartlett_variance(gamma, lags, n):
+    #Newey-West long-run variance with per-series truncation lags
+    i = np.arange(gamma.shape[0])[:, None]
+    weights = np.where(i <= lags, 1.0 - i / (lags + 1.0), 0.0)
+    weights[0] = 0.5
+    return 2 * (weights * gamma).sum(axis=0) / n
+
+
+def kpss_batch(x, regression='c', nlags='auto'):
+    """KPSS statistics and bandwidths of the rows of x (batch, n); nlags is 'auto', 'legacy' or an int."""
+    x = np.asarray(x, dtype=float)
+    B, n = x.shape
+    if regression == 'ct':
+        X = _trend_columns(n, 'ct')
+        resid = x - np.linalg.lstsq(X, x.T, rcond=None)[0].T @ X.T
+    else:
+        resid = x - x.mean(axis=1, keepdims=True)
+    if nlags == 'auto': #Hobijn et al. (1998)
+        covlags = int(np.power(n, 2.0 / 9.0))
+        gamma = _autocovariances(resid, covlags) / (n / 2.0)
+        s0 = gamma[0] / 2 + gamma[1:].sum(axis=0)
+        s1 = (np.arange(1, covlags + 1)[:, None] * gamma[1:]).sum(axis=0)
+        gamma_hat = 1.1447 * np.power((s1 / s0) ** 2, 1.0 / 3.0)
+        lags = np.minimum((gamma_hat * np.power(n, 1.0 / 3.0)).astype(np.int64), n - 1)
+    elif nlags == 'legacy':
+        lags = np.full(B, min(int(np.ceil(12.0 * np.power(n / 100.0, 1 / 4.0))), n - 1))
+    else:
+        if nlags >= n:
+            raise ValueError(f"lags ({nlags}) must be < number of observations ({n})")
+        lags = np.full(B, int(nlags))
+    eta = (np.cumsum(resid, axis=1) ** 2).sum(axis=1) / n ** 2
+    s_hat = _bartlett_variance(_autocovariances(resid, int(lags.max())), lags, n)
+    return eta / s_hat, lags
+
+
+def kpss_pvalue(stat, regression='c'):
+    """p-values interpolated from the KPSS table; they are clipped to [0.01, 0.10] outside it."""
+    return np.interp(stat, KPSS_CRIT[regression], KPSS_PVALS)
+
+
+def pp_batch(x, regression='c', lags=None):
+    """Phillips-Perron Z-tau statistics, bandwidths and nobs of the rows of x (batch, n)."""
+    x = np.asarray(x, dtype=float)
+    B, n = x.shape
+    lags = int(np.ceil(12.0 * np.power(n / 100.0, 1 / 4.0))) if lags is None else lags
+    nobs = n - 1
+    trend = np.broadcast_to(_trend_columns(nobs, regression), (B, nobs, len(regression) if regression != 'n' else 0))
+    design = np.concatenate([trend, x[:, :-1, None], x[:, 1:, None]], axis=2) #[trend | y_{t-1} | y_t]
+    R = _stacked_r(design)
+    k = design.shape[2] - 1
+    params = np.linalg.solve(R[:, :k, :k], R[:, :k, k:])[..., 0]
+    resid = x[:, 1:] - np.einsum('btk,bk->bt', design[:, :, :k], params)
+    gamma = _autocovariances(resid, lags)
+    lam2 = _bartlett_variance(gamma, np.full(B, lags), nobs)
+    s2 = gamma[0] / (nobs - k)
+    gamma0 = gamma[0] / nobs
+    sigma = np.sqrt(s2) / np.abs(R[:, k - 1, k - 1]) #standard error of the y_{t-1} coefficient
+    t = (params[:, k - 1] - 1) / sigma
+    lam = np.sqrt(lam2)
+    stat = np.sqrt(gamma0 / lam2) * t - 0.5 * ((lam2 - gamma0) / lam) * (nobs * sigma / np.sqrt(s2))
+    return stat, np.full(B, lags), np.full(B, nobs)
+
+
+def _test_group(values, tests, regression, autolag, maxlag, kpss_lags):
+    #all tests for one stack of equal-length series: {test: (stat, lags, nobs)}
+    out = {}
+    n = values.shape[1]
+    usable = values.max(axis=1) != values.min(axis=1) #constant series get NaN rows instead of an error
+    for test in tests:
+        stat = np.full(len(values), np.nan)
+        lags = np.zeros(len(values), dtype=np.int64)
+        nobs = np.full(len(values), n, dtype=np.int64)
+        if usable.any():
+            x = values[usable]
+            if test == 'adf':
+                result = adf_batch(x, regression, maxlag, autolag)
+            elif test == 'kpss':
+                result = kpss_batch(x, regression, kpss_lags) + (np.full(len(x), n),)
+            else:
+                result = pp_batch(x, regression)
+            stat[usable], lags[usable], nobs[usable] = result
+        out[test] = (stat, lags, nobs)
+    return out
+
+
+def _variant_values(series, variant):
+    period = VARIANTS[variant] if isinstance(variant, str) else variant
+    values = series if period is None else series.diff(period)
+    return values.dropna().to_numpy(dtype=float)
+
+
+def unit_root_table(data, tests=('adf', 'kpss'), variants=('raw',), regression='c', autolag='AIC',
+                    maxlag=None, kpss_lags='auto', signif=0.05, n_jobs=None, chunk_size=64):
+    """Unit root tests of every column of data under every variant, as one tidy data frame.
+
+    variants are names from VARIANTS (raw, diff, seasonal diff). Missing values are
+    dropped per series. Stationary is the test's verdict at signif: the unit root null
+    rejected for ADF and PP, the stationarity null not rejected for KPSS. n_jobs=None
+    spreads chunks of chunk_size series over every core, n_jobs=1 runs here.
+    """
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    for test in tests:
+        if test not in TESTS:
+            raise ValueError(f"unknown test '{test}' (use one of {', '.join(TESTS)})")
+    if 'kpss' in tests and regression not in KPSS_CRIT:
+        raise ValueError(f"KPSS supports regression 'c' or 'ct', not '{regression}'")
+
+    groups = {} #(variant, length) -> list of (variable, values)
+    for variant in variants:
+        for col in frame.columns:
+            values = _variant_values(frame[col], variant)
+            groups.setdefault((variant, len(values)), []).append((col, values))
+    chunks = [(variant, members[i:i + chunk_size]) for (variant, _), members in groups.items()
+              for i in range(0, len(members), chunk_size)]
+    args = [(np.array([v for _, v in members]), tests, regression, autolag, maxlag, kpss_lags) for _, members in chunks]
+
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(chunks))
+    with span('unit root tests', series=sum(len(members) for _, members in chunks), tests=','.join(tests)):
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+                results = list(pool.map(_test_group, *zip(*args)))
+        else:
+            results = [_test_group(*a) for a in args]
+        count('fits', len(tests) * sum(len(members) for _, members in chunks)) #one test regression per series and test
+
+    rows = []
+    for (variant, members), result in zip(chunks, results):
+        for test in tests:
+            stat, lags, nobs = result[test]
+            for j, (col, _) in enumerate(members):
+                rows.append((col, variant, test.upper(), stat[j], lags[j], nobs[j]))
+    table = pd.DataFrame(rows, columns=['Variable', 'Variant', 'Test', 'Statistic', 'Lags', 'Nobs'])
+    return _add_inference(table, frame.columns, variants, tests, regression, signif)
+
+
+def _add_inference(table, columns, variants, tests, regression, signif):
+    #p-values, critical values and verdicts, then rows in (variable, variant, test) order
+    stat = table['Statistic'].to_numpy()
+    pvalue = np.full(len(table), np.nan)
+    crit = np.full((len(table), 3), np.nan)
+    kpss_rows = (table['Test'] == 'KPSS').to_numpy()
+    if kpss_rows.any():
+        pvalue[kpss_rows] = kpss_pvalue(stat[kpss_rows], regression)
+        crit[kpss_rows] = np.array(KPSS_CRIT[regression])[[3, 1, 0]]
+    for i in np.flatnonzero(~kpss_rows): #MacKinnon response surfaces, one small polynomial per row
+        if np.isfinite(stat[i]):
+            pvalue[i] = mackinnonp(stat[i], regression=regression, N=1)
+        crit[i] = mackinnoncrit(N=1, regression=regression, nobs=table['Nobs'].iat[i])
+    table['p-value'] = pvalue
+    table['Crit 1%'], table['Crit 5%'], table['Crit 10%'] = crit.T
+    table['Stationary'] = np.where(kpss_rows, pvalue >= signif, pvalue < signif) & np.isfinite(pvalue)
+
+    order = {'Variable': list(columns), 'Variant': list(variants), 'Test': [t.upper() for t in tests]}
+    keys = [table[c].map({v: i for i, v in enumerate(order[c])}) for c in order]
+    table = table.iloc[np.lexsort(keys[::-1])].reset_index(drop=True)
+    return table[COLUMNS]
+
+
+def print_report(table, signif=0.05):
+    """Print the results in the wording the stationarity scripts have always used."""
+    for (var, variant), rows in table.groupby(['Variable', 'Variant'], sort=False):
+        label = var if variant == 'raw' else f'{var} ({variant})'
+        print(f"Testing for stationarity in {label}:")
+        for _, row in rows.iterrows():
+            test, p = row['Test'], row['p-value']
+            print(f'{label} - {test} Statistic: {row["Statistic"]}, p-value: {p}')
+            null = 'not stationary' if test == 'KPSS' else 'stationary'
+            other = 'stationary' if test == 'KPSS' else 'not stationary'
+            if p < signif:
+                print(f"{label} is {null} according to the {test} test (p < {signif}).")
+            else:
+                print(f"{label} is {other} according to the {test} test (p >= {signif}).")
+        print("-" * 50)
@@ -0,0 +1,199 @@
+"""On-disk store of fitted VAR models shared by the analysis scripts.
+
+Each fitted model is saved as one .npz file named after a hash of the input data
+plus the lag and trend spec, holding the coefficients, sigma_u, residuals and llf.
+A later script (or a later run) asks for the same (data, lag, trend) and gets a
+VARResults rebuilt from the stored parameters instead of re-estimating it.
+
+- entries are evicted least-recently-used once there are more than max_entries
+- the data hash is part of the key, so edited data never hits a stale model, and
+  passing source= drops the entries of the previous version of that data set
+"""
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.vector_ar import util
+from statsmodels.tsa.vector_ar.var_model import VAR, VARResults, VARResultsWrapper
+
+from tracing import count
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(script_dir, 'Cache', 'VAR Models') #default location of the model store
+MAX_ENTRIES = 256 #no. of fitted models kept before the least recently used are evicted
+
+
+def data_fingerprint(data):
+    """sha256 of the values and column names of a data frame (or array).
+
+    The index is left out on purpose: the estimates only depend on the values, and the
+    scripts load the same csv with either a Timestamp or a quarterly Period index.
+    """
+    h = hashlib.sha256()
+    if isinstance(data, pd.DataFrame):
+        h.update(json.dumps([str(c) for c in data.columns]).encode())
+        values = data.to_numpy(dtype=float)
+    else:
+        values = np.asarray(data, dtype=float)
+    h.update(str(values.shape).encode())
+    h.update(np.ascontiguousarray(values).tobytes())
+    return h.hexdigest()
+
+
+def results_from_params(data, lag, params, sigma_u, trend='c'):
+    """Build a statsmodels VARResults from known parameters without running least squares.
+
+    Mirrors VAR.fit / VAR._estimate_var, so irf(), fevd(), forecast(), resid, llf and the
+    information criteria behave exactly as on a freshly fitted model.
+    """
+    model = VAR(data)
+    k_trend = util.get_trendorder(trend)
+    model.exog_names = util.make_lag_names(model.endog_names, lag, k_trend)
+    model.nobs = model.n_totobs - lag
+    model.data.cov_names = pd.MultiIndex.from_product((model.data.xnames, model.data.ynames))
+    model.k_trend = k_trend
+
+    z = util.get_var_endog(model.endog, lag, trend=trend, has_constant='raise')
+    for i in range(k_trend): #same trend column adjustment as _estimate_var (JMulTi convention)
+        if (np.diff(z[:, i]) == 1).all():
+            z[:, i] += lag
+        if (np.diff(np.sqrt(z[:, i])) == 1).all():
+            z[:, i] = (np.sqrt(z[:, i]) + lag) ** 2
+
+    results = VARResults(model.endog, z, np.asarray(params), np.asarray(sigma_u), lag,
+                         names=model.endog_names, trend=trend, dates=model.data.dates, model=model)
+    return VARResultsWrapper(results)
+
+
+class VARModelCache:
+    """Content-addressed store of fitted VAR(p) models, keyed on (data hash, lag, trend)."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, data_hash, lag, trend='c'):
+        return f'{data_hash[:24]}_{trend}_lag{lag}'
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def get(self, data, lag, trend='c', data_hash=None):
+        """Return the cached VARResults for (data, lag, trend), or None if it was never stored."""
+        data_hash = data_hash or data_fingerprint(data)
+        path = self._path(self.key(data_hash, lag, trend))
+        try:
+            with np.load(path) as stored:
+                params, sigma_u = stored['params'], stored['sigma_u']
+        except (OSError, KeyError, ValueError): #missing, evicted by another process, or a half-written file
+            return None
+        with contextlib.suppress(OSError): #evicted by another process since it was read: still a hit
+            os.utime(path) #touch the entry so LRU eviction sees it as recently used
+        return results_from_params(data, lag, params, sigma_u, trend)
+
+    def put(self, data, lag, fitted_model, trend='c', data_hash=None):
+        """Store the coefficients, sigma_u, residuals and llf of a fitted model."""
+        data_hash = data_hash or data_fingerprint(data)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f,
+                     params=np.asarray(fitted_model.params),
+                     coefs=fitted_model.coefs,
+                     sigma_u=np.asarray(fitted_model.sigma_u),
+                     resid=np.asarray(fitted_model.resid),
+                     llf=fitted_model.llf,
+                     data_hash=data_hash)
+        os.replace(tmp_path, self._path(self.key(data_hash, lag, trend))) #atomic, so concurrent readers never see a partial file
+        self.evict()
+
+    def fit(self, data, lag, trend='c', source=None):
+        """Load VAR(lag) for this data from the store, fitting and storing it on a miss.
+
+        source names the data set (e.g. the csv file name); when its data hash changes,
+        the models fitted on the previous version are dropped.
+        """
+        data_hash = data_fingerprint(data)
+        if source is not None:
+            self.invalidate(source, data_hash)
+        fitted_model = self.get(data, lag, trend, data_hash=data_hash)
+        if fitted_model is not None:
+            self.hits += 1
+            count('model cache hits')
+            return fitted_model
+        self.misses += 1
+        fitted_model = VAR(data).fit(lag, trend=trend)
+        count('fits')
+        self.put(data, lag, fitted_model, trend, data_hash=data_hash)
+        return fitted_model
+
+    def load_arrays(self, data_hash, lag, trend='c'):
+        """Raw stored arrays (params, coefs, sigma_u, resid, llf) without rebuilding a statsmodels object."""
+        with np.load(self._path(self.key(data_hash, lag, trend))) as stored:
+            return {name: stored[name] for name in stored.files}
+
+    def invalidate(self, source, data_hash):
+        """Drop the models of an older version of `source` if its data hash has changed."""
+        sources_path = os.path.join(self.cache_dir, 'sources.json')
+        try:
+            with open(sources_path) as f:
+                sources = json.load(f)
+        except (OSError, ValueError):
+            sources = {}
+        old_hash = sources.get(source)
+        if old_hash == data_hash:
+            return
+        if old_hash is not None and old_hash not in {h for s, h in sources.items() if s != source}:
+            for name in self._entries():
+                if name.startswith(old_hash[:24]):
+                    self._remove(name)
+        sources[source] = data_hash
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(sources, f, indent=1)
+        os.replace(tmp_path, sources_path)
+
+    def evict(self):
+        """Remove least recently used entries beyond max_entries."""
+        entries = self._entries()
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=self._last_used, reverse=True)
+        for name in entries[self.max_entries:]:
+            self._remove(name)
+
+    def clear(self):
+        for name in self._entries():
+            self._remove(name)
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return [name for name in os.listdir(self.cache_dir) if name.endswith('.npz')]
+
+    def _last_used(self, name):
+        try:
+            return os.path.getmtime(os.path.join(self.cache_dir, name))
+        except FileNotFoundError:
+            return 0.0
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.cache_dir, name))
+        except FileNotFoundError: #already evicted by a concurrent run
+            pass
+
+
+default_cache = VARModelCache()
+
+
+def fit_var(data, lag, trend='c', source=None, cache=None):
+    """Drop-in replacement for VAR(data).fit(lag) that goes through the model store."""
+    return (cache or default_cache).fit(data, lag, trend=trend, source=source)
@@ -0,0 +1,255 @@
+"""One command line for the analysis stages, importing the scientific stack only when a subcommand needs it.
+
+    python var_cli.py ingest [--write-csv]              parse new or edited workbooks into the quarterly panel
+    python var_cli.py seasonality [--headless]          STL and seasonal differencing (Seasonality Check.py)
+    python var_cli.py stationarity [--tests adf kpss pp] ADF/KPSS/PP tests of the standardized data
+    python var_cli.py order-select [--max-lags 15]      information criteria and LR tests of every lag order
+    python var_cli.py irf [--headless]                  IRFs, FEVDs and their bands (Impulse Response Functions.py)
+    python var_cli.py diagnostics [--lags 5 6 7 8]      residual portmanteau tests of the candidate VARs
+    python var_cli.py scenarios [--headless]            Monte Carlo fan charts of shock scenarios (Scenario Simulation.py)
+
+Startup only runs the standard library imports of this file; each subcommand imports
+the modules it uses when it runs. stationarity, order-select and diagnostics keep their
+tables in Cache/CLI with the sha256 of the Standardized_Data artifact they were computed
+from. When that data is unchanged, the stored table is read back with numpy alone
+(no pandas, scipy or statsmodels), so a repeated check returns in a fraction of a second;
+--refresh recomputes it. --trace/--profile work as in every script (see tracing.py).
+"""
+import argparse
+import hashlib
+import json
+import os
+import runpy
+import sys
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+CLI_DIR = os.path.join(script_dir, 'Cache', 'CLI')
+CLI_STORE = os.path.join(CLI_DIR, 'store') #artifact store of the cached tables
+INDEX_PATH = os.path.join(CLI_DIR, 'results.json') #query -> (input hash, artifact)
+STORE_DIR = os.path.join(script_dir, 'Data Store')
+INPUT_NAME = 'Standardized_Data'
+INPUT_CSV = os.path.join(script_dir, 'CSV Data', 'Standardized_Data.csv')
+
+
+def input_version(name=INPUT_NAME, csv_path=INPUT_CSV, store_dir=STORE_DIR):
+    """sha256 of the stored artifact, or None if it is missing or its csv was edited after it was written."""
+    try:
+        with open(os.path.join(store_dir, name, 'meta.json')) as f:
+            sha = json.load(f)['sha256']
+    except (OSError, ValueError, KeyError):
+        return None
+    if os.path.exists(csv_path): #same check as artifact_store.load_frame, which would re-import the csv
+        try:
+            with open(os.path.join(store_dir, name, 'csv.json')) as f:
+                stamp = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stat = os.stat(csv_path)
+        if (stamp.get('size'), stamp.get('mtime_ns')) != (stat.st_size, stat.st_mtime_ns):
+            return None
+    return sha
+
+
+def read_columns(name, store_dir=CLI_STORE):
+    """Columns of a stored artifact as {name: array or list of labels}, with numpy only (layout in artifact_store.py)."""
+    import numpy as np
+    folder = os.path.join(store_dir, name)
+    with open(os.path.join(folder, 'meta.json')) as f:
+        meta = json.load(f)
+    columns, floats = {}, None
+    for col in meta['columns']:
+        if col['kind'] == 'float64':
+            if floats is None:
+                floats = np.load(os.path.join(folder, 'float64.npy'))
+            columns[col['name']] = floats[:, col['position']]
+        elif col['kind'] == 'numeric':
+            columns[col['name']] = np.load(os.path.join(folder, col['file']))
+        else:
+            codes = np.load(os.path.join(folder, col['file']))
+            columns[col['name']] = [col['categories'][c] if c >= 0 else '' for c in codes]
+    return columns
+
+
+def format_table(columns, float_format='{:.4g}'):
+    """Plain-text table of {name: values}, one line per row."""
+    def cell(value):
+        if isinstance(value, float) or type(value).__name__.startswith('float'):
+            return float_format.format(value)
+        return str(value)
+    cells = {name: [cell(v) for v in values] for name, values in columns.items()}
+    widths = {name: max([len(name)] + [len(c) for c in col]) for name, col in cells.items()}
+    n_rows = len(next(iter(cells.values()), []))
+    lines = ['  '.join(name.rjust(widths[name]) for name in cells)]
+    lines += ['  '.join(cells[name][i].rjust(widths[name]) for name in cells) for i in range(n_rows)]
+    return '\n'.join(lines)
+
+
+def _read_index():
+    try:
+        with open(INDEX_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def cached_table(command, options, compute, refresh=False, log=print):
+    """Columns of the result of (command, options) on the current input, from Cache/CLI or by calling compute().
+
+    compute() returns a data frame; it is stored in Cache/CLI under the input's hash.
+    """
+    key = json.dumps([command, options], sort_keys=True)
+    name = f"{command}-{hashlib.sha256(key.encode()).hexdigest()[:12]}"
+    version = input_version()
+    record = _read_index().get(key)
+    if not refresh and version is not None and record == {'input': version, 'artifact': name}:
+        try:
+            columns = read_columns(name)
+            log(f'({command} result from Cache/CLI, input unchanged)')
+            return columns
+        except (OSError, ValueError, KeyError): #entry removed or half-written: compute it again
+            pass
+    from artifact_store import read_meta, save_frame
+    table = compute()
+    save_frame(table.reset_index(drop=True), name, store_dir=CLI_STORE)
+    index = _read_index() #re-read so concurrent runs don't drop each other's entries
+    index[key] = {'input': read_meta(INPUT_NAME)['sha256'], 'artifact': name}
+    os.makedirs(CLI_DIR, exist_ok=True)
+    tmp_path = f'{INDEX_PATH}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, INDEX_PATH)
+    return read_columns(name)
+
+
+def _load_input():
+    from artifact_store import load_frame
+    return load_frame(INPUT_NAME, csv_path=INPUT_CSV)
+
+
+def run_script(script, *argv):
+    """Run one of the analysis scripts in this process as if started from the command line."""
+    path = os.path.join(script_dir, script)
+    saved = sys.argv
+    sys.argv = [path, *argv, *[flag for flag in ('--trace', '--profile') if flag in saved]]
+    try:
+        runpy.run_path(path, run_name='__main__')
+    finally:
+        sys.argv = saved
+    return 0
+
+
+#--- subcommands ---
+
+def cmd_ingest(args):
+    from ingest import refresh, write_csv_files
+    panel, info = refresh(n_jobs=args.jobs)
+    print(f'{panel.shape[1]} series, {panel.index[0]} to {panel.index[-1]}')
+    print(info[['Series', 'Transform', 'Per Quarter', 'First Quarter', 'Last Quarter']].to_string(index=False))
+    if args.write_csv:
+        for path in write_csv_files(panel):
+            print(f'written: {path}')
+    return 0
+
+
+def cmd_seasonality(args):
+    return run_script('Seasonality Check.py', *(['--headless'] if args.headless else []))
+
+
+def cmd_stationarity(args):
+    def compute():
+        from unit_root import unit_root_table
+        return unit_root_table(_load_input(), tests=tuple(args.tests), variants=tuple(args.variants), n_jobs=args.jobs)
+    columns = cached_table('stationarity', {'tests': args.tests, 'variants': args.variants}, compute, args.refresh)
+    print(format_table(columns))
+    failed = sorted({v for v, ok in zip(columns['Variable'], columns['Stationary']) if not ok})
+    print(f"Not stationary by at least one test: {', '.join(failed)}" if failed else 'Stationary by every test.')
+    return 0
+
+
+def cmd_order_select(args):
+    def compute():
+        from lag_sweep import lag_order_sweep
+        return lag_order_sweep(_load_input(), args.max_lags)
+    columns = cached_table('order-select', {'max_lags': args.max_lags}, compute, args.refresh)
+    print(format_table(columns))
+    lags = columns['Lag Length']
+    chosen = {criterion: int(lags[columns[criterion].argmin()]) for criterion in ('AIC', 'BIC', 'HQIC', 'FPE')}
+    print('Selected lag order: ' + ', '.join(f'{c} {p}' for c, p in chosen.items()))
+    return 0
+
+
+def cmd_irf(args):
+    return run_script('Impulse Response Functions.py', *(['--headless'] if args.headless else []))
+
+
+def cmd_diagnostics(args):
+    def compute():
+        from residual_diagnostics import whiteness_table
+        from var_cache import fit_var
+        data = _load_input()
+        return whiteness_table({lag: fit_var(data, lag, source='Standardized_Data.csv') for lag in args.lags}, args.max_horizon)
+    columns = cached_table('diagnostics', {'lags': args.lags, 'max_horizon': args.max_horizon}, compute, args.refresh)
+    print(format_table(columns))
+    return 0
+
+
+def cmd_scenarios(args):
+    return run_script('Scenario Simulation.py', *(['--headless'] if args.headless else []))
+
+
+COMMANDS = {
+    'ingest': cmd_ingest,
+    'seasonality': cmd_seasonality,
+    'stationarity': cmd_stationarity,
+    'order-select': cmd_order_select,
+    'irf': cmd_irf,
+    'diagnostics': cmd_diagnostics,
+    'scenarios': cmd_scenarios,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Run one stage of the VAR analysis.')
+    parser.add_argument('--trace', action='store_true', help='write a trace of the run (see tracing.py)')
+    parser.add_argument('--profile', action='store_true', help='--trace plus sampled call stacks')
+    parser.add_argument('--time', action='store_true', help='print the wall time of the command')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('ingest', help='parse new or edited workbooks into the quarterly panel')
+    p.add_argument('--write-csv', action='store_true', help='also rewrite the quarterly csv files in CSV Data')
+    p.add_argument('--jobs', type=int, default=None, help='parallel workbook parsers (default: every core)')
+
+    for name, script in (('seasonality', 'Seasonality Check.py'), ('irf', 'Impulse Response Functions.py'),
+                         ('scenarios', 'Scenario Simulation.py')):
+        p = sub.add_parser(name, help=f'run {script}')
+        p.add_argument('--headless', action='store_true', help='write the figures to Graph Results instead of showing them')
+
+    p = sub.add_parser('stationarity', help='unit root tests of the standardized data')
+    p.add_argument('--tests', nargs='+', default=['adf', 'kpss', 'pp'], choices=['adf', 'kpss', 'pp'])
+    p.add_argument('--variants', nargs='+', default=['raw'], help='raw, diff or seasonal diff (see unit_root.VARIANTS)')
+    p.add_argument('--jobs', type=int, default=None)
+    p.add_argument('--refresh', action='store_true', help='recompute even if a stored result is current')
+
+    p = sub.add_parser('order-select', help='information criteria and LR tests of lag orders 0..max-lags')
+    p.add_argument('--max-lags', type=int, default=15)
+    p.add_argument('--refresh', action='store_true', help='recompute even if a stored result is current')
+
+    p = sub.add_parser('diagnostics', help='multivariate portmanteau tests of the VAR residuals')
+    p.add_argument('--lags', type=int, nargs='+', default=[5, 6, 7, 8], help='candidate lag lengths')
+    p.add_argument('--max-horizon', type=int, default=20)
+    p.add_argument('--refresh', action='store_true', help='recompute even if a stored result is current')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    start = time.perf_counter()
+    code = COMMANDS[args.command](args)
+    if args.time:
+        print(f'{args.command} took {time.perf_counter() - start:.3f}s')
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
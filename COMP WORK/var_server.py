@@ -0,0 +1,428 @@
+"""Local JSON server answering forecast, IRF, FEVD and scenario queries from warm VAR models.
+
+The chosen VAR(p) specs are loaded once (through the model cache, so usually without
+re-estimating) and kept in memory together with their MA(infinity) and orthogonalized
+MA coefficients up to max_periods (the longest horizon served), so an IRF, FEVD or
+scenario query is a slice and a few small products. Connections are served by asyncio; the numerical work of each
+query runs in a thread so slow queries do not hold up others, identical queries that
+arrive while one is being computed share its result, and recent answers are kept in
+a small LRU cache. POST /batch answers a list of queries concurrently.
+
+    python var_server.py                      # http://127.0.0.1:8765, VAR(6), VAR(7), VAR(8)
+    python var_server.py --lags 6 --port 9000
+    python var_server.py --socket /tmp/var.sock
+
+    GET  /models                              specs being served
+    POST /forecast  {"lag": 6, "steps": 8, "alpha": 0.05}
+    POST /irf       {"lag": 6, "periods": 20, "orth": false, "cumulative": false, "impulse": "US DXY SA"}
+    POST /fevd      {"lag": 6, "periods": 20, "variable": "US CPI SA"}
+    POST /scenario  {"lag": 6, "steps": 8, "shocks": {"US DXY SA": [1, 0, 0.5]}, "orth": true}
+    POST /batch     {"requests": [{"path": "/irf", "lag": 7}, {"path": "/forecast"}]}
+
+GET requests take the same fields as query parameters, e.g. /irf?lag=7&orth=true.
+/forecast, /irf and /scenario take "units": "original" to answer in the units of the data
+before standardization (see scaling.py); scenario shocks are always in the model's units.
+Every response is JSON (NaN and infinite values as null); errors come back as
+{"error": message} with status 400/404, 413 for a body over MAX_BODY bytes, or 500
+if a handler fails.
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+from scipy import stats
+
+from artifact_store import load_frame
+from scaling import PARAMS_NAME, Standardizer
+from var_cache import fit_var
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_HOST = '127.0.0.1' #local only
+DEFAULT_PORT = 8765
+DEFAULT_LAGS = (6, 7, 8)
+MAX_PERIODS = 40 #horizon of the precomputed MA coefficients
+CACHE_SIZE = 512 #no. of recent answers kept
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+               500: 'Internal Server Error'}
+MAX_BODY = 1 << 20
+
+
+class QueryError(ValueError):
+    """A request the server cannot answer; reported to the client with its status (400, 404, 405 or 413)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class WarmModel:
+    """One fitted VAR with its MA representations precomputed up to max_periods."""
+
+    def __init__(self, fitted_model, index, max_periods=MAX_PERIODS):
+        self.fitted = fitted_model
+        self.lag = fitted_model.k_ar
+        self.names = list(fitted_model.names)
+        self.index = index
+        self.max_periods = max_periods
+        self.ma = fitted_model.ma_rep(max_periods) #(max_periods + 1, K, K)
+        self.orth = fitted_model.orth_ma_rep(max_periods)
+        self.y_last = np.asarray(fitted_model.endog)[-self.lag:]
+
+    def labels(self, steps):
+        """Labels of the next `steps` periods after the sample."""
+        last = self.index[-1]
+        return [str(last + h) for h in range(1, steps + 1)]
+
+    def ma_coefs(self, periods, orth):
+        return (self.orth if orth else self.ma)[:periods + 1] #periods <= max_periods (VARServer._horizon)
+
+
+class VARServer:
+    """Holds the warm models and answers queries; serve() runs it on a TCP port or Unix socket."""
+
+    def __init__(self, data, lags=DEFAULT_LAGS, trend='c', source=None, max_periods=MAX_PERIODS, cache_size=CACHE_SIZE,
+                 scaler=None):
+        self.data = data
+        self.scaler = scaler #Standardizer of the data, for answers in the original units
+        self.models = {lag: WarmModel(fit_var(data, lag, trend=trend, source=source), data.index, max_periods)
+                       for lag in lags}
+        self.cache_size = cache_size
+        self._answers = OrderedDict() #LRU of recent answers, keyed by the normalized query
+        self._inflight = {} #queries being computed -> future shared by identical queries
+        self.routes = {'/models': self.list_models, '/forecast': self.forecast, '/irf': self.irf,
+                       '/fevd': self.fevd, '/scenario': self.scenario}
+        self.served = 0
+
+    #--- query handlers (plain functions of the query, run in a worker thread) ---
+
+    def model(self, query):
+        lag = int(query.get('lag', next(iter(self.models))))
+        if lag not in self.models:
+            raise QueryError(f"VAR({lag}) is not served (lags: {', '.join(map(str, self.models))})", 404)
+        return self.models[lag]
+
+    def _variable(self, model, name):
+        if name is None:
+            return None
+        if name not in model.names:
+            raise QueryError(f"unknown variable '{name}' (variables: {', '.join(model.names)})")
+        return model.names.index(name)
+
+    def _horizon(self, model, query, field, default):
+        #no. of periods/steps asked for, 1..max_periods (longer horizons are not served, so one query cannot exhaust memory)
+        value = int(query.get(field, default))
+        if not 1 <= value <= model.max_periods:
+            raise QueryError(f'{field} must be between 1 and {model.max_periods}')
+        return value
+
+    def _scaler(self, query):
+        units = query.get('units', 'model')
+        if units not in ('model', 'original'):
+            raise QueryError(f"unknown units '{units}' (use 'model' or 'original')")
+        if units == 'model':
+            return None
+        if self.scaler is None:
+            raise QueryError('no standardization parameters are loaded for answers in the original units')
+        return self.scaler
+
+    def list_models(self, query):
+        return {'models': [{'lag': m.lag, 'variables': m.names, 'nobs': int(m.fitted.nobs), 'trend': m.fitted.trend,
+                            'first': str(m.index[0]), 'last': str(m.index[-1]), 'aic': float(m.fitted.aic)}
+                           for m in self.models.values()]}
+
+    def forecast(self, query):
+        model = self.model(query)
+        steps = self._horizon(model, query, 'steps', 8)
+        alpha = float(query.get('alpha', 0.05))
+        point = model.fitted.forecast(model.y_last, steps)
+        theta = model.ma_coefs(steps - 1, orth=True)
+        sigma = np.sqrt(np.cumsum((theta ** 2).sum(axis=2), axis=0)) #forecast error s.d., sqrt of diag of sum Theta_s Theta_s'
+        q = stats.norm.ppf(1 - alpha / 2)
+        lower, upper = point - q * sigma, point + q * sigma
+        scaler = self._scaler(query)
+        if scaler is not None:
+            point, lower, upper = (scaler.inverse_transform(x) for x in (point, lower, upper))
+        return {'lag': model.lag, 'periods': model.labels(steps), 'variables': model.names, 'alpha': alpha,
+                'forecast': point.tolist(), 'lower': lower.tolist(), 'upper': upper.tolist()}
+
+    def irf(self, query):
+        model = self.model(query)
+        periods = self._horizon(model, query, 'periods', 20)
+        orth = _flag(query.get('orth', False))
+        cumulative = _flag(query.get('cumulative', False))
+        impulse = self._variable(model, query.get('impulse'))
+        response = self._variable(model, query.get('response'))
+        irfs = model.ma_coefs(periods, orth) #[period, response, impulse]
+        scaler = self._scaler(query)
+        if scaler is not None:
+            irfs = scaler.unscale_irfs(irfs, orth)
+        if cumulative:
+            irfs = irfs.cumsum(axis=0)
+        irfs = irfs[:, slice(None) if response is None else [response]][:, :, slice(None) if impulse is None else [impulse]]
+        return {'lag': model.lag, 'periods': periods, 'orth': orth, 'cumulative': cumulative,
+                'responses': model.names if response is None else [model.names[response]],
+                'impulses': model.names if impulse is None else [model.names[impulse]],
+                'irf': irfs.tolist()}
+
+    def fevd(self, query):
+        model = self.model(query)
+        periods = self._horizon(model, query, 'periods', 20)
+        variable = self._variable(model, query.get('variable'))
+        contrib = np.cumsum(model.ma_coefs(periods - 1, orth=True) ** 2, axis=0) #[horizon, variable, shock]
+        decomp = contrib / contrib.sum(axis=2, keepdims=True) #share of each shock in the forecast error variance
+        decomp = decomp.swapaxes(0, 1) #[variable, horizon, shock], the layout of statsmodels' FEVD.decomp
+        if variable is not None:
+            decomp = decomp[[variable]]
+        return {'lag': model.lag, 'periods': periods, 'shocks': model.names,
+                'variables': model.names if variable is None else [model.names[variable]], 'fevd': decomp.tolist()}
+
+    def scenario(self, query):
+        """Forecast path when the given innovations hit in the first steps, against the baseline forecast."""
+        model = self.model(query)
+        steps = self._horizon(model, query, 'steps', 8)
+        orth = _flag(query.get('orth', True))
+        shocks = query.get('shocks') or {}
+        if not isinstance(shocks, dict):
+            raise QueryError("shocks must be an object {variable: [shock, ...]}")
+        E = np.zeros((steps, len(model.names)))
+        for name, path in shocks.items():
+            path = np.atleast_1d(path)
+            if path.ndim != 1 or not all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in path.tolist()):
+                raise QueryError(f"shock path of '{name}' must be a number or a list of numbers")
+            path = path.astype(float)
+            if len(path) > steps:
+                raise QueryError(f"shock path of '{name}' is longer than steps={steps}")
+            E[:len(path), self._variable(model, name)] = path
+        psi = model.ma_coefs(steps - 1, orth)
+        effect = np.zeros_like(E)
+        for s in np.flatnonzero(E.any(axis=1)): #a shock at step s moves steps s.. through Psi_0, Psi_1, ...
+            effect[s:] += psi[:steps - s] @ E[s]
+        baseline = model.fitted.forecast(model.y_last, steps)
+        scenario = baseline + effect
+        scaler = self._scaler(query)
+        if scaler is not None:
+            baseline, scenario, effect = (scaler.inverse_transform(baseline), scaler.inverse_transform(scenario),
+                                          scaler.inverse_transform(effect, center=False))
+        return {'lag': model.lag, 'periods': model.labels(steps), 'variables': model.names, 'orth': orth,
+                'baseline': baseline.tolist(), 'scenario': scenario.tolist(), 'effect': effect.tolist()}
+
+    #--- dispatch, with shared in-flight work and an answer cache ---
+
+    async def answer(self, path, query):
+        """The JSON-ready answer to one query; identical concurrent queries are computed once."""
+        if path == '/batch':
+            requests = query.get('requests')
+            if not isinstance(requests, list):
+                raise QueryError("/batch needs a 'requests' list")
+            answers = await asyncio.gather(*(self._answer_item(r) for r in requests))
+            return {'responses': answers}
+        handler = self.routes.get(path)
+        if handler is None:
+            raise QueryError(f"unknown path '{path}' (use {', '.join(list(self.routes) + ['/batch'])})", 404)
+        key = json.dumps([path, query], sort_keys=True, default=str)
+        if key in self._answers:
+            self._answers.move_to_end(key)
+            return self._answers[key]
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.ensure_future(asyncio.to_thread(handler, query))
+        self._inflight[key] = future
+        try:
+            result = await future
+        finally:
+            del self._inflight[key]
+        self._answers[key] = result
+        while len(self._answers) > self.cache_size:
+            self._answers.popitem(last=False)
+        return result
+
+    async def _answer_item(self, request):
+        #one query of a batch; its errors are reported in place instead of failing the batch
+        if not isinstance(request, dict):
+            return {'error': 'every batch request must be an object'}
+        query = dict(request)
+        path = query.pop('path', None)
+        try:
+            return await self.answer(path, query)
+        except (QueryError, ValueError, TypeError, KeyError) as e:
+            return {'error': str(e)}
+        except Exception as e: #a bug in a handler: report it in place like any other error
+            return {'error': f'internal error: {e!r}'}
+
+    #--- minimal HTTP/1.1 over asyncio streams ---
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except QueryError as e: #the rest of the stream cannot be trusted: answer and close
+                    _write_response(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self._respond(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, method, target, body):
+        url = urlsplit(target)
+        try:
+            if method == 'GET':
+                query = {k: _parse_value(v) for k, v in parse_qsl(url.query)}
+            elif method == 'POST':
+                query = json.loads(body or b'{}')
+                if not isinstance(query, dict):
+                    raise QueryError('the request body must be a JSON object')
+            else:
+                raise QueryError(f'method {method} is not supported', 405)
+            result = await self.answer(url.path.rstrip('/') or '/', query)
+            self.served += 1
+            return 200, result
+        except QueryError as e:
+            return e.status, {'error': str(e)}
+        except (ValueError, TypeError, KeyError) as e: #bad JSON or field values
+            return 400, {'error': str(e)}
+        except Exception as e: #a bug in a handler: still answer, so the client is not left without a response
+            return 500, {'error': f'internal error: {e!r}'}
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, ready=None):
+        """Serve until cancelled; ready (a callable) is called once the socket is listening."""
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle_connection, path=socket_path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def _parse_value(text):
+    #query string values: numbers and true/false as JSON, anything else as text
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+async def _read_request(reader):
+    #(method, target, lower-cased headers, body), or None when the client closed the connection
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise QueryError('malformed request line') from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise QueryError('invalid Content-Length header')
+    if length > MAX_BODY:
+        raise QueryError(f'request body is larger than {MAX_BODY} bytes', 413)
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), target, headers, body
+
+
+def _finite(value):
+    #payload with NaN and infinite floats replaced by None, which JSON can carry
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def _write_response(writer, status, payload, keep_alive=True):
+    try:
+        body = json.dumps(payload, allow_nan=False).encode()
+    except ValueError: #a non-finite value somewhere: walk the payload only in this rare case
+        body = json.dumps(_finite(payload), allow_nan=False).encode()
+    head = (f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+    writer.write(head.encode() + body)
+
+
+def query(path, payload=None, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=30):
+    """Send one query to a running server and return the decoded JSON answer (for scripts and notebooks)."""
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        if payload is None:
+            connection.request('GET', path)
+        else:
+            connection.request('POST', path, body=json.dumps(payload), headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        answer = json.loads(response.read())
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise QueryError(answer.get('error', response.reason), response.status)
+    return answer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve forecasts, IRFs, FEVDs and scenarios of warm VAR models as JSON.')
+    parser.add_argument('--lags', type=int, nargs='+', default=list(DEFAULT_LAGS), help='lag lengths of the VARs to serve')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='interface to listen on (default: localhost only)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', default=None, help='listen on this Unix socket instead of a TCP port')
+    parser.add_argument('--max-periods', type=int, default=MAX_PERIODS, help='longest horizon served (MA coefficients are precomputed up to it)')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    csv_file_path = os.path.join(script_dir, 'CSV Data', 'Standardized_Data.csv')
+    data = load_frame('Standardized_Data', csv_path=csv_file_path) #standardized seasonally differenced data (Standardizing.py)
+    try: #parameters of the standardization (Standardizing.py), if they belong to the current data
+        scaler = Standardizer.load(PARAMS_NAME)
+        scaler = scaler if scaler.is_current('Seasonally_Differenced_Data') else None
+    except (OSError, ValueError):
+        scaler = None
+    server = VARServer(data, args.lags, source='Standardized_Data.csv', max_periods=args.max_periods, scaler=scaler)
+    where = args.socket or f'http://{args.host}:{args.port}'
+    ready = lambda _: print(f"Serving VAR({', '.join(map(str, args.lags))}) on {where} "
+                            f"(ready in {time.perf_counter() - start:.2f}s)", flush=True)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.socket, ready=ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())